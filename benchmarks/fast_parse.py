@@ -0,0 +1,70 @@
+"""
+Compares loading ARFF/CSV files with the Weka loaders against the NumPy-based
+parsing of the load-data reader (--fast_parse).
+
+Usage:
+    python benchmarks/fast_parse.py [-r REPEATS] [--max_heap SIZE] FILE [FILE ...]
+"""
+import argparse
+import logging
+import time
+
+import weka.core.jvm as jvm
+from weka.core.converters import loader_for_file
+from wp.api import fast_parse
+
+
+def _time(func, repeats: int) -> float:
+    """
+    Executes the function the specified number of times and returns the best time.
+
+    :param func: the function to execute
+    :param repeats: the number of repeats
+    :type repeats: int
+    :return: the best time in seconds
+    :rtype: float
+    """
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        duration = time.perf_counter() - start
+        if (result is None) or (duration < result):
+            result = duration
+    return result
+
+
+def main(args=None):
+    """
+    Runs the benchmark.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    """
+    parser = argparse.ArgumentParser(
+        description="Compares the Weka loaders with the NumPy-based parsing.",
+        prog="fast_parse")
+    parser.add_argument("files", metavar="FILE", nargs="+", help="The ARFF/CSV files to load.")
+    parser.add_argument("-r", "--repeats", type=int, default=5, help="The number of times to load each file, the best time is reported.")
+    parser.add_argument("--max_heap", type=str, default=None, help="The maximum heap size for the JVM, e.g., 2g.")
+    ns = parser.parse_args(args=args)
+
+    logging.basicConfig(level=logging.WARNING)
+    jvm.start(max_heap_size=ns.max_heap)
+    try:
+        print("%-30s %10s %10s %10s %8s" % ("file", "rows", "weka [s]", "numpy [s]", "speedup"))
+        for f in ns.files:
+            loader = loader_for_file(f)
+            data = loader.load_file(f)
+            if fast_parse(f) is None:
+                print("%-30s %10d %10s %10s %8s" % (f, data.num_instances, "-", "n/a", "-"))
+                continue
+            t_weka = _time(lambda: loader_for_file(f).load_file(f), ns.repeats)
+            t_numpy = _time(lambda: fast_parse(f), ns.repeats)
+            print("%-30s %10d %10.3f %10.3f %7.1fx" % (f, data.num_instances, t_weka, t_numpy, t_weka / t_numpy))
+    finally:
+        jvm.stop()
+
+
+if __name__ == '__main__':
+    main()
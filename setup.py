@@ -37,15 +37,20 @@ setup(
         "wai_logging",
         "python_weka_wrapper3",
     ],
+    extras_require={
+        "compression": ["zstandard", "isal"],
+    },
     version="0.0.1",
     author='Peter Reutemann',
     author_email='fracpete@waikato.ac.nz',
     entry_points={
         "console_scripts": [
             "wp-run=wp.tool.convert:sys_main",
+            "wp-serve=wp.tool.serve:sys_main",
             "wp-exec=wp.tool.exec:sys_main",
             "wp-find=wp.tool.find:sys_main",
             "wp-help=wp.tool.help:sys_main",
+            "wp-index=wp.tool.index:sys_main",
             "wp-registry=wp.registry:sys_main",
             "wp-test-generator=wp.tool.test_generator:sys_main",
         ],
@@ -0,0 +1,18 @@
+from ._inputs import iterate_files, shard_files, in_shard, parse_shard, LookAheadIterator, SHARD_MODES, SHARD_MODE_HASH, SHARD_MODE_ROUND_ROBIN
+from ._journal import Journal
+from ._manifest import Manifest, file_stats
+from ._prefetch import Prefetcher
+from ._async_writer import AsyncWriter
+from ._incremental_writer import IncrementalWriter, IncrementalWriterPool, RotatingWriter, supports_incremental, WRITE_BUFFER_DEFAULT, PLACEHOLDER_SEQUENCE
+from ._data import supports_matrix, instances_to_matrix, matrix_to_instances, header_to_string, header_from_string, load_header, set_class_index, non_numeric_attributes, transfer_values
+from ._disk_cache import DiskCache
+from ._dataset_cache import DatasetCache
+from ._filter_cache import FilterCache
+from ._object_cache import read_objects, read_object, clear_object_cache, object_cache_statistics
+from ._fast_parse import fast_parse, fast_parse_arff, fast_parse_csv
+from ._index import build_index, save_index, load_index, index_path, parse_row_range, chunk_rows, read_rows, INDEX_EXT, INDEX_EVERY_DEFAULT, INDEX_FORMATS, INDEX_FORMAT_ARFF, INDEX_FORMAT_CSV
+from ._compression import detect_compression, strip_compression, open_compressed, open_decompressed, close_after_error, DecompressingStream, CompressingStream, COMPRESSIONS, COMPRESSION_GZIP, COMPRESSION_BZIP2, COMPRESSION_XZ, COMPRESSION_ZSTD
+from ._jvm import predicted_memory, available_memory, auto_heap_size, add_jvm_options, free_heap, used_heap, heap_usage, HeapMonitor
+from ._profiler import Profiler, count_records, trace_path, ROLE_READER, ROLE_FILTER, ROLE_WRITER, SAMPLE_INTERVAL_DEFAULT, TRACE_MAX_EVENTS
+from ._execution import execute_pipeline, BufferingFilter
+from ._session import mark_end_of_input, is_end_of_input, clear_end_of_input, set_completion_handler, get_completion_handler, complete_input, STORAGE_END_OF_INPUT, STORAGE_COMPLETION_HANDLER
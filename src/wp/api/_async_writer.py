@@ -0,0 +1,194 @@
+import logging
+import os
+import queue
+import threading
+from typing import Any, Optional
+
+
+class AsyncWriter:
+    """
+    Saves items on background threads, with at most the specified number of
+    items queued up (submitting blocks when the queue is full). Items get written
+    to temporary files in the same directory, which get renamed once complete,
+    i.e., other processes never see partially written files. When writing in
+    order, files get renamed in the order the items were submitted in.
+    The first error that occurs gets re-raised with the next submit or close.
+    Callbacks registered via notify get executed (in the thread submitting the
+    items) once all the items submitted before have been written successfully.
+    """
+
+    def __init__(self, save_func, num_writers: int = 1, max_queued: int = 1, ordered: bool = True,
+                 logger: logging.Logger = None):
+        """
+        Initializes the writer.
+
+        :param save_func: the function for saving an item, takes the item and the file to write to as arguments
+        :param num_writers: the number of threads to use for writing
+        :type num_writers: int
+        :param max_queued: the maximum number of items to queue up
+        :type max_queued: int
+        :param ordered: whether the files get completed in the order the items were submitted in
+        :type ordered: bool
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        if num_writers < 1:
+            raise Exception("At least one writer thread is required, got: %d" % num_writers)
+        if max_queued < 1:
+            raise Exception("At least one item must be queued, got: %d" % max_queued)
+        self._save_func = save_func
+        self._num_writers = num_writers
+        self._ordered = ordered
+        self._logger = logger
+        self._queue = queue.Queue(maxsize=max_queued)
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._next = 0
+        self._error: Optional[Exception] = None
+        self._threads = []
+        self._written = set()
+        self._watermark = 0
+        self._callbacks = []
+
+    def start(self):
+        """
+        Starts the writer threads.
+        """
+        if len(self._threads) > 0:
+            raise Exception("Writer already started!")
+        for i in range(self._num_writers):
+            thread = threading.Thread(target=self._run, name="writer-%d" % i, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _check_error(self):
+        """
+        Re-raises the first error that occurred.
+        """
+        with self._cond:
+            if self._error is not None:
+                error = self._error
+                self._error = None
+                raise error
+
+    def submit(self, item: Any, path: str):
+        """
+        Queues the item for writing, blocks if the queue is full.
+
+        :param item: the item to save
+        :param path: the file to save the item to
+        :type path: str
+        """
+        self._check_error()
+        self._queue.put((self._seq, item, path))
+        self._seq += 1
+        self._run_callbacks()
+
+    def notify(self, callback):
+        """
+        Registers the callback (without parameters) to execute once all the items
+        submitted so far have been written successfully. It never gets executed
+        if one of these items fails to be written.
+
+        :param callback: the callback to execute
+        """
+        with self._cond:
+            self._callbacks.append((self._seq, callback))
+        self._run_callbacks()
+
+    def _run_callbacks(self):
+        """
+        Executes the callbacks whose items have all been written.
+        """
+        with self._cond:
+            ready = [c for seq, c in self._callbacks if seq <= self._watermark]
+            self._callbacks = [(seq, c) for seq, c in self._callbacks if seq > self._watermark]
+        for callback in ready:
+            callback()
+
+    def _temp_path(self, path: str, seq: int) -> str:
+        """
+        Returns the temporary file to write to, which retains the extension of the file.
+
+        :param path: the actual file
+        :type path: str
+        :param seq: the sequence number of the item
+        :type seq: int
+        :return: the temporary file
+        :rtype: str
+        """
+        return os.path.join(os.path.dirname(path), ".%d.%d.%s" % (os.getpid(), seq, os.path.basename(path)))
+
+    def _complete(self, seq: int, tmp: str, path: str, success: bool):
+        """
+        Moves the temporary file into place, waiting for the preceding items
+        first when writing in order.
+
+        :param seq: the sequence number of the item
+        :type seq: int
+        :param tmp: the temporary file
+        :type tmp: str
+        :param path: the actual file
+        :type path: str
+        :param success: whether the item was saved successfully
+        :type success: bool
+        """
+        with self._cond:
+            if self._ordered:
+                while self._next != seq:
+                    self._cond.wait()
+            try:
+                if success:
+                    if not os.path.exists(tmp):
+                        raise Exception("Saver did not write to the expected file: %s" % tmp)
+                    os.replace(tmp, path)
+                    # all items below the watermark have been written
+                    self._written.add(seq)
+                    while self._watermark in self._written:
+                        self._written.remove(self._watermark)
+                        self._watermark += 1
+                elif os.path.exists(tmp):
+                    os.remove(tmp)
+            except Exception as e:
+                if self._error is None:
+                    self._error = e
+            finally:
+                self._next += 1
+                self._cond.notify_all()
+
+    def _run(self):
+        """
+        Saves the queued items till the end marker is encountered.
+        """
+        while True:
+            job = self._queue.get()
+            if job is None:
+                break
+            seq, item, path = job
+            tmp = self._temp_path(path, seq)
+            success = False
+            try:
+                # no more writing once an error occurred, but keep consuming to not block the pipeline
+                if self._error is None:
+                    self._save_func(item, tmp)
+                    success = True
+            except Exception as e:
+                if self._logger is not None:
+                    self._logger.error("Failed to save '%s': %s" % (path, str(e)))
+                with self._cond:
+                    if self._error is None:
+                        self._error = e
+            finally:
+                self._complete(seq, tmp, path, success)
+
+    def close(self):
+        """
+        Waits for the queued items to be written and re-raises any error that occurred.
+        """
+        for _ in self._threads:
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+        self._run_callbacks()
+        self._check_error()
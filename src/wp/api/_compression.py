@@ -0,0 +1,300 @@
+import bz2
+import gzip
+import logging
+import lzma
+import os
+import threading
+from typing import Optional, BinaryIO
+
+from jpype import JClass, JArray, JByte
+
+COMPRESSION_GZIP = "gzip"
+COMPRESSION_BZIP2 = "bzip2"
+COMPRESSION_XZ = "xz"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSIONS = [
+    COMPRESSION_GZIP,
+    COMPRESSION_BZIP2,
+    COMPRESSION_XZ,
+    COMPRESSION_ZSTD,
+]
+
+COMPRESSION_EXTENSIONS = {
+    ".gz": COMPRESSION_GZIP,
+    ".bz2": COMPRESSION_BZIP2,
+    ".xz": COMPRESSION_XZ,
+    ".zst": COMPRESSION_ZSTD,
+}
+
+BUFFER_SIZE = 1024 * 1024
+
+
+def detect_compression(path: str) -> Optional[str]:
+    """
+    Determines the compression from the file extension.
+
+    :param path: the file to check
+    :type path: str
+    :return: the compression (see COMPRESSIONS), None if not compressed
+    :rtype: str
+    """
+    ext = os.path.splitext(path)[1].lower()
+    return COMPRESSION_EXTENSIONS.get(ext, None)
+
+
+def strip_compression(path: str) -> str:
+    """
+    Removes the compression extension from the file name, if any.
+
+    :param path: the file name to process
+    :type path: str
+    :return: the file name without compression extension
+    :rtype: str
+    """
+    if detect_compression(path) is not None:
+        return os.path.splitext(path)[0]
+    return path
+
+
+def _zstandard():
+    """
+    Imports the zstandard module.
+
+    :return: the module
+    """
+    try:
+        import zstandard
+        return zstandard
+    except ImportError:
+        raise Exception("The 'zstandard' library is required for .zst files: pip install zstandard")
+
+
+def open_decompressed(path: str, threads: int = 1) -> BinaryIO:
+    """
+    Opens the compressed file for reading the decompressed data. For gzip, the
+    multi-threaded decompression of the optional 'isal' library gets used if
+    available and more than one thread was requested.
+
+    :param path: the file to open
+    :type path: str
+    :param threads: the number of threads to use, if supported by the compression
+    :type threads: int
+    :return: the file object
+    """
+    compression = detect_compression(path)
+    if compression == COMPRESSION_GZIP:
+        if threads > 1:
+            try:
+                from isal import igzip_threaded
+                return igzip_threaded.open(path, "rb", threads=threads)
+            except ImportError:
+                pass
+        return gzip.open(path, "rb")
+    elif compression == COMPRESSION_BZIP2:
+        return bz2.open(path, "rb")
+    elif compression == COMPRESSION_XZ:
+        return lzma.open(path, "rb")
+    elif compression == COMPRESSION_ZSTD:
+        return _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True, read_across_frames=True)
+    else:
+        raise Exception("Unsupported compression for file: %s" % path)
+
+
+def open_compressed(path: str, level: int = None, threads: int = 1, append: bool = False) -> BinaryIO:
+    """
+    Opens the file for writing compressed data. Multiple threads are supported
+    by zstd and, with the optional 'isal' library, by gzip (levels 0-3).
+    When appending, the data gets added as a separate stream/frame, which
+    the decompression handles transparently.
+
+    :param path: the file to open
+    :type path: str
+    :param level: the compression level, uses the default of the compression if None
+    :type level: int
+    :param threads: the number of threads to use, if supported by the compression
+    :type threads: int
+    :param append: whether to append to the file rather than overwriting it
+    :type append: bool
+    :return: the file object
+    """
+    mode = "ab" if append else "wb"
+    compression = detect_compression(path)
+    if compression == COMPRESSION_GZIP:
+        if threads > 1:
+            try:
+                from isal import igzip_threaded
+                return igzip_threaded.open(path, mode, compresslevel=2 if level is None else min(level, 3), threads=threads)
+            except ImportError:
+                pass
+        return gzip.open(path, mode, compresslevel=9 if level is None else level)
+    elif compression == COMPRESSION_BZIP2:
+        return bz2.open(path, mode, compresslevel=9 if level is None else level)
+    elif compression == COMPRESSION_XZ:
+        return lzma.open(path, mode, preset=level)
+    elif compression == COMPRESSION_ZSTD:
+        compressor = _zstandard().ZstdCompressor(level=3 if level is None else level, threads=threads if threads > 1 else 0)
+        return compressor.stream_writer(open(path, mode), closefd=True)
+    else:
+        raise Exception("Unsupported compression for file: %s" % path)
+
+
+def close_after_error(stream, logger: logging.Logger = None):
+    """
+    Closes the (de)compressing stream after reading from or writing to it failed.
+    Errors of the stream only get logged, as they would mask the original error.
+
+    :param stream: the DecompressingStream/CompressingStream to close
+    :param logger: the optional logger to use
+    :type logger: logging.Logger
+    """
+    try:
+        stream.close()
+    except Exception as e:
+        if logger is not None:
+            logger.warning("Failed to close stream: %s" % str(e))
+
+
+class DecompressingStream:
+    """
+    Decompresses a file on a background thread into a java.io.PipedInputStream,
+    i.e., the JVM only sees the plain data and nothing gets written to disk.
+    """
+
+    def __init__(self, path: str, threads: int = 1, logger: logging.Logger = None):
+        """
+        Initializes the stream.
+
+        :param path: the compressed file
+        :type path: str
+        :param threads: the number of threads to use for decompression, if supported
+        :type threads: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        self.path = path
+        self.threads = threads
+        self._logger = logger
+        self._input = None
+        self._output = None
+        self._thread = None
+        self._error = None
+
+    def open(self):
+        """
+        Starts the decompression.
+
+        :return: the stream for the JVM to read from
+        """
+        self._input = JClass("java.io.PipedInputStream")(BUFFER_SIZE)
+        self._output = JClass("java.io.PipedOutputStream")(self._input)
+        self._thread = threading.Thread(target=self._run, name="decompress", daemon=True)
+        self._thread.start()
+        return self._input
+
+    def _run(self):
+        """
+        Pumps the decompressed data into the pipe.
+        """
+        try:
+            with open_decompressed(self.path, threads=self.threads) as fp:
+                while True:
+                    data = fp.read(BUFFER_SIZE)
+                    if len(data) == 0:
+                        break
+                    self._output.write(data)
+        except Exception as e:
+            self._error = e
+            if self._logger is not None:
+                self._logger.error("Failed to decompress '%s': %s" % (self.path, str(e)))
+        finally:
+            try:
+                self._output.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """
+        Stops the decompression and re-raises any error that occurred.
+        """
+        if self._input is not None:
+            # unblocks the background thread if the data wasn't fully read
+            self._input.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+
+class CompressingStream:
+    """
+    Compresses the data that the JVM writes to a java.io.PipedOutputStream
+    on a background thread.
+    """
+
+    def __init__(self, path: str, level: int = None, threads: int = 1):
+        """
+        Initializes the stream.
+
+        :param path: the file to write to
+        :type path: str
+        :param level: the compression level, uses the default of the compression if None
+        :type level: int
+        :param threads: the number of threads to use for compression, if supported
+        :type threads: int
+        """
+        self.path = path
+        self.level = level
+        self.threads = threads
+        self._input = None
+        self._output = None
+        self._thread = None
+        self._error = None
+
+    def open(self):
+        """
+        Starts the compression.
+
+        :return: the stream for the JVM to write to
+        """
+        self._input = JClass("java.io.PipedInputStream")(BUFFER_SIZE)
+        self._output = JClass("java.io.PipedOutputStream")(self._input)
+        self._thread = threading.Thread(target=self._run, name="compress", daemon=True)
+        self._thread.start()
+        return self._output
+
+    def _run(self):
+        """
+        Reads the data from the pipe and compresses it.
+        """
+        buffer = JArray(JByte)(BUFFER_SIZE)
+        try:
+            with open_compressed(self.path, level=self.level, threads=self.threads) as fp:
+                while True:
+                    n = self._input.read(buffer)
+                    if n < 0:
+                        break
+                    fp.write(memoryview(buffer)[:n].tobytes())
+        except Exception as e:
+            self._error = e
+        finally:
+            try:
+                self._input.close()
+            except Exception:
+                pass
+
+    def close(self):
+        """
+        Waits for the compression to finish and re-raises any error that occurred.
+        """
+        if self._output is not None:
+            self._output.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
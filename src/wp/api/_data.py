@@ -0,0 +1,217 @@
+from typing import List, Tuple
+
+import numpy as np
+from jpype import JClass, JArray, JDouble, JObject
+
+from weka.core.dataset import Instances
+
+
+def supports_matrix(data: Instances) -> bool:
+    """
+    Checks whether the dataset can be converted into a matrix of internal values,
+    i.e., whether it contains no string or relational attributes (whose values
+    are stored in the header rather than the rows).
+
+    :param data: the dataset to check
+    :type data: Instances
+    :return: True if supported
+    :rtype: bool
+    """
+    jdata = data.jobject
+    for i in range(jdata.numAttributes()):
+        att = jdata.attribute(i)
+        if att.isString() or att.isRelationValued():
+            return False
+    return True
+
+
+def instances_to_matrix(data: Instances) -> np.ndarray:
+    """
+    Turns the dataset into a column-major matrix of the internal values, with the
+    instance weights stored in an additional last column. Missing values are NaN.
+
+    :param data: the dataset to convert
+    :type data: Instances
+    :return: the matrix (rows x attributes+1)
+    :rtype: np.ndarray
+    """
+    jdata = data.jobject
+    num_rows = jdata.numInstances()
+    num_cols = jdata.numAttributes()
+    result = np.empty((num_rows, num_cols + 1), dtype=np.float64, order="F")
+    for i in range(num_cols):
+        result[:, i] = np.asarray(jdata.attributeToDoubleArray(i))
+    if num_rows > 0:
+        # the weights get collected within the JVM and transferred in one go
+        result[:, num_cols] = np.asarray(jdata.stream().mapToDouble(_weight_function()).toArray())
+    return result
+
+
+def _weight_function():
+    """
+    Returns a java.util.function.ToDoubleFunction that returns the weight of a
+    weka.core.Instance. Since the function is implemented via a method handle,
+    it can be applied to all the rows within the JVM without calling back into Python.
+
+    :return: the function
+    """
+    handles = JClass("java.lang.invoke.MethodHandles")
+    method_type = JClass("java.lang.invoke.MethodType").methodType(JClass("java.lang.Double").TYPE)
+    handle = handles.publicLookup().findVirtual(JClass("weka.core.Instance"), "weight", method_type)
+    return JClass("java.lang.invoke.MethodHandleProxies").asInterfaceInstance(JClass("java.util.function.ToDoubleFunction"), handle)
+
+
+def _instance_factory(weight: float):
+    """
+    Returns a java.util.function.Function that turns a double array into a
+    weka.core.DenseInstance with the specified weight. Since the function is
+    implemented via a method handle, it can be applied to all the rows within
+    the JVM without calling back into Python.
+
+    :param weight: the weight to use for the instances
+    :type weight: float
+    :return: the function
+    """
+    handles = JClass("java.lang.invoke.MethodHandles")
+    method_type = JClass("java.lang.invoke.MethodType").methodType(
+        JClass("java.lang.Void").TYPE, JClass("java.lang.Double").TYPE, JArray(JDouble).class_)
+    constructor = handles.publicLookup().findConstructor(JClass("weka.core.DenseInstance"), method_type)
+    handle = handles.insertArguments(constructor, 0, JObject(float(weight), JClass("java.lang.Double")))
+    return JClass("java.lang.invoke.MethodHandleProxies").asInterfaceInstance(JClass("java.util.function.Function"), handle)
+
+
+def matrix_to_instances(header: Instances, matrix: np.ndarray) -> Instances:
+    """
+    Turns the matrix generated by instances_to_matrix back into a dataset.
+    The rows get transferred into the JVM in one go and the instances get
+    created within the JVM.
+
+    :param header: the dataset structure to use
+    :type header: Instances
+    :param matrix: the matrix (rows x attributes+1, last column are the weights)
+    :type matrix: np.ndarray
+    :return: the dataset
+    :rtype: Instances
+    """
+    num_rows = matrix.shape[0]
+    num_cols = matrix.shape[1] - 1
+    if num_cols != header.num_attributes:
+        raise Exception("Number of columns in matrix and attributes in header differ: %d != %d" % (num_cols, header.num_attributes))
+    result = JClass("weka.core.Instances")(header.jobject, num_rows)
+    if num_rows > 0:
+        weights = np.asarray(matrix[:, num_cols])
+        rows = JArray(JDouble, 2)(np.ascontiguousarray(matrix[:, :num_cols]))
+        insts = JClass("java.util.Arrays").stream(rows).map(_instance_factory(weights[0])).collect(JClass("java.util.stream.Collectors").toList())
+        result.addAll(insts)
+        # only differing weights need to get set individually
+        for n in np.flatnonzero(weights != weights[0]):
+            result.instance(int(n)).setWeight(float(weights[n]))
+    return Instances(result)
+
+
+def header_to_string(data: Instances) -> str:
+    """
+    Generates the ARFF header of the dataset.
+
+    :param data: the dataset to get the header for
+    :type data: Instances
+    :return: the header
+    :rtype: str
+    """
+    return str(JClass("weka.core.Instances")(data.jobject, 0))
+
+
+def header_from_string(header: str) -> Instances:
+    """
+    Parses the ARFF header.
+
+    :param header: the header to parse
+    :type header: str
+    :return: the empty dataset
+    :rtype: Instances
+    """
+    return Instances(JClass("weka.core.Instances")(JClass("java.io.StringReader")(header)))
+
+
+def load_header(path: str) -> Instances:
+    """
+    Loads the structure of a dataset, either from an ARFF file (only the header
+    gets read, any data is ignored) or from a serialized Instances object.
+
+    :param path: the ARFF file or serialized Instances object to load
+    :type path: str
+    :return: the empty dataset
+    :rtype: Instances
+    """
+    if path.lower().endswith(".arff"):
+        loader = JClass("weka.core.converters.ArffLoader")()
+        loader.setFile(JClass("java.io.File")(path))
+        return Instances(loader.getStructure())
+    obj = JClass("weka.core.SerializationHelper").read(path)
+    if not isinstance(obj, JClass("weka.core.Instances")):
+        raise Exception("File does not contain a serialized Instances object: %s" % path)
+    return Instances(JClass("weka.core.Instances")(obj, 0))
+
+
+def set_class_index(data: Instances, class_index: str):
+    """
+    Sets the class index in the same fashion as weka.core.converters.Loader.load_file.
+
+    :param data: the dataset to update
+    :type data: Instances
+    :param class_index: the class index string to use ('first', 'second', 'third', 'last-2', 'last-1', 'last' or index)
+    :type class_index: str
+    """
+    if class_index is None:
+        return
+    if class_index == 'first':
+        data.class_index = 0
+    elif class_index == 'second':
+        data.class_index = 1
+    elif class_index == 'third':
+        data.class_index = 2
+    elif class_index == 'last-2':
+        data.class_index = data.num_attributes - 3
+    elif class_index == 'last-1':
+        data.class_index = data.num_attributes - 2
+    elif class_index == 'last':
+        data.class_index = data.num_attributes - 1
+    else:
+        data.class_index = int(class_index)
+
+
+def non_numeric_attributes(header: Instances) -> List[Tuple[int, bool]]:
+    """
+    Determines the string and relational attributes, whose values are stored in
+    the attributes of the dataset rather than in the rows.
+
+    :param header: the structure to check
+    :type header: Instances
+    :return: the list of attribute index and whether it is a string attribute (otherwise relational)
+    :rtype: list
+    """
+    result = []
+    for i in range(header.num_attributes):
+        att = header.attribute(i)
+        if att.is_string or att.is_relation_valued:
+            result.append((i, att.is_string))
+    return result
+
+
+def transfer_values(jinst, jdata, non_numeric: List[Tuple[int, bool]]):
+    """
+    Stores the string/relational values of the row in the attributes of the
+    dataset and updates the row to point to them. Must be called before the
+    row gets added to the dataset, while the row still refers to its old dataset.
+
+    :param jinst: the weka.core.Instance to update
+    :param jdata: the weka.core.Instances to store the values in
+    :param non_numeric: the string/relational attributes, see non_numeric_attributes
+    :type non_numeric: list
+    """
+    for i, is_string in non_numeric:
+        if not jinst.isMissing(i):
+            if is_string:
+                jinst.setValue(i, float(jdata.attribute(i).addStringValue(jinst.stringValue(i))))
+            else:
+                jinst.setValue(i, float(jdata.attribute(i).addRelation(jinst.relationalValue(i))))
@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import os
+from typing import Optional
+
+import numpy as np
+
+from weka.core.dataset import Instances
+from ._data import supports_matrix, instances_to_matrix, matrix_to_instances, header_to_string, header_from_string
+from ._disk_cache import DiskCache
+
+SUFFIX_MATRIX = ".npy"
+SUFFIX_HEADER = ".arff"
+
+
+class DatasetCache:
+    """
+    Caches parsed datasets in binary form: the ARFF header and a memory-mappable
+    column-major matrix of the internal values (incl weights). The entries are keyed
+    by the absolute path, size and modification time of the file as well as the
+    loader that was used for parsing it.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = None, logger: logging.Logger = None):
+        """
+        Initializes the cache.
+
+        :param cache_dir: the directory to store the entries in
+        :type cache_dir: str
+        :param max_size: the maximum size in bytes of all entries, no limit if None or <=0
+        :type max_size: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        self._cache = DiskCache(cache_dir, max_size=max_size, logger=logger)
+        self._logger = logger
+
+    @property
+    def cache_dir(self) -> str:
+        """
+        Returns the cache directory.
+
+        :return: the directory
+        :rtype: str
+        """
+        return self._cache.cache_dir
+
+    def key(self, path: str, loader: str = None) -> str:
+        """
+        Generates the key for the file.
+
+        :param path: the file to generate the key for
+        :type path: str
+        :param loader: the command-line of the loader, None if auto-detected
+        :type loader: str
+        :return: the key
+        :rtype: str
+        """
+        stat = os.stat(path)
+        s = "%s|%d|%d|%s" % (os.path.abspath(path), stat.st_size, stat.st_mtime_ns, "auto" if loader is None else loader)
+        return hashlib.sha1(s.encode("utf-8")).hexdigest()
+
+    def load(self, path: str, loader: str = None) -> Optional[Instances]:
+        """
+        Loads the dataset from the cache.
+
+        :param path: the file to load the dataset for
+        :type path: str
+        :param loader: the command-line of the loader, None if auto-detected
+        :type loader: str
+        :return: the dataset, None if not cached
+        :rtype: Instances
+        """
+        key = self.key(path, loader=loader)
+        if not self._cache.lookup(key, [SUFFIX_MATRIX, SUFFIX_HEADER]):
+            return None
+        with open(self._cache.path(key, SUFFIX_HEADER), "r", encoding="utf-8") as fp:
+            header = header_from_string(fp.read())
+        matrix = np.load(self._cache.path(key, SUFFIX_MATRIX), mmap_mode="r")
+        return matrix_to_instances(header, matrix)
+
+    def store(self, path: str, data: Instances, loader: str = None) -> bool:
+        """
+        Stores the dataset in the cache. Datasets with string or relational
+        attributes cannot be cached.
+
+        :param path: the file the dataset was loaded from
+        :type path: str
+        :param data: the dataset to store
+        :type data: Instances
+        :param loader: the command-line of the loader, None if auto-detected
+        :type loader: str
+        :return: whether the dataset was stored
+        :rtype: bool
+        """
+        if not supports_matrix(data):
+            if self._logger is not None:
+                self._logger.info("Dataset contains string/relational attributes, not cached: %s" % path)
+            return False
+        key = self.key(path, loader=loader)
+        # the matrix gets moved into place first, the header marks the entry as complete
+        files = {
+            SUFFIX_MATRIX: self._cache.temp_path(key, SUFFIX_MATRIX),
+            SUFFIX_HEADER: self._cache.temp_path(key, SUFFIX_HEADER),
+        }
+        try:
+            with open(files[SUFFIX_MATRIX], "wb") as fp:
+                np.save(fp, instances_to_matrix(data))
+            with open(files[SUFFIX_HEADER], "w", encoding="utf-8") as fp:
+                fp.write(header_to_string(data))
+            self._cache.commit(key, files)
+        finally:
+            self._cache.remove_temp(files)
+        return True
+
+    def statistics(self) -> str:
+        """
+        Returns the statistics of the cache as string.
+
+        :return: the statistics
+        :rtype: str
+        """
+        return self._cache.statistics()
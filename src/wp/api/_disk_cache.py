@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+
+class DiskCache:
+    """
+    Directory-based cache with least-recently-used eviction once the total size
+    of the entries exceeds the limit. An entry consists of one or more files that
+    share the key as prefix (key + suffix). The last access of an entry is
+    recorded in the modification time of its files.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = None, logger: logging.Logger = None):
+        """
+        Initializes the cache.
+
+        :param cache_dir: the directory to store the entries in
+        :type cache_dir: str
+        :param max_size: the maximum size in bytes of all entries, no limit if None or <=0
+        :type max_size: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        self.cache_dir = cache_dir
+        self.max_size = max_size if ((max_size is not None) and (max_size > 0)) else None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._logger = logger
+        self._lock = threading.Lock()
+        # key -> [size, last access, files]
+        self._entries: Dict[str, List] = dict()
+        self._scan()
+
+    def _scan(self):
+        """
+        Collects the entries that are present in the cache directory.
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+        self._entries = dict()
+        for f in os.scandir(self.cache_dir):
+            if not f.is_file() or f.name.startswith("."):
+                continue
+            key = f.name.split(".")[0]
+            stat = f.stat()
+            if key not in self._entries:
+                self._entries[key] = [0, 0.0, []]
+            self._entries[key][0] += stat.st_size
+            self._entries[key][1] = max(self._entries[key][1], stat.st_mtime)
+            self._entries[key][2].append(f.path)
+
+    def path(self, key: str, suffix: str) -> str:
+        """
+        Returns the path of the file of an entry.
+
+        :param key: the key of the entry
+        :type key: str
+        :param suffix: the suffix of the file (incl dot)
+        :type suffix: str
+        :return: the path
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, key + suffix)
+
+    def temp_path(self, key: str, suffix: str) -> str:
+        """
+        Returns a temporary path for writing a file of an entry. Once written,
+        it needs to get moved into place with commit.
+
+        :param key: the key of the entry
+        :type key: str
+        :param suffix: the suffix of the file (incl dot)
+        :type suffix: str
+        :return: the path
+        :rtype: str
+        """
+        return os.path.join(self.cache_dir, ".%s%s.%d.%d.tmp" % (key, suffix, os.getpid(), threading.get_ident()))
+
+    def lookup(self, key: str, suffixes: List[str]) -> bool:
+        """
+        Checks whether all files of the entry are present, updates the statistics
+        and the last access of the entry.
+
+        :param key: the key of the entry
+        :type key: str
+        :param suffixes: the suffixes of the files that make up the entry
+        :type suffixes: list
+        :return: True if present
+        :rtype: bool
+        """
+        with self._lock:
+            for suffix in suffixes:
+                if not os.path.exists(self.path(key, suffix)):
+                    self.misses += 1
+                    return False
+            now = time.time()
+            for suffix in suffixes:
+                os.utime(self.path(key, suffix), (now, now))
+            if key in self._entries:
+                self._entries[key][1] = now
+            self.hits += 1
+            return True
+
+    def commit(self, key: str, files: Dict[str, str]):
+        """
+        Moves the temporary files into place (in the supplied order) and evicts
+        old entries if necessary.
+
+        :param key: the key of the entry
+        :type key: str
+        :param files: the mapping between suffix and temporary file
+        :type files: dict
+        """
+        with self._lock:
+            size = 0
+            paths = []
+            for suffix in files:
+                size += os.path.getsize(files[suffix])
+                paths.append(self.path(key, suffix))
+                os.replace(files[suffix], paths[-1])
+            self._entries[key] = [size, time.time(), paths]
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used entries until the cache fits its size again.
+        Always keeps the most recent entry.
+        """
+        if self.max_size is None:
+            return
+        total = sum(x[0] for x in self._entries.values())
+        if total <= self.max_size:
+            return
+        for key in sorted(self._entries, key=lambda k: self._entries[k][1])[:-1]:
+            for path in self._entries[key][2]:
+                if os.path.exists(path):
+                    os.remove(path)
+            total -= self._entries[key][0]
+            del self._entries[key]
+            self.evictions += 1
+            if self._logger is not None:
+                self._logger.debug("Evicted cache entry: %s" % key)
+            if total <= self.max_size:
+                break
+
+    @property
+    def size(self) -> int:
+        """
+        Returns the total size of the entries in bytes.
+
+        :return: the size
+        :rtype: int
+        """
+        return sum(x[0] for x in self._entries.values())
+
+    def statistics(self) -> str:
+        """
+        Returns the statistics of the cache as string.
+
+        :return: the statistics
+        :rtype: str
+        """
+        return "hits=%d, misses=%d, evictions=%d, entries=%d, size=%d bytes" \
+               % (self.hits, self.misses, self.evictions, len(self._entries), self.size)
+
+    def remove_temp(self, files: Optional[Dict[str, str]]):
+        """
+        Removes any left-over temporary files.
+
+        :param files: the mapping between suffix and temporary file
+        :type files: dict
+        """
+        if files is None:
+            return
+        for suffix in files:
+            if os.path.exists(files[suffix]):
+                os.remove(files[suffix])
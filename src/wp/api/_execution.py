@@ -0,0 +1,298 @@
+import abc
+from typing import List, Optional, Union
+
+from seppl import Initializable, Session, init_initializable
+from seppl.io import Reader, InfiniteReader, BatchFilter, MultiFilter, Writer, StreamWriter, BatchWriter, filter_data
+
+from ._session import STORAGE_END_OF_INPUT, set_completion_handler, get_completion_handler, complete_input
+
+
+_UNSET = object()
+
+
+class BufferingFilter(abc.ABC):
+    """
+    Mixin for filters that buffer data across calls and need to be told when
+    to flush the buffer, i.e., when the reader moves on to the next input or
+    when it has finished.
+    """
+
+    @abc.abstractmethod
+    def flush_buffer(self) -> Optional[List]:
+        """
+        Processes any buffered data and returns the output.
+
+        :return: the processed data, None if nothing buffered
+        :rtype: list
+        """
+        raise NotImplementedError()
+
+
+def _expand_filters(filters: List[BatchFilter]) -> List[BatchFilter]:
+    """
+    Replaces any multi-filters with the filters they wrap.
+
+    :param filters: the filters to expand
+    :type filters: list
+    :return: the filters in the order they get applied
+    :rtype: list
+    """
+    result = []
+    for filter_ in filters:
+        if isinstance(filter_, MultiFilter) and (filter_.filters is not None):
+            result.extend(_expand_filters(filter_.filters))
+        else:
+            result.append(filter_)
+    return result
+
+
+def _flush_buffers(filters: List[BatchFilter], session: Session, current_input=_UNSET) -> List:
+    """
+    Flushes the buffers of the filters and passes the output through the
+    downstream filters. While flushing, the session reports the specified input
+    as the current one and that the end of the input has been reached.
+
+    :param filters: the filters to flush
+    :type filters: list
+    :param session: the session object to use
+    :type session: Session
+    :param current_input: the input the buffered data belongs to, leaves the session's one untouched if not specified
+    :return: the flushed data
+    :rtype: list
+    """
+    result = []
+    stages = _expand_filters(filters)
+    if not any(isinstance(x, BufferingFilter) for x in stages):
+        return result
+
+    # the buffered data belongs to the previous input
+    restore_input = getattr(session, "current_input", None)
+    restore_end = session.storage.get(STORAGE_END_OF_INPUT, _UNSET)
+    if current_input is not _UNSET:
+        session.current_input = current_input
+    if restore_end is not _UNSET:
+        session.storage[STORAGE_END_OF_INPUT] = True
+    try:
+        for i, stage in enumerate(stages):
+            if not isinstance(stage, BufferingFilter):
+                continue
+            flushed = stage.flush_buffer()
+            if (flushed is None) or (len(flushed) == 0):
+                continue
+            if i == len(stages) - 1:
+                result.extend(flushed)
+                continue
+            for filtered in filter_data(flushed, stages[i + 1:], session=session):
+                if isinstance(filtered, list):
+                    result.extend(filtered)
+                elif filtered is not None:
+                    result.append(filtered)
+    finally:
+        session.current_input = restore_input
+        if restore_end is not _UNSET:
+            session.storage[STORAGE_END_OF_INPUT] = restore_end
+    return result
+
+
+def _write(writer: Optional[Writer], data):
+    """
+    Forwards the data to the writer, if any.
+
+    :param writer: the writer to use, can be None
+    :type writer: Writer
+    :param data: the data to write
+    """
+    if writer is None:
+        return
+    if isinstance(writer, StreamWriter):
+        writer.write_stream(data)
+    elif isinstance(writer, BatchWriter):
+        writer.write_batch(data)
+    else:
+        raise Exception("Neither stream nor batch writer: %s" % str(type(writer)))
+
+
+def _stream_execution(reader: Reader, filters: List[BatchFilter], writer: Optional[Writer], session: Session):
+    """
+    Executes the pipeline in streaming mode.
+
+    :param reader: the reader to use
+    :type reader: Reader
+    :param filters: the filters to use
+    :type filters: list
+    :param writer: the writer to use, can be None
+    :type writer: Writer
+    :param session: the session object to use
+    :type session: Session
+    """
+    last_input = _UNSET
+    while True:
+        for item in reader.read():
+            if item is None:
+                continue
+            if session.stopped:
+                return
+            # flush any data that filters buffered for the previous input
+            current_input = getattr(session, "current_input", None)
+            if (last_input is not _UNSET) and (current_input != last_input):
+                for flushed in _flush_buffers(filters, session, current_input=last_input):
+                    _write(writer, flushed)
+            last_input = current_input
+            session.count += 1
+            for filtered in filter_data(item, filters, session=session):
+                if session.stopped:
+                    return
+                if filtered is not None:
+                    _write(writer, filtered)
+            if session.count % session.options.update_interval == 0:
+                session.logger.info("%d records processed..." % session.count)
+        if reader.has_finished():
+            break
+    if session.stopped:
+        return
+    for flushed in _flush_buffers(filters, session):
+        _write(writer, flushed)
+
+
+def _batch_execution(reader: Reader, filters: List[BatchFilter], writer: Optional[Writer], session: Session):
+    """
+    Executes the pipeline in batch mode.
+
+    :param reader: the reader to use
+    :type reader: Reader
+    :param filters: the filters to use
+    :type filters: list
+    :param writer: the writer to use, can be None
+    :type writer: Writer
+    :param session: the session object to use
+    :type session: Session
+    """
+    # the inputs only get completed once the data has been written
+    completions = []
+    handler = get_completion_handler(session)
+    set_completion_handler(session, completions.append)
+    data = []
+    try:
+        while True:
+            for item in reader.read():
+                if item is None:
+                    continue
+                if session.stopped:
+                    return
+                session.count += 1
+                data.append(item)
+                if session.count % session.options.update_interval == 0:
+                    session.logger.info("%d records read..." % session.count)
+            if reader.has_finished():
+                break
+    finally:
+        set_completion_handler(session, handler)
+    if session.stopped:
+        return
+
+    if len(filters) > 0:
+        filtered_data = []
+        for filtered in filter_data(data, filters, session=session):
+            if session.stopped:
+                return
+            if isinstance(filtered, list):
+                filtered_data.extend(filtered)
+            elif filtered is not None:
+                filtered_data.append(filtered)
+        filtered_data.extend(_flush_buffers(filters, session))
+        session.logger.info("%d records filtered..." % session.count)
+        data = filtered_data
+    if session.stopped:
+        return
+
+    if isinstance(writer, StreamWriter):
+        for i, item in enumerate(data, start=1):
+            writer.write_stream(item)
+            if i % session.options.update_interval == 0:
+                session.logger.info("%d records written..." % i)
+    else:
+        _write(writer, data)
+    for callback in completions:
+        complete_input(session, callback)
+
+
+def execute_pipeline(reader: Reader, filters: Optional[Union[BatchFilter, List[BatchFilter]]], writer: Optional[Writer],
+                     session: Session, pre_initialize=None, post_finalize=None):
+    """
+    Executes the pipeline like seppl.io.execute, but propagates errors that occur
+    while initializing, processing or finalizing, i.e., the caller can tell whether
+    the pipeline succeeded. The plugins that were initialized always get finalized
+    (in reverse order, i.e., the writer completes its output before the reader gets
+    finalized) and post_finalize always gets called, even if the pipeline failed.
+
+    :param reader: the reader to use
+    :type reader: Reader
+    :param filters: the filter(s) to use, can be None
+    :type filters: list or BatchFilter
+    :param writer: the writer to use, can be None
+    :type writer: Writer
+    :param session: the session object to use
+    :type session: Session
+    :param pre_initialize: optional method to execute before the plugins get initialized, takes the session object as only parameter
+    :param post_finalize: optional method to execute after the plugins have been finalized, takes the session object as only parameter
+    """
+    if isinstance(filters, BatchFilter):
+        filters_ = [filters]
+    elif isinstance(filters, list):
+        filters_ = filters
+    elif filters is None:
+        filters_ = []
+    else:
+        raise Exception("Unhandled filter(s) type: %s" % str(type(filters)))
+
+    reader.session = session
+    for filter_ in filters_:
+        filter_.session = session
+    if writer is not None:
+        writer.session = session
+
+    error = None
+    initialized = []
+    try:
+        if pre_initialize is not None:
+            pre_initialize(session)
+        plugins = [(reader, "reader")] + [(x, "filter") for x in filters_]
+        if writer is not None:
+            plugins.append((writer, "writer"))
+        for plugin, plugin_type in plugins:
+            if isinstance(plugin, Initializable):
+                initialized.append(plugin)
+                init_initializable(plugin, plugin_type, raise_again=True)
+
+        batch_mode = session.options.force_batch or isinstance(writer, BatchWriter)
+        if isinstance(reader, InfiniteReader) and reader.is_infinite():
+            if session.options.force_batch:
+                session.logger.warning("Reader produces data infinitely, disabling batch mode!")
+            batch_mode = False
+        if batch_mode:
+            _batch_execution(reader, filters_, writer, session)
+        else:
+            _stream_execution(reader, filters_, writer, session)
+        session.logger.info("%d records processed in total." % session.count)
+    except BaseException as e:
+        error = e
+
+    # clean up, the first error wins
+    for plugin in reversed(initialized):
+        try:
+            plugin.finalize()
+        except Exception as e:
+            if error is None:
+                error = e
+            else:
+                session.logger.error("Failed to finalize %s: %s" % (plugin.name(), str(e)))
+    if post_finalize is not None:
+        try:
+            post_finalize(session)
+        except Exception as e:
+            if error is None:
+                error = e
+            else:
+                session.logger.error("Failed to execute post-finalization: %s" % str(e))
+    if error is not None:
+        raise error
@@ -0,0 +1,232 @@
+import csv
+import hashlib
+import io
+import logging
+import math
+import mmap
+import os
+import re
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from weka.core.dataset import Instances, Attribute
+from ._data import matrix_to_instances, header_from_string
+
+_ARFF_DATA = re.compile(rb"^[ \t]*@data[ \t]*\r?$", re.IGNORECASE | re.MULTILINE)
+
+_ARFF_RELATION = re.compile(rb"^[ \t]*@relation[ \t]+([^'\"\\\s]+)[ \t]*\r?$", re.IGNORECASE | re.MULTILINE)
+
+_MISSING = re.compile(rb"(^|,)[ \t]*\?[ \t]*(?=,|\r?$)", re.MULTILINE)
+
+
+def _nominal_converter(labels: Dict[str, int]):
+    """
+    Returns a converter for np.loadtxt that turns nominal labels into their indices.
+
+    :param labels: the mapping between label and index
+    :type labels: dict
+    :return: the converter
+    """
+    def _convert(s):
+        s = s.strip()
+        if s in labels:
+            return float(labels[s])
+        if s == "nan":
+            return math.nan
+        raise ValueError("Unknown label: %s" % s)
+    return _convert
+
+
+def _parse_matrix(content: bytes, num_cols: int, converters: Dict = None) -> np.ndarray:
+    """
+    Parses the comma-separated values into a matrix (rows x num_cols+1) with
+    the weights (all 1) in the last column.
+
+    :param content: the data to parse
+    :type content: bytes
+    :param num_cols: the number of columns to expect
+    :type num_cols: int
+    :param converters: the converters for nominal columns
+    :type converters: dict
+    :return: the matrix
+    :rtype: np.ndarray
+    """
+    if b"?" in content:
+        content = _MISSING.sub(rb"\1nan", content)
+    values = np.loadtxt(io.BytesIO(content), delimiter=",", comments="%",
+                        converters=converters, dtype=np.float64, encoding="utf-8", ndmin=2)
+    if values.size == 0:
+        values = np.empty((0, num_cols), dtype=np.float64)
+    if values.shape[1] != num_cols:
+        raise ValueError("Expected %d columns but found %d" % (num_cols, values.shape[1]))
+    result = np.ones((values.shape[0], num_cols + 1), dtype=np.float64)
+    result[:, :num_cols] = values
+    return result
+
+
+def _parse_arff_header(header: bytes) -> Tuple[Optional[Instances], Dict, Optional[str]]:
+    """
+    Parses the ARFF header and generates the converters for the nominal attributes.
+
+    :param header: the header to parse
+    :type header: bytes
+    :return: the tuple of header (None if not supported), converters and reason for not being supported
+    :rtype: tuple
+    """
+    try:
+        data = header_from_string(header.decode("utf-8") + "\n")
+    except Exception as e:
+        return None, dict(), "failed to parse header: %s" % str(e)
+
+    converters = dict()
+    for i in range(data.num_attributes):
+        att = data.attribute(i)
+        if att.is_nominal:
+            labels = dict()
+            for n in range(att.num_values):
+                labels[att.value(n)] = n
+            if "nan" in labels:
+                return None, dict(), "ambiguous label 'nan'"
+            converters[i] = _nominal_converter(labels)
+        elif not att.is_numeric or att.is_date:
+            return None, dict(), "attribute type not supported: %s" % att.name
+    return data, converters, None
+
+
+def fast_parse_arff(path: str, logger: logging.Logger = None, headers: Dict = None) -> Optional[Instances]:
+    """
+    Parses a dense ARFF file with numeric and nominal attributes using NumPy.
+    Returns None if the file uses features that are not supported: string, date
+    and relational attributes, sparse rows, instance weights and quoted values.
+
+    :param path: the ARFF file to parse
+    :type path: str
+    :param logger: the optional logger for outputting the reason for not parsing the file
+    :type logger: logging.Logger
+    :param headers: the cache for parsed headers (hash of header -> header and converters), not used if None
+    :type headers: dict
+    :return: the dataset, None if not supported
+    :rtype: Instances
+    """
+    def _unsupported(reason):
+        if logger is not None:
+            logger.info("Cannot parse '%s' natively (%s), falling back to Weka loader" % (path, reason))
+        return None
+
+    if os.path.getsize(path) == 0:
+        return _unsupported("empty file")
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            match = _ARFF_DATA.search(mm)
+            if match is None:
+                return _unsupported("no @data section")
+            header = mm[:match.end()]
+            content = mm[match.end():]
+    for c in [b"{", b"'", b'"']:
+        if c in content:
+            return _unsupported("sparse/weighted rows or quoted values")
+    relation = None
+    if headers is None:
+        data, converters, reason = _parse_arff_header(header)
+    else:
+        # unquoted relation names are not part of the key, allowing files with different names to share the header
+        key = header
+        match = _ARFF_RELATION.search(header)
+        if match is not None:
+            relation = match.group(1).decode("utf-8")
+            key = header[:match.start()] + header[match.end():]
+        key = hashlib.sha1(key).hexdigest()
+        if key not in headers:
+            headers[key] = _parse_arff_header(header)
+        data, converters, reason = headers[key]
+    if data is None:
+        return _unsupported(reason)
+
+    try:
+        matrix = _parse_matrix(content, data.num_attributes, converters=converters)
+    except Exception as e:
+        return _unsupported(str(e))
+    result = matrix_to_instances(data, matrix)
+    if (relation is not None) and (result.relationname != relation):
+        result.relationname = relation
+    return result
+
+
+def fast_parse_csv(path: str, logger: logging.Logger = None, headers: Dict = None) -> Optional[Instances]:
+    """
+    Parses a CSV file with a header row and only numeric columns using NumPy.
+    Returns None if the file contains non-numeric values or quoted values.
+
+    :param path: the CSV file to parse
+    :type path: str
+    :param logger: the optional logger for outputting the reason for not parsing the file
+    :type logger: logging.Logger
+    :param headers: the cache for parsed headers (hash of header -> header), not used if None
+    :type headers: dict
+    :return: the dataset, None if not supported
+    :rtype: Instances
+    """
+    def _unsupported(reason):
+        if logger is not None:
+            logger.info("Cannot parse '%s' natively (%s), falling back to Weka loader" % (path, reason))
+        return None
+
+    if os.path.getsize(path) == 0:
+        return _unsupported("empty file")
+    with open(path, "rb") as fp:
+        with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            end = mm.find(b"\n")
+            header = mm[:end] if end > -1 else mm[:]
+            content = mm[len(header):]
+    for c in [b"'", b'"', b"%"]:
+        if c in content:
+            return _unsupported("quoted values or comments")
+    relation = os.path.splitext(os.path.basename(path))[0]
+    key = None
+    data = None
+    if headers is not None:
+        key = hashlib.sha1(header.strip()).hexdigest()
+        if key in headers:
+            data = headers[key]
+    if data is None:
+        names = next(csv.reader([header.decode("utf-8").strip()]))
+        if len(names) == 0:
+            return _unsupported("no columns")
+        atts = [Attribute.create_numeric(name.strip()) for name in names]
+        data = Instances.create_instances(relation, atts, 0)
+        if key is not None:
+            headers[key] = data
+
+    try:
+        matrix = _parse_matrix(content, data.num_attributes)
+    except Exception as e:
+        return _unsupported(str(e))
+    result = matrix_to_instances(data, matrix)
+    result.relationname = relation
+    return result
+
+
+def fast_parse(path: str, logger: logging.Logger = None, headers: Dict = None) -> Optional[Instances]:
+    """
+    Parses ARFF or CSV files using NumPy, based on the file extension.
+    Returns None if the file is not supported.
+
+    :param path: the file to parse
+    :type path: str
+    :param logger: the optional logger for outputting the reason for not parsing the file
+    :type logger: logging.Logger
+    :param headers: the cache for parsed headers, not used if None
+    :type headers: dict
+    :return: the dataset, None if not supported
+    :rtype: Instances
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".arff":
+        return fast_parse_arff(path, logger=logger, headers=headers)
+    elif ext == ".csv":
+        return fast_parse_csv(path, logger=logger, headers=headers)
+    else:
+        if logger is not None:
+            logger.info("Cannot parse '%s' natively (unsupported extension), falling back to Weka loader" % path)
+        return None
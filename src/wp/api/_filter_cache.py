@@ -0,0 +1,124 @@
+import hashlib
+import logging
+from typing import Optional
+
+from jpype import JClass
+from weka.core.dataset import Instances
+from weka.filters import Filter
+from ._data import supports_matrix, instances_to_matrix, header_to_string
+from ._disk_cache import DiskCache
+
+SUFFIX_FILTER = ".model"
+
+
+def _digest(jobject) -> bytes:
+    """
+    Computes the SHA-1 digest of the serialized Java object within the JVM,
+    i.e., neither the object nor its serialized form get transferred into Python.
+
+    :param jobject: the serializable Java object
+    :return: the digest
+    :rtype: bytes
+    """
+    digest = JClass("java.security.MessageDigest").getInstance("SHA-1")
+    stream = JClass("java.io.ObjectOutputStream")(
+        JClass("java.security.DigestOutputStream")(JClass("java.io.OutputStream").nullOutputStream(), digest))
+    stream.writeObject(jobject)
+    stream.close()
+    return bytes(digest.digest())
+
+
+class FilterCache:
+    """
+    Caches initialized filters, i.e., filters that have processed their first
+    batch of data. The entries are keyed by the command-line of the filter and
+    a hash of the content of the data it got initialized with.
+    """
+
+    def __init__(self, cache_dir: str, max_size: int = None, logger: logging.Logger = None):
+        """
+        Initializes the cache.
+
+        :param cache_dir: the directory to store the entries in
+        :type cache_dir: str
+        :param max_size: the maximum size in bytes of all entries, no limit if None or <=0
+        :type max_size: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        self._cache = DiskCache(cache_dir, max_size=max_size, logger=logger)
+        self._logger = logger
+
+    @property
+    def cache_dir(self) -> str:
+        """
+        Returns the cache directory.
+
+        :return: the directory
+        :rtype: str
+        """
+        return self._cache.cache_dir
+
+    def key(self, filter_cmdln: str, data: Instances) -> str:
+        """
+        Generates the key for the filter and the data. Datasets without string or
+        relational attributes get hashed via their internal values (incl weights),
+        all others via their serialized form. In both cases, the data gets transferred
+        in bulk rather than row by row.
+
+        :param filter_cmdln: the command-line of the filter
+        :type filter_cmdln: str
+        :param data: the data the filter gets initialized with
+        :type data: Instances
+        :return: the key
+        :rtype: str
+        """
+        h = hashlib.sha1()
+        h.update(filter_cmdln.encode("utf-8"))
+        h.update(("|%d|" % data.class_index).encode("utf-8"))
+        if supports_matrix(data):
+            h.update(header_to_string(data).encode("utf-8"))
+            h.update(instances_to_matrix(data).tobytes())
+        else:
+            h.update(_digest(data.jobject))
+        return h.hexdigest()
+
+    def load(self, key: str) -> Optional[Filter]:
+        """
+        Loads the filter from the cache.
+
+        :param key: the key of the filter
+        :type key: str
+        :return: the filter, None if not cached
+        :rtype: Filter
+        """
+        if not self._cache.lookup(key, [SUFFIX_FILTER]):
+            return None
+        return Filter.deserialize(self._cache.path(key, SUFFIX_FILTER))
+
+    def store(self, key: str, filter_: Filter):
+        """
+        Stores the initialized filter in the cache.
+
+        :param key: the key of the filter
+        :type key: str
+        :param filter_: the filter to store
+        :type filter_: Filter
+        """
+        files = {
+            SUFFIX_FILTER: self._cache.temp_path(key, SUFFIX_FILTER),
+        }
+        try:
+            filter_.serialize(files[SUFFIX_FILTER])
+            self._cache.commit(key, files)
+        finally:
+            self._cache.remove_temp(files)
+
+    def statistics(self) -> str:
+        """
+        Returns the statistics of the cache as string.
+
+        :return: the statistics
+        :rtype: str
+        """
+        return self._cache.statistics()
@@ -0,0 +1,533 @@
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Set
+
+from jpype import JClass
+
+from weka.core.converters import Saver
+from weka.core.dataset import Instances, Instance
+from ._compression import detect_compression, open_compressed, CompressingStream, close_after_error
+
+WRITE_BUFFER_DEFAULT = 1024 * 1024
+
+PLACEHOLDER_SEQUENCE = "{SEQ}"
+
+SEQUENCE_FORMAT = "%05d"
+
+ROTATE_CHECK_ROWS = 1000
+
+
+def supports_incremental(saver: Saver) -> bool:
+    """
+    Checks whether the saver can write rows one by one.
+
+    :param saver: the saver to check
+    :type saver: Saver
+    :return: True if incremental writing is supported
+    :rtype: bool
+    """
+    return isinstance(saver.jobject, JClass("weka.core.converters.IncrementalConverter"))
+
+
+class IncrementalWriter:
+    """
+    Writes rows one by one to a file, using the incremental mode of a Weka saver.
+    The saver writes through a buffer of the specified size, compressed files
+    get compressed in the background. When appending to an existing file, the
+    rows get written to a temporary file first, whose rows (i.e., without the
+    header) get appended to the file when closing the writer.
+    """
+
+    def __init__(self, saver: Saver, path: str, header: Instances, buffer_size: int = WRITE_BUFFER_DEFAULT,
+                 compression_level: int = None, compression_threads: int = 1, append: bool = False,
+                 logger: logging.Logger = None):
+        """
+        Initializes the writer.
+
+        :param saver: the saver to use, must support incremental writing
+        :type saver: Saver
+        :param path: the file to write to
+        :type path: str
+        :param header: the structure of the rows, should not contain any rows as the writer keeps it till closed
+        :type header: Instances
+        :param buffer_size: the size in bytes of the write buffer
+        :type buffer_size: int
+        :param compression_level: the compression level to use for compressed files, uses the default of the compression if None
+        :type compression_level: int
+        :param compression_threads: the number of threads to use for compressing files, if supported
+        :type compression_threads: int
+        :param append: whether to append the rows if the file already exists
+        :type append: bool
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        if not supports_incremental(saver):
+            raise Exception("Saver does not support incremental writing: %s" % saver.classname)
+        self.saver = saver
+        self.path = path
+        self.header = header
+        self.buffer_size = buffer_size
+        self.compression_level = compression_level
+        self.compression_threads = compression_threads
+        self.append = append
+        self.num_rows = 0
+        self._logger = logger
+        self._compressing: Optional[CompressingStream] = None
+        self._part: Optional[str] = None
+        self._open = False
+
+    def _configure(self, stream):
+        """
+        Configures the saver for writing rows to the stream.
+
+        :param stream: the Java output stream to write to
+        """
+        saver = self.saver.jobject
+        saver.setRetrieval(JClass("weka.core.converters.Saver").INCREMENTAL)
+        saver.setStructure(Instances.template_instances(self.header, 0).jobject)
+        saver.setDestination(stream)
+
+    def open(self):
+        """
+        Opens the file for writing.
+        """
+        # like the savers do when writing datasets
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        if self.append and os.path.exists(self.path):
+            self._part = os.path.join(os.path.dirname(self.path), ".%d.%d.%s.part" % (os.getpid(), id(self), os.path.basename(self.path)))
+            stream = JClass("java.io.FileOutputStream")(self._part)
+        elif detect_compression(self.path) is None:
+            stream = JClass("java.io.FileOutputStream")(self.path)
+        else:
+            self._compressing = CompressingStream(self.path, level=self.compression_level, threads=self.compression_threads)
+            stream = self._compressing.open()
+        self._configure(JClass("java.io.BufferedOutputStream")(stream, self.buffer_size))
+        self._open = True
+
+    def _header_bytes(self) -> bytes:
+        """
+        Generates the header that the saver writes before the rows.
+
+        :return: the header
+        :rtype: bytes
+        """
+        buffer = JClass("java.io.ByteArrayOutputStream")()
+        self._configure(buffer)
+        self.saver.jobject.writeIncremental(None)
+        return bytes(buffer.toByteArray())
+
+    def _append_part(self):
+        """
+        Appends the rows from the temporary file to the actual file.
+        """
+        header = self._header_bytes()
+        with open(self._part, "rb") as fp_in:
+            if fp_in.read(len(header)) != header:
+                raise Exception("Unexpected header in temporary file, cannot append: %s" % self._part)
+            if detect_compression(self.path) is None:
+                with open(self.path, "ab") as fp_out:
+                    shutil.copyfileobj(fp_in, fp_out)
+            else:
+                with open_compressed(self.path, level=self.compression_level, threads=self.compression_threads, append=True) as fp_out:
+                    shutil.copyfileobj(fp_in, fp_out)
+
+    def accepts_row(self, inst: Instance) -> bool:
+        """
+        Checks whether the row has the same structure as the rows written by this writer.
+
+        :param inst: the row to check
+        :type inst: Instance
+        :return: True if the same structure
+        :rtype: bool
+        """
+        # avoids wrapping the dataset, as this gets checked for every row
+        return bool(self.header.jobject.equalHeaders(inst.jobject.dataset()))
+
+    def write(self, inst: Instance):
+        """
+        Writes the row.
+
+        :param inst: the row to write
+        :type inst: Instance
+        """
+        if not self._open:
+            self.open()
+        self.saver.jobject.writeIncremental(inst.jobject)
+        self.num_rows += 1
+
+    def write_rows(self, data: Instances, indices):
+        """
+        Writes the specified rows of the dataset, which must have the same structure.
+
+        :param data: the dataset with the rows
+        :type data: Instances
+        :param indices: the 0-based indices of the rows to write
+        """
+        if not self._open:
+            self.open()
+        saver = self.saver.jobject
+        jdata = data.jobject
+        for index in indices:
+            saver.writeIncremental(jdata.instance(int(index)))
+            self.num_rows += 1
+
+    def close(self):
+        """
+        Finishes the file and re-raises any error that occurred during compression.
+        """
+        if not self._open:
+            return
+        self._open = False
+        compressing = self._compressing
+        self._compressing = None
+        try:
+            # null signals the saver to write any remaining data and close the destination
+            self.saver.jobject.writeIncremental(None)
+            if self._part is not None:
+                self._append_part()
+        except Exception:
+            if compressing is not None:
+                close_after_error(compressing, logger=self._logger)
+            raise
+        finally:
+            if self._part is not None:
+                if os.path.exists(self._part):
+                    os.remove(self._part)
+                self._part = None
+        if compressing is not None:
+            compressing.close()
+        if self._logger is not None:
+            self._logger.info("Wrote %d row(s) to: %s" % (self.num_rows, self.path))
+
+
+class IncrementalWriterPool:
+    """
+    Manages incremental writers for many files (e.g., one per partition of the
+    data), keeping at most the specified number of files open. The least recently
+    used writer gets closed when the limit is exceeded. Writing to a file that
+    was closed before appends to it.
+    """
+
+    def __init__(self, create_func, max_open: int, logger: logging.Logger = None):
+        """
+        Initializes the pool.
+
+        :param create_func: the function for creating a writer, takes the file, the structure and whether to append as arguments
+        :param max_open: the maximum number of files to keep open
+        :type max_open: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        if max_open < 1:
+            raise Exception("At least one file must be allowed to be open, got: %d" % max_open)
+        self._create_func = create_func
+        self._max_open = max_open
+        self._logger = logger
+        self._writers = OrderedDict()
+        self._written: Set[str] = set()
+        self.evictions = 0
+
+    def _open_writer(self, path: str, header: Instances) -> IncrementalWriter:
+        """
+        Creates the writer for the file, closing the least recently used writer(s)
+        if the limit is exceeded.
+
+        :param path: the file to write to
+        :type path: str
+        :param header: the structure of the rows to write
+        :type header: Instances
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        writer = self._create_func(path, header, path in self._written)
+        self._writers[path] = writer
+        self._written.add(path)
+        while len(self._writers) > self._max_open:
+            _, evicted = self._writers.popitem(last=False)
+            self.evictions += 1
+            if self._logger is not None:
+                self._logger.debug("Closing least recently used file: %s" % evicted.path)
+            evicted.close()
+        return writer
+
+    def _lookup(self, path: str, same_structure) -> Optional[IncrementalWriter]:
+        """
+        Returns the open writer for the file if it writes rows of the same structure.
+        A writer with a different structure gets closed and the file started anew.
+
+        :param path: the file to write to
+        :type path: str
+        :param same_structure: the function that checks whether the writer has the same structure
+        :return: the writer, None if none open for the file
+        :rtype: IncrementalWriter
+        """
+        writer = self._writers.get(path, None)
+        if writer is None:
+            return None
+        if same_structure(writer):
+            self._writers.move_to_end(path)
+            return writer
+        del self._writers[path]
+        writer.close()
+        self._written.discard(path)
+        return None
+
+    def get(self, path: str, header: Instances) -> IncrementalWriter:
+        """
+        Returns the writer for the file, opening it if necessary. If the structure
+        differs from the one of the open writer, the file gets started anew.
+
+        :param path: the file to write to
+        :type path: str
+        :param header: the structure of the rows to write
+        :type header: Instances
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        writer = self._lookup(path, lambda w: bool(w.header.jobject.equalHeaders(header.jobject)))
+        if writer is None:
+            writer = self._open_writer(path, Instances.template_instances(header, 0))
+        return writer
+
+    def get_for_row(self, path: str, inst: Instance) -> IncrementalWriter:
+        """
+        Returns the writer for the file and the row, see get.
+
+        :param path: the file to write to
+        :type path: str
+        :param inst: the row to write
+        :type inst: Instance
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        writer = self._lookup(path, lambda w: w.accepts_row(inst))
+        if writer is None:
+            writer = self._open_writer(path, Instances.template_instances(inst.dataset, 0))
+        return writer
+
+    @property
+    def num_files(self) -> int:
+        """
+        Returns the number of files that were written to.
+
+        :return: the number of files
+        :rtype: int
+        """
+        return len(self._written)
+
+    def close(self):
+        """
+        Closes all open writers.
+        """
+        while len(self._writers) > 0:
+            _, writer = self._writers.popitem(last=False)
+            writer.close()
+
+
+class RotatingWriter:
+    """
+    Writes rows to a sequence of files (segments), starting a new segment once
+    the current one reached the maximum number of rows, the maximum size or its
+    maximum age. The file names get generated from a template containing the
+    {SEQ} placeholder, skipping sequence numbers of files that already exist.
+    Segments get written under a temporary name and renamed once complete,
+    i.e., other processes never see partially written files. The age of a
+    segment gets checked in the background, i.e., segments also get completed
+    when no rows arrive. Errors that occur in the background get re-raised with
+    the next write or close.
+    """
+
+    def __init__(self, create_func, template: str, max_rows: int = None, max_bytes: int = None,
+                 max_seconds: float = None, logger: logging.Logger = None):
+        """
+        Initializes the writer.
+
+        :param create_func: the function for creating a writer, takes the file and the structure as arguments
+        :param template: the file name template, must contain the {SEQ} placeholder
+        :type template: str
+        :param max_rows: the maximum number of rows per segment, no limit if None or <=0
+        :type max_rows: int
+        :param max_bytes: the maximum size in bytes per segment (checked every 1000 rows and after each batch of rows), no limit if None or <=0
+        :type max_bytes: int
+        :param max_seconds: the maximum number of seconds a segment stays open (checked in the background), no limit if None or <=0
+        :type max_seconds: float
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        if PLACEHOLDER_SEQUENCE not in template:
+            raise Exception("File name template must contain the %s placeholder: %s" % (PLACEHOLDER_SEQUENCE, template))
+        self._create_func = create_func
+        self.template = template
+        self._max_rows = max_rows if (max_rows is not None) and (max_rows > 0) else None
+        self._max_bytes = max_bytes if (max_bytes is not None) and (max_bytes > 0) else None
+        self._max_seconds = max_seconds if (max_seconds is not None) and (max_seconds > 0) else None
+        self._logger = logger
+        self._seq = 0
+        self._writer: Optional[IncrementalWriter] = None
+        self._path: Optional[str] = None
+        self._started = 0.0
+        self._unchecked = 0
+        self.num_segments = 0
+        self._lock = threading.RLock()
+        self._error: Optional[Exception] = None
+        self._stop = threading.Event()
+        self._timer: Optional[threading.Thread] = None
+        if self._max_seconds is not None:
+            self._timer = threading.Thread(target=self._rotate_on_time, name="rotate", daemon=True)
+            self._timer.start()
+
+    def _rotate_on_time(self):
+        """
+        Completes segments that reached their maximum age till the writer gets closed.
+        """
+        wait = self._max_seconds
+        while not self._stop.wait(wait):
+            with self._lock:
+                wait = self._max_seconds
+                if (self._writer is None) or (self._writer.num_rows == 0):
+                    continue
+                remaining = self._started + self._max_seconds - time.monotonic()
+                if remaining > 0:
+                    wait = remaining
+                    continue
+                try:
+                    self.rotate()
+                except Exception as e:
+                    if self._logger is not None:
+                        self._logger.error("Failed to complete segment: %s" % str(e))
+                    self._error = e
+                    return
+
+    def _check_error(self):
+        """
+        Re-raises the error that occurred in the background, if any.
+        """
+        if self._error is not None:
+            error = self._error
+            self._error = None
+            raise error
+
+    def _next_path(self) -> str:
+        """
+        Returns the file for the next segment, skipping existing files.
+
+        :return: the file
+        :rtype: str
+        """
+        while True:
+            path = self.template.replace(PLACEHOLDER_SEQUENCE, SEQUENCE_FORMAT % self._seq)
+            self._seq += 1
+            if not os.path.exists(path):
+                return path
+
+    def _segment_full(self) -> bool:
+        """
+        Checks whether the current segment reached one of its limits.
+
+        :return: True if full
+        :rtype: bool
+        """
+        if (self._max_rows is not None) and (self._writer.num_rows >= self._max_rows):
+            return True
+        if (self._max_seconds is not None) and (time.monotonic() - self._started >= self._max_seconds):
+            return True
+        if (self._max_bytes is not None) and (self._unchecked >= ROTATE_CHECK_ROWS):
+            self._unchecked = 0
+            if os.path.exists(self._writer.path) and (os.path.getsize(self._writer.path) >= self._max_bytes):
+                return True
+        return False
+
+    def _segment(self, same_structure, header_func) -> IncrementalWriter:
+        """
+        Returns the writer for the current segment, starting a new segment if
+        the current one is full or has a different structure.
+
+        :param same_structure: the function that checks whether the writer has the same structure
+        :param header_func: the function returning the structure for a new segment
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        if self._writer is not None:
+            if not same_structure(self._writer) or ((self._writer.num_rows > 0) and self._segment_full()):
+                self.rotate()
+        if self._writer is None:
+            self._path = self._next_path()
+            tmp = os.path.join(os.path.dirname(self._path), ".%d.%s" % (os.getpid(), os.path.basename(self._path)))
+            self._writer = self._create_func(tmp, header_func())
+            self._started = time.monotonic()
+            self._unchecked = 0
+        return self._writer
+
+    def write(self, inst: Instance):
+        """
+        Writes the row.
+
+        :param inst: the row to write
+        :type inst: Instance
+        """
+        with self._lock:
+            self._check_error()
+            self._segment(lambda w: w.accepts_row(inst), lambda: Instances.template_instances(inst.dataset, 0)).write(inst)
+            self._unchecked += 1
+
+    def write_rows(self, data: Instances, indices):
+        """
+        Writes the specified rows of the dataset, splitting them across segments if necessary.
+
+        :param data: the dataset with the rows
+        :type data: Instances
+        :param indices: the 0-based indices of the rows to write
+        """
+        indices = list(indices)
+        start = 0
+        with self._lock:
+            self._check_error()
+            while start < len(indices):
+                writer = self._segment(lambda w: bool(w.header.jobject.equalHeaders(data.jobject)), lambda: Instances.template_instances(data, 0))
+                end = len(indices)
+                if self._max_rows is not None:
+                    end = min(end, start + self._max_rows - writer.num_rows)
+                writer.write_rows(data, indices[start:end])
+                # check the size after every batch
+                self._unchecked += max(end - start, ROTATE_CHECK_ROWS)
+                start = end
+
+    def rotate(self):
+        """
+        Completes the current segment, if any: closes it and renames it to its actual name.
+        """
+        with self._lock:
+            if self._writer is None:
+                return
+            writer = self._writer
+            path = self._path
+            self._writer = None
+            self._path = None
+            try:
+                writer.close()
+            except Exception:
+                if os.path.exists(writer.path):
+                    os.remove(writer.path)
+                raise
+            if not os.path.exists(writer.path):
+                # nothing got written
+                return
+            os.replace(writer.path, path)
+            self.num_segments += 1
+            if self._logger is not None:
+                self._logger.info("Completed segment: %s" % path)
+
+    def close(self):
+        """
+        Stops the background checks and completes the current segment.
+        """
+        if self._timer is not None:
+            self._stop.set()
+            self._timer.join()
+            self._timer = None
+        self.rotate()
+        self._check_error()
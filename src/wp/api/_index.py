@@ -0,0 +1,268 @@
+import json
+import os
+from typing import Dict, Iterator, Optional, Tuple
+
+INDEX_EXT = ".idx"
+
+INDEX_FORMAT_ARFF = "arff"
+INDEX_FORMAT_CSV = "csv"
+INDEX_FORMATS = [
+    INDEX_FORMAT_ARFF,
+    INDEX_FORMAT_CSV,
+]
+
+INDEX_EVERY_DEFAULT = 10000
+
+
+def index_path(path: str) -> str:
+    """
+    Returns the path of the index file for the data file.
+
+    :param path: the data file
+    :type path: str
+    :return: the index file
+    :rtype: str
+    """
+    return path + INDEX_EXT
+
+
+def _format_for_file(path: str) -> str:
+    """
+    Determines the index format from the file extension.
+
+    :param path: the data file
+    :type path: str
+    :return: the format, see INDEX_FORMATS
+    :rtype: str
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".arff":
+        return INDEX_FORMAT_ARFF
+    elif ext == ".csv":
+        return INDEX_FORMAT_CSV
+    else:
+        raise Exception("Cannot determine index format from extension: %s" % path)
+
+
+def _skip_header(fp, fmt: str) -> int:
+    """
+    Skips the header in the file, i.e., the ARFF header up to and including the
+    @data line or the first line of a CSV file.
+
+    :param fp: the file object (binary mode) positioned at the start
+    :param fmt: the format of the file, see INDEX_FORMATS
+    :type fmt: str
+    :return: the offset where the data starts
+    :rtype: int
+    """
+    offset = 0
+    for line in fp:
+        offset += len(line)
+        if fmt == INDEX_FORMAT_CSV:
+            return offset
+        if line.strip().lower() == b"@data":
+            return offset
+    raise Exception("No @data section found!")
+
+
+def _rows(fp, offset: int, fmt: str) -> Iterator[int]:
+    """
+    Iterates the rows in the file, starting from the current position, which must
+    be the start of a row. Empty lines and ARFF comments are not considered rows.
+    Quoted CSV values can span multiple lines.
+
+    :param fp: the file object (binary mode)
+    :param offset: the current position in the file
+    :type offset: int
+    :param fmt: the format of the file, see INDEX_FORMATS
+    :type fmt: str
+    :return: the offsets of the rows
+    :rtype: Iterator
+    """
+    in_quotes = False
+    for line in fp:
+        start = offset
+        offset += len(line)
+        if in_quotes:
+            in_quotes = (line.count(b'"') % 2 == 0)
+            continue
+        stripped = line.strip()
+        if len(stripped) == 0:
+            continue
+        if fmt == INDEX_FORMAT_ARFF:
+            if stripped.startswith(b"%"):
+                continue
+        elif line.count(b'"') % 2 == 1:
+            in_quotes = True
+        yield start
+
+
+def build_index(path: str, every: int = INDEX_EVERY_DEFAULT, fmt: str = None) -> Dict:
+    """
+    Scans the file and records the byte offsets of every K-th row.
+
+    :param path: the ARFF/CSV file to index
+    :type path: str
+    :param every: the number of rows between offsets
+    :type every: int
+    :param fmt: the format of the file (see INDEX_FORMATS), determined from the extension if None
+    :type fmt: str
+    :return: the index
+    :rtype: dict
+    """
+    if every < 1:
+        raise Exception("Number of rows between offsets must be at least 1, got: %d" % every)
+    if fmt is None:
+        fmt = _format_for_file(path)
+    if fmt not in INDEX_FORMATS:
+        raise Exception("Unsupported index format: %s" % fmt)
+    stat = os.stat(path)
+    offsets = []
+    num_rows = 0
+    with open(path, "rb") as fp:
+        header_end = _skip_header(fp, fmt)
+        for offset in _rows(fp, header_end, fmt):
+            if num_rows % every == 0:
+                offsets.append(offset)
+            num_rows += 1
+    return {
+        "format": fmt,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "header_end": header_end,
+        "every": every,
+        "num_rows": num_rows,
+        "offsets": offsets,
+    }
+
+
+def save_index(index: Dict, path: str):
+    """
+    Saves the index next to the data file.
+
+    :param index: the index to save
+    :type index: dict
+    :param path: the data file the index belongs to
+    :type path: str
+    """
+    tmp = index_path(path) + ".tmp"
+    with open(tmp, "w") as fp:
+        json.dump(index, fp)
+    os.replace(tmp, index_path(path))
+
+
+def load_index(path: str) -> Dict:
+    """
+    Loads the index of the data file. Fails if the index does not exist or the
+    data file has changed since the index was built.
+
+    :param path: the data file to load the index for
+    :type path: str
+    :return: the index
+    :rtype: dict
+    """
+    idx = index_path(path)
+    if not os.path.exists(idx):
+        raise Exception("No index available for '%s', use wp-index to build it: %s" % (path, idx))
+    with open(idx, "r") as fp:
+        result = json.load(fp)
+    stat = os.stat(path)
+    if (result["size"] != stat.st_size) or (result["mtime_ns"] != stat.st_mtime_ns):
+        raise Exception("Index is outdated, use wp-index to rebuild it: %s" % idx)
+    return result
+
+
+def parse_row_range(row_range: str) -> Tuple[int, Optional[int]]:
+    """
+    Parses the row range of the form FROM-TO (1-based, inclusive). TO can be
+    'last' or omitted for all rows till the end.
+
+    :param row_range: the range to parse
+    :type row_range: str
+    :return: the tuple of 0-based first and last row (None if till the end)
+    :rtype: tuple
+    """
+    parts = row_range.split("-")
+    if len(parts) != 2:
+        raise Exception("Row range must be of format FROM-TO, got: %s" % row_range)
+    try:
+        first = int(parts[0])
+        last = None if parts[1] in ["", "last"] else int(parts[1])
+    except Exception:
+        raise Exception("Row range must consist of integers (FROM-TO), got: %s" % row_range)
+    if first < 1:
+        raise Exception("First row must be at least 1, got: %s" % row_range)
+    if (last is not None) and (last < first):
+        raise Exception("Last row must not be smaller than first row, got: %s" % row_range)
+    return first - 1, None if last is None else last - 1
+
+
+def chunk_rows(index: Dict, chunk: int, num_chunks: int) -> Tuple[int, int]:
+    """
+    Determines the rows of the chunk. The chunks are aligned with the offsets
+    stored in the index, i.e., no rows need to be skipped when reading them.
+
+    :param index: the index of the file
+    :type index: dict
+    :param chunk: the 1-based index of the chunk
+    :type chunk: int
+    :param num_chunks: the number of chunks
+    :type num_chunks: int
+    :return: the tuple of 0-based first and last row (inclusive), last is smaller than first if the chunk is empty
+    :rtype: tuple
+    """
+    num_blocks = len(index["offsets"])
+    start = (chunk - 1) * num_blocks // num_chunks
+    end = chunk * num_blocks // num_chunks
+    return start * index["every"], min(end * index["every"], index["num_rows"]) - 1
+
+
+def _row_offset(fp, index: Dict, row: int) -> int:
+    """
+    Determines the byte offset of the row, using the closest preceding offset
+    from the index.
+
+    :param fp: the file object (binary mode)
+    :param index: the index of the file
+    :type index: dict
+    :param row: the 0-based row
+    :type row: int
+    :return: the offset
+    :rtype: int
+    """
+    if row >= index["num_rows"]:
+        return index["size"]
+    offset = index["offsets"][row // index["every"]]
+    skip = row % index["every"]
+    fp.seek(offset)
+    for i, offset in enumerate(_rows(fp, offset, index["format"])):
+        if i == skip:
+            return offset
+    raise Exception("Failed to locate row #%d, index outdated?" % (row + 1))
+
+
+def read_rows(path: str, index: Dict, first: int, last: Optional[int]) -> bytes:
+    """
+    Reads the header and the specified rows from the file.
+
+    :param path: the data file
+    :type path: str
+    :param index: the index of the file
+    :type index: dict
+    :param first: the 0-based first row
+    :type first: int
+    :param last: the 0-based last row (inclusive), None for all rows till the end
+    :type last: int
+    :return: the header and the rows
+    :rtype: bytes
+    """
+    if last is None:
+        last = index["num_rows"] - 1
+    with open(path, "rb") as fp:
+        header = fp.read(index["header_end"])
+        if last < first:
+            return header
+        start = _row_offset(fp, index, first)
+        end = _row_offset(fp, index, last + 1)
+        fp.seek(start)
+        return header + fp.read(end - start)
@@ -0,0 +1,215 @@
+import fnmatch
+import glob
+import logging
+import os
+import zlib
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+from seppl.placeholders import expand_placeholders
+
+SHARD_MODE_HASH = "hash"
+SHARD_MODE_ROUND_ROBIN = "round-robin"
+SHARD_MODES = [
+    SHARD_MODE_HASH,
+    SHARD_MODE_ROUND_ROBIN,
+]
+
+
+def parse_shard(shard: str) -> Tuple[int, int]:
+    """
+    Parses the shard definition of the form K/N, with K being the 1-based index
+    of the shard and N the total number of shards.
+
+    :param shard: the shard definition to parse
+    :type shard: str
+    :return: the tuple of 1-based shard index and number of shards
+    :rtype: tuple
+    """
+    parts = shard.split("/")
+    if len(parts) != 2:
+        raise Exception("Shard must be of format K/N, got: %s" % shard)
+    try:
+        index = int(parts[0])
+        num = int(parts[1])
+    except Exception:
+        raise Exception("Shard must consist of two integers (K/N), got: %s" % shard)
+    if num < 1:
+        raise Exception("Number of shards must be at least 1, got: %s" % shard)
+    if (index < 1) or (index > num):
+        raise Exception("Shard index must be between 1 and %d, got: %s" % (num, shard))
+    return index, num
+
+
+def in_shard(path: str, position: int, index: int, num: int, mode: str = SHARD_MODE_HASH) -> bool:
+    """
+    Determines whether the file belongs to the specified shard. The hash mode uses
+    the CRC32 of the path, making the decision independent of the order of the files.
+    The round-robin mode uses the position of the file instead.
+
+    :param path: the path of the file
+    :type path: str
+    :param position: the 0-based position of the file among all the files
+    :type position: int
+    :param index: the 1-based index of the shard
+    :type index: int
+    :param num: the number of shards
+    :type num: int
+    :param mode: the sharding mode, see SHARD_MODES
+    :type mode: str
+    :return: True if the file belongs to the shard
+    :rtype: bool
+    """
+    if mode == SHARD_MODE_HASH:
+        return zlib.crc32(path.encode("utf-8")) % num == index - 1
+    elif mode == SHARD_MODE_ROUND_ROBIN:
+        return position % num == index - 1
+    else:
+        raise Exception("Unhandled shard mode: %s" % mode)
+
+
+def shard_files(files: Iterable[str], index: int, num: int, mode: str = SHARD_MODE_HASH) -> Iterator[str]:
+    """
+    Only returns the files that belong to the specified shard.
+
+    :param files: the files to filter
+    :type files: Iterable
+    :param index: the 1-based index of the shard
+    :type index: int
+    :param num: the number of shards
+    :type num: int
+    :param mode: the sharding mode, see SHARD_MODES
+    :type mode: str
+    :return: the files of the shard
+    :rtype: Iterator
+    """
+    for i, f in enumerate(files):
+        if in_shard(f, i, index, num, mode=mode):
+            yield f
+
+
+def iterate_files(inputs: Union[str, List[str]], input_lists: Union[str, List[str]] = None,
+                  fail_if_empty: bool = False, resume_from: str = None,
+                  logger: logging.Logger = None) -> Iterator[str]:
+    """
+    Lazy version of seppl.io.locate_files: the globs and input lists only get expanded
+    when requesting the next file. The glob results are therefore not sorted and returned
+    in the order that the file system lists them. Since files cannot be revisited, no files
+    get returned if the file to resume from cannot be located.
+
+    :param inputs: the input path(s) with optional globs
+    :type inputs: str or list
+    :param input_lists: text file(s) that list the actual input files to use
+    :type input_lists: str or list
+    :param fail_if_empty: whether to throw an exception if no files were located
+    :type fail_if_empty: bool
+    :param resume_from: the file name to resume from (glob syntax)
+    :type resume_from: str
+    :param logger: the optional logger to use for outputting warnings, no warnings get output if None
+    :type logger: logging.Logger
+    :return: the files
+    :rtype: Iterator
+    """
+    if (inputs is None) and (input_lists is None):
+        raise Exception("Neither input paths nor input lists provided!")
+    if isinstance(inputs, str):
+        inputs = [inputs]
+    if isinstance(input_lists, str):
+        input_lists = [input_lists]
+
+    def _warning(msg):
+        if logger is not None:
+            logger.warning(msg)
+
+    def _locate():
+        if inputs is not None:
+            for inp in inputs:
+                for f in glob.iglob(expand_placeholders(inp)):
+                    if not os.path.isdir(f):
+                        yield f
+        if input_lists is not None:
+            for inp in input_lists:
+                inp = expand_placeholders(inp)
+                if not os.path.exists(inp):
+                    _warning("Input list does not exist: %s" % inp)
+                    continue
+                if os.path.isdir(inp):
+                    _warning("Input list points to directory: %s" % inp)
+                    continue
+                with open(inp, "r") as fp:
+                    for line in fp:
+                        line = expand_placeholders(line.strip())
+                        if len(line) == 0:
+                            continue
+                        if not os.path.exists(line):
+                            _warning("Path from input list '%s' does not exist: %s" % (inp, line))
+                            continue
+                        yield line
+
+    located = False
+    resumed = resume_from is None
+    for f in _locate():
+        located = True
+        if not resumed:
+            if not fnmatch.fnmatch(f, resume_from):
+                continue
+            resumed = True
+        yield f
+
+    if fail_if_empty and not located:
+        raise Exception("Failed to locate any files using: %s" % str(inputs))
+    if located and not resumed:
+        _warning("resume from '%s' not found, no files returned!" % resume_from)
+
+
+class LookAheadIterator:
+    """
+    Iterator that allows checking whether more items are available.
+    """
+
+    def __init__(self, iterable: Iterable):
+        """
+        Initializes the iterator.
+
+        :param iterable: the iterable to wrap
+        :type iterable: Iterable
+        """
+        self._iterator = iter(iterable)
+        self._next = None
+        self._has_next: Optional[bool] = None
+
+    def has_next(self) -> bool:
+        """
+        Returns whether another item is available.
+
+        :return: True if available
+        :rtype: bool
+        """
+        if self._has_next is None:
+            try:
+                self._next = next(self._iterator)
+                self._has_next = True
+            except StopIteration:
+                self._has_next = False
+        return self._has_next
+
+    def __iter__(self):
+        """
+        Returns itself.
+
+        :return: itself
+        :rtype: LookAheadIterator
+        """
+        return self
+
+    def __next__(self):
+        """
+        Returns the next item.
+
+        :return: the next item
+        """
+        if not self.has_next():
+            raise StopIteration()
+        result = self._next
+        self._next = None
+        self._has_next = None
+        return result
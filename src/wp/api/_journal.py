@@ -0,0 +1,123 @@
+import os
+from typing import Set
+
+
+class Journal:
+    """
+    Append-only journal of completed files. Entries get flushed to disk in batches
+    (and when closing the journal). Previously recorded entries are kept in memory
+    for constant time lookups. An incomplete last line (e.g., due to a crash while
+    writing it) gets ignored when reading the journal.
+    """
+
+    def __init__(self, path: str, sync_interval: int = 100):
+        """
+        Initializes the journal.
+
+        :param path: the file to store the journal in
+        :type path: str
+        :param sync_interval: the number of entries after which to sync the journal to disk
+        :type sync_interval: int
+        """
+        self.path = path
+        self.sync_interval = max(1, sync_interval)
+        self._completed: Set[str] = set()
+        self._fp = None
+        self._pending = 0
+
+    @staticmethod
+    def _key(path: str) -> str:
+        """
+        Turns the path into the key that is stored in the journal.
+
+        :param path: the path to convert
+        :type path: str
+        :return: the key
+        :rtype: str
+        """
+        return os.path.abspath(path)
+
+    def open(self) -> int:
+        """
+        Reads any existing entries and opens the journal for appending.
+
+        :return: the number of entries that were read
+        :rtype: int
+        """
+        self._completed = set()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as fp:
+                content = fp.read()
+            lines = content.split("\n")
+            # last line is either empty or incomplete
+            for line in lines[:-1]:
+                if len(line) > 0:
+                    self._completed.add(line)
+            # remove incomplete line
+            if len(lines[-1]) > 0:
+                with open(self.path, "r+") as fp:
+                    fp.truncate(len(content.encode("utf-8")) - len(lines[-1].encode("utf-8")))
+        else:
+            parent = os.path.dirname(self.path)
+            if (len(parent) > 0) and not os.path.exists(parent):
+                os.makedirs(parent)
+        self._fp = open(self.path, "a")
+        self._pending = 0
+        return len(self._completed)
+
+    def is_completed(self, path: str) -> bool:
+        """
+        Checks whether the file has been recorded as completed.
+
+        :param path: the file to check
+        :type path: str
+        :return: True if completed
+        :rtype: bool
+        """
+        return self._key(path) in self._completed
+
+    def add(self, path: str):
+        """
+        Records the file as completed.
+
+        :param path: the file to record
+        :type path: str
+        """
+        if self._fp is None:
+            raise Exception("Journal has not been opened: %s" % self.path)
+        key = self._key(path)
+        if key in self._completed:
+            return
+        self._completed.add(key)
+        self._fp.write(key + "\n")
+        self._pending += 1
+        if self._pending >= self.sync_interval:
+            self.sync()
+
+    def sync(self):
+        """
+        Flushes any pending entries to disk.
+        """
+        if (self._fp is not None) and (self._pending > 0):
+            self._fp.flush()
+            os.fsync(self._fp.fileno())
+            self._pending = 0
+
+    def close(self):
+        """
+        Flushes any pending entries and closes the journal.
+        """
+        if self._fp is not None:
+            self.sync()
+            self._fp.close()
+            self._fp = None
+
+    @property
+    def num_completed(self) -> int:
+        """
+        Returns the number of completed files.
+
+        :return: the number of files
+        :rtype: int
+        """
+        return len(self._completed)
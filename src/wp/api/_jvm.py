@@ -0,0 +1,198 @@
+import logging
+import os
+import shlex
+import threading
+from typing import List, Optional
+
+from jpype import JClass
+from ._compression import detect_compression
+
+MEMORY_FACTOR = 3.0
+""" the factor for estimating the memory that the data of an uncompressed file requires in the JVM. """
+
+COMPRESSION_RATIO = 5.0
+""" the assumed compression ratio of compressed files. """
+
+AUTO_HEAP_MIN = 512 * 1024 * 1024
+""" the minimum heap size in bytes when sizing the heap automatically. """
+
+AUTO_HEAP_RAM_FRACTION = 0.75
+""" the maximum fraction of the available RAM to use when sizing the heap automatically. """
+
+ENV_JAVA_TOOL_OPTIONS = "JAVA_TOOL_OPTIONS"
+
+
+def predicted_memory(path: str) -> int:
+    """
+    Estimates the memory in bytes that the data of the file requires when loaded
+    in one go, based on the file size.
+
+    :param path: the file to estimate the memory for
+    :type path: str
+    :return: the estimated memory
+    :rtype: int
+    """
+    result = os.path.getsize(path) * MEMORY_FACTOR
+    if detect_compression(path) is not None:
+        result *= COMPRESSION_RATIO
+    return int(result)
+
+
+def available_memory() -> Optional[int]:
+    """
+    Determines the available RAM in bytes.
+
+    :return: the available RAM, None if it cannot be determined
+    :rtype: int
+    """
+    # includes reclaimable caches, unlike free pages
+    if os.path.exists("/proc/meminfo"):
+        with open("/proc/meminfo", "r") as fp:
+            for line in fp:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def auto_heap_size(inputs: List[str], logger: logging.Logger = None) -> str:
+    """
+    Determines the maximum heap size from the largest input file (see predicted_memory)
+    and the available RAM, using at least AUTO_HEAP_MIN and at most AUTO_HEAP_RAM_FRACTION
+    of the available RAM.
+
+    :param inputs: the input files
+    :type inputs: list
+    :param logger: the optional logger to use
+    :type logger: logging.Logger
+    :return: the heap size for the -Xmx option, e.g., 2048m
+    :rtype: str
+    """
+    largest = 0
+    for path in inputs:
+        if os.path.isfile(path):
+            largest = max(largest, predicted_memory(path))
+    result = max(AUTO_HEAP_MIN, largest + AUTO_HEAP_MIN // 2)
+    ram = available_memory()
+    if ram is not None:
+        result = min(result, max(AUTO_HEAP_MIN, int(ram * AUTO_HEAP_RAM_FRACTION)))
+    if logger is not None:
+        logger.info("Heap size: %dMB (largest input: %dMB predicted, available RAM: %s)"
+                    % (result // 1024 // 1024, largest // 1024 // 1024,
+                       "unknown" if ram is None else ("%dMB" % (ram // 1024 // 1024))))
+    return "%dm" % (result // 1024 // 1024)
+
+
+def add_jvm_options(options: str):
+    """
+    Adds the options to the JAVA_TOOL_OPTIONS environment variable, which the JVM
+    picks up when it gets started.
+
+    :param options: the space-separated JVM options, e.g., '-XX:+UseG1GC -Xss4m'
+    :type options: str
+    """
+    current = os.environ.get(ENV_JAVA_TOOL_OPTIONS, "")
+    os.environ[ENV_JAVA_TOOL_OPTIONS] = " ".join([x for x in [current] + shlex.split(options) if len(x) > 0])
+
+
+def free_heap() -> int:
+    """
+    Returns the amount of heap in bytes that can still be allocated.
+
+    :return: the free heap
+    :rtype: int
+    """
+    runtime = JClass("java.lang.Runtime").getRuntime()
+    return int(runtime.maxMemory() - runtime.totalMemory() + runtime.freeMemory())
+
+
+def used_heap() -> int:
+    """
+    Returns the amount of heap in bytes that is currently in use.
+
+    :return: the used heap
+    :rtype: int
+    """
+    runtime = JClass("java.lang.Runtime").getRuntime()
+    return int(runtime.totalMemory() - runtime.freeMemory())
+
+
+def heap_usage() -> float:
+    """
+    Returns the used heap as fraction of the maximum heap.
+
+    :return: the fraction (0-1)
+    :rtype: float
+    """
+    runtime = JClass("java.lang.Runtime").getRuntime()
+    return float(runtime.totalMemory() - runtime.freeMemory()) / float(runtime.maxMemory())
+
+
+class HeapMonitor:
+    """
+    Logs the heap usage of the JVM at regular intervals in the background,
+    warning when the usage exceeds the threshold. Reports the peak usage when stopped.
+    """
+
+    def __init__(self, interval: float, threshold: float = 0.9, logger: logging.Logger = None):
+        """
+        Initializes the monitor.
+
+        :param interval: the interval in seconds
+        :type interval: float
+        :param threshold: the fraction of the maximum heap above which to warn
+        :type threshold: float
+        :param logger: the logger to use, uses the module's logger if None
+        :type logger: logging.Logger
+        """
+        if interval <= 0:
+            raise Exception("Interval must be greater than 0, got: %f" % interval)
+        self._interval = interval
+        self._threshold = threshold
+        self._logger = logger if (logger is not None) else logging.getLogger(__name__)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.peak = 0.0
+
+    def start(self):
+        """
+        Starts monitoring.
+        """
+        if self._thread is not None:
+            raise Exception("Heap monitor already started!")
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="heap-monitor", daemon=True)
+        self._thread.start()
+
+    def _check(self):
+        """
+        Logs the current usage.
+        """
+        usage = heap_usage()
+        self.peak = max(self.peak, usage)
+        msg = "Heap usage: %.1f%% (%dMB free)" % (usage * 100, free_heap() // 1024 // 1024)
+        if usage >= self._threshold:
+            self._logger.warning(msg)
+        else:
+            self._logger.info(msg)
+
+    def _run(self):
+        """
+        Checks the usage till stopped.
+        """
+        while not self._stop.wait(self._interval):
+            self._check()
+
+    def stop(self):
+        """
+        Stops monitoring and logs the peak usage.
+        """
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._check()
+        self._logger.info("Peak heap usage: %.1f%%" % (self.peak * 100))
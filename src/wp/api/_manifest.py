@@ -0,0 +1,158 @@
+import glob
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional
+
+
+def file_stats(paths: List[str]) -> Dict[str, Optional[List[int]]]:
+    """
+    Determines size and modification time (ns) of the files, expanding glob patterns.
+
+    :param paths: the files/glob patterns
+    :type paths: list
+    :return: the absolute paths with their size and modification time, None for missing files
+    :rtype: dict
+    """
+    result = dict()
+    for path in paths:
+        matches = glob.glob(path) if glob.has_magic(path) else [path]
+        for match in matches:
+            key = os.path.abspath(match)
+            if os.path.exists(key):
+                stat = os.stat(key)
+                result[key] = [stat.st_size, stat.st_mtime_ns]
+            else:
+                result[key] = None
+    return result
+
+
+class Manifest:
+    """
+    Append-only manifest of executed pipelines, stored as JSON lines. Each entry
+    records a hash of the pipeline, size and modification time of its inputs,
+    its outputs and whether the execution succeeded. The last entry of a pipeline
+    wins. An incomplete last line (e.g., due to a crash while writing it) gets
+    ignored when reading the manifest.
+    """
+
+    def __init__(self, path: str):
+        """
+        Initializes the manifest.
+
+        :param path: the file to store the manifest in
+        :type path: str
+        """
+        self.path = path
+        self._entries: Dict[str, Dict] = dict()
+        self._fp = None
+
+    @staticmethod
+    def key(pipeline: List[str]) -> str:
+        """
+        Generates the key for the pipeline.
+
+        :param pipeline: the expanded pipeline arguments
+        :type pipeline: list
+        :return: the key
+        :rtype: str
+        """
+        return hashlib.sha1(json.dumps(pipeline).encode("utf-8")).hexdigest()
+
+    def open(self) -> int:
+        """
+        Reads any existing entries and opens the manifest for appending.
+
+        :return: the number of pipelines that were read
+        :rtype: int
+        """
+        self._entries = dict()
+        if os.path.exists(self.path):
+            with open(self.path, "r") as fp:
+                content = fp.read()
+            lines = content.split("\n")
+            # last line is either empty or incomplete
+            for line in lines[:-1]:
+                if len(line) > 0:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+            # remove incomplete line
+            if len(lines[-1]) > 0:
+                with open(self.path, "r+") as fp:
+                    fp.truncate(len(content.encode("utf-8")) - len(lines[-1].encode("utf-8")))
+        else:
+            parent = os.path.dirname(self.path)
+            if (len(parent) > 0) and not os.path.exists(parent):
+                os.makedirs(parent)
+        self._fp = open(self.path, "a")
+        return len(self._entries)
+
+    def is_up_to_date(self, pipeline: List[str], inputs: Dict[str, Optional[List[int]]], outputs: List[str]) -> bool:
+        """
+        Checks whether the pipeline was executed successfully with the same inputs
+        and whether its outputs still exist.
+
+        :param pipeline: the expanded pipeline arguments
+        :type pipeline: list
+        :param inputs: the current stats of the inputs, see file_stats
+        :type inputs: dict
+        :param outputs: the outputs of the pipeline
+        :type outputs: list
+        :return: True if up-to-date
+        :rtype: bool
+        """
+        entry = self._entries.get(self.key(pipeline), None)
+        if (entry is None) or not entry["success"]:
+            return False
+        if entry["inputs"] != inputs:
+            return False
+        for output in outputs:
+            if not os.path.exists(output):
+                return False
+        return True
+
+    def record(self, pipeline: List[str], inputs: Dict[str, Optional[List[int]]], outputs: List[str], success: bool):
+        """
+        Records the execution of the pipeline and flushes it to disk.
+
+        :param pipeline: the expanded pipeline arguments
+        :type pipeline: list
+        :param inputs: the stats of the inputs at the start of the execution, see file_stats
+        :type inputs: dict
+        :param outputs: the outputs of the pipeline
+        :type outputs: list
+        :param success: whether the execution succeeded, only pipelines that succeeded can be up-to-date
+        :type success: bool
+        """
+        if self._fp is None:
+            raise Exception("Manifest has not been opened: %s" % self.path)
+        entry = {
+            "key": self.key(pipeline),
+            "pipeline": pipeline,
+            "inputs": inputs,
+            "outputs": [os.path.abspath(x) for x in outputs],
+            "success": success,
+            "timestamp": time.time(),
+        }
+        self._entries[entry["key"]] = entry
+        self._fp.write(json.dumps(entry) + "\n")
+        self._fp.flush()
+
+    def close(self):
+        """
+        Closes the manifest.
+        """
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+
+    @property
+    def num_entries(self) -> int:
+        """
+        Returns the number of recorded pipelines.
+
+        :return: the number of pipelines
+        :rtype: int
+        """
+        return len(self._entries)
@@ -0,0 +1,81 @@
+import logging
+import os
+import threading
+from typing import Dict, List
+
+from jpype import JClass
+
+# abspath -> [mtime_ns, size, serialized objects]
+_entries: Dict[str, List] = dict()
+_lock = threading.Lock()
+_hits = 0
+_misses = 0
+
+
+def read_objects(path: str, logger: logging.Logger = None) -> List:
+    """
+    Deserializes the object(s) stored in the file. The objects are cached
+    for the lifetime of the process (keyed by absolute path, modification time
+    and size of the file), in serialized form. Every call returns new copies,
+    i.e., callers can modify the objects (e.g., re-initialize a filter) without
+    affecting other callers. Avoids reading the same file from disk over and
+    over again, e.g., when wp-exec runs pipelines repeatedly.
+
+    :param path: the file to deserialize
+    :type path: str
+    :param logger: the optional logger to use
+    :type logger: logging.Logger
+    :return: the JPype objects, caller must wrap them in the appropriate Python wrapper class
+    :rtype: list
+    """
+    global _hits, _misses
+    key = os.path.abspath(path)
+    stat = os.stat(key)
+    with _lock:
+        entry = _entries.get(key, None)
+        if (entry is not None) and (entry[0] == stat.st_mtime_ns) and (entry[1] == stat.st_size):
+            _hits += 1
+            if logger is not None:
+                logger.debug("Using cached object(s) of: %s" % path)
+            return [x.getObject() for x in entry[2]]
+        _misses += 1
+        objs = list(JClass("weka.core.SerializationHelper").readAll(key))
+        _entries[key] = [stat.st_mtime_ns, stat.st_size, [JClass("weka.core.SerializedObject")(x) for x in objs]]
+        return objs
+
+
+def read_object(path: str, logger: logging.Logger = None):
+    """
+    Deserializes the single object stored in the file, see read_objects.
+
+    :param path: the file to deserialize
+    :type path: str
+    :param logger: the optional logger to use
+    :type logger: logging.Logger
+    :return: the JPype object, caller must wrap it in the appropriate Python wrapper class
+    """
+    objs = read_objects(path, logger=logger)
+    if len(objs) != 1:
+        raise Exception("Expected one object in file (%s), but encountered: %d" % (path, len(objs)))
+    return objs[0]
+
+
+def clear_object_cache():
+    """
+    Removes all cached objects and resets the statistics.
+    """
+    global _hits, _misses
+    with _lock:
+        _entries.clear()
+        _hits = 0
+        _misses = 0
+
+
+def object_cache_statistics() -> str:
+    """
+    Returns the statistics of the object cache as string.
+
+    :return: the statistics
+    :rtype: str
+    """
+    return "hits=%d, misses=%d, entries=%d" % (_hits, _misses, len(_entries))
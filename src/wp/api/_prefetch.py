@@ -0,0 +1,169 @@
+import logging
+import os
+import queue
+import threading
+from typing import Iterable, Optional, Tuple, Any
+
+
+class Prefetcher:
+    """
+    Loads files on a background thread, keeping at most the specified number of
+    loaded files (and their estimated memory, based on the file sizes) queued up.
+    """
+
+    def __init__(self, inputs: Iterable[str], load_func, max_files: int, max_memory: int = None,
+                 logger: logging.Logger = None):
+        """
+        Initializes the prefetcher.
+
+        :param inputs: the files to load
+        :type inputs: Iterable
+        :param load_func: the function for loading a file, takes the path as only argument
+        :param max_files: the maximum number of loaded files to queue up
+        :type max_files: int
+        :param max_memory: the maximum number of bytes (sum of file sizes) to queue up, no limit if None or <=0
+        :type max_memory: int
+        :param logger: the optional logger to use
+        :type logger: logging.Logger
+        """
+        if max_files < 1:
+            raise Exception("At least one file must be prefetched, got: %d" % max_files)
+        self._inputs = inputs
+        self._load_func = load_func
+        self._max_files = max_files
+        self._max_memory = max_memory if ((max_memory is not None) and (max_memory > 0)) else None
+        self._logger = logger
+        self._queue = queue.Queue(maxsize=max_files)
+        self._memory_cond = threading.Condition()
+        self._memory = 0
+        self._stopped = False
+        self._done = False
+        self._exhausted = False
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the background loading.
+        """
+        if self._thread is not None:
+            raise Exception("Prefetcher already started!")
+        self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+        self._thread.start()
+
+    def _reserve(self, size: int) -> bool:
+        """
+        Waits till the size can be accommodated in the memory budget. Always allows
+        at least one file to be queued, even if it exceeds the budget.
+
+        :param size: the number of bytes to reserve
+        :type size: int
+        :return: False if stopped while waiting
+        :rtype: bool
+        """
+        with self._memory_cond:
+            if self._max_memory is not None:
+                while (not self._stopped) and (self._memory > 0) and (self._memory + size > self._max_memory):
+                    self._memory_cond.wait()
+            if self._stopped:
+                return False
+            self._memory += size
+            return True
+
+    def _release(self, size: int):
+        """
+        Releases the number of bytes from the memory budget.
+
+        :param size: the number of bytes to release
+        :type size: int
+        """
+        with self._memory_cond:
+            self._memory -= size
+            self._memory_cond.notify_all()
+
+    def _put(self, item) -> bool:
+        """
+        Adds the item to the queue, waiting for space to become available.
+
+        :param item: the item to add
+        :return: False if stopped while waiting
+        :rtype: bool
+        """
+        while not self._stopped:
+            try:
+                self._queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _run(self):
+        """
+        Loads the files and queues them up. Errors of the inputs iterator (e.g., no files
+        found) get queued up as well, the end marker always gets queued.
+        """
+        try:
+            for path in self._inputs:
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                if not self._reserve(size):
+                    return
+                if self._logger is not None:
+                    self._logger.debug("Prefetching: %s" % path)
+                try:
+                    item = (path, self._load_func(path), None, size)
+                except Exception as e:
+                    item = (path, None, e, size)
+                if not self._put(item):
+                    return
+                # no point in continuing after an error
+                if item[2] is not None:
+                    break
+        except Exception as e:
+            self._put((None, None, e, 0))
+        finally:
+            if self._put(None):
+                self._done = True
+
+    def next(self) -> Optional[Tuple[str, Any]]:
+        """
+        Returns the next loaded file, blocks till available. Re-raises any exception
+        that occurred while loading the file.
+
+        :return: the tuple of path and loaded data, None if no more files available
+        :rtype: tuple
+        """
+        if self._exhausted:
+            return None
+        item = self._queue.get()
+        if item is None:
+            self._exhausted = True
+            return None
+        path, data, error, size = item
+        self._release(size)
+        if error is not None:
+            self._exhausted = True
+            raise error
+        return path, data
+
+    @property
+    def finished(self) -> bool:
+        """
+        Returns whether all loaded files have been retrieved.
+
+        :return: True if finished
+        :rtype: bool
+        """
+        # the end marker is only left in the queue once the thread has finished
+        return self._exhausted or (self._done and (self._queue.qsize() <= 1))
+
+    def stop(self):
+        """
+        Stops the background loading and discards any queued up files.
+        """
+        self._stopped = True
+        with self._memory_cond:
+            self._memory_cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        while not self._queue.empty():
+            self._queue.get_nowait()
@@ -0,0 +1,437 @@
+import glob
+import json
+import logging
+import os
+import re
+import threading
+import time
+import types
+from typing import Dict, List, Optional
+
+import jpype
+from jpype import JClass
+from seppl.io import StreamFilter
+from weka.core.dataset import Instances, Instance
+from ._jvm import used_heap
+
+ROLE_READER = "reader"
+ROLE_FILTER = "filter"
+ROLE_WRITER = "writer"
+
+SAMPLE_INTERVAL_DEFAULT = 0.01
+""" the interval in seconds for sampling whether the pipeline executes code in the JVM. """
+
+TRACE_MAX_EVENTS = 500000
+""" the maximum number of call events to keep for the timeline, further calls only get summarized. """
+
+TRACE_EXT = ".trace.json"
+
+
+def trace_path(path: str) -> str:
+    """
+    Generates the path of the timeline file from the path of the summary file,
+    e.g., 'prof.json' becomes 'prof.trace.json'.
+
+    :param path: the path of the summary
+    :type path: str
+    :return: the path of the timeline
+    :rtype: str
+    """
+    return os.path.splitext(path)[0] + TRACE_EXT
+
+
+def count_records(data) -> int:
+    """
+    Counts the rows in the data, i.e., Instances count as their number of rows.
+
+    :param data: the data to count (Instances, Instance or list of them)
+    :return: the number of rows
+    :rtype: int
+    """
+    if data is None:
+        return 0
+    if isinstance(data, Instances):
+        return data.num_instances
+    if isinstance(data, Instance):
+        return 1
+    if isinstance(data, list):
+        return sum([count_records(x) for x in data])
+    return 1
+
+
+def _file_size(path: str) -> int:
+    """
+    Returns the size of the file, of all the matching files in case of unexpanded placeholders.
+
+    :param path: the file
+    :type path: str
+    :return: the size in bytes, 0 if not present
+    :rtype: int
+    """
+    if "{" in path:
+        return sum([os.path.getsize(x) for x in glob.glob(re.sub(r"{[^}]*}", "*", path)) if os.path.isfile(x)])
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+_UNSET = object()
+""" marker for the current input not having been checked yet. """
+
+
+class _Stage:
+    """
+    The statistics of a single plugin of the pipeline.
+    """
+
+    def __init__(self, index: int, plugin, role: str):
+        """
+        Initializes the statistics.
+
+        :param index: the position in the pipeline
+        :type index: int
+        :param plugin: the plugin
+        :param role: the role of the plugin (reader/filter/writer)
+        :type role: str
+        """
+        self.index = index
+        self.plugin = plugin
+        self.role = role
+        self.name = plugin.name()
+        self.calls: Dict[str, int] = dict()
+        self.wall_ns = 0
+        self.records_in = 0
+        self.records_out = 0
+        self.samples = 0
+        self.jvm_samples = 0
+        self.heap_before: Optional[int] = None
+        self.heap_after: Optional[int] = None
+        self.files = set()
+        self.last_input = _UNSET
+
+    def to_dict(self) -> Dict:
+        """
+        Returns the statistics as dictionary.
+
+        :return: the statistics
+        :rtype: dict
+        """
+        wall = self.wall_ns / 1e9
+        jvm_fraction = (self.jvm_samples / self.samples) if (self.samples > 0) else 0.0
+        result = {
+            "index": self.index,
+            "name": self.name,
+            "role": self.role,
+            "class": type(self.plugin).__module__ + "." + type(self.plugin).__name__,
+            "calls": self.calls,
+            "wall_time": wall,
+            "jvm_time": wall * jvm_fraction,
+            "python_time": wall * (1.0 - jvm_fraction),
+            "samples": self.samples,
+            "records_in": self.records_in,
+            "records_out": self.records_out,
+            "heap_before": self.heap_before,
+            "heap_after": self.heap_after,
+        }
+        if self.role == ROLE_READER:
+            result["bytes_read"] = sum([_file_size(x) for x in self.files])
+            result["records_per_sec"] = (self.records_out / wall) if (wall > 0) else None
+        elif self.role == ROLE_WRITER:
+            result["bytes_written"] = sum([_file_size(x) for x in self.files])
+            result["records_per_sec"] = (self.records_in / wall) if (wall > 0) else None
+        else:
+            result["records_per_sec"] = (self.records_in / wall) if (wall > 0) else None
+        return result
+
+
+class Profiler:
+    """
+    Records wall time, calls and records in/out of the plugins of a pipeline by
+    wrapping the methods of the plugin instances, i.e., plugins that were not
+    instrumented do not incur any overhead. The time spent in the JVM gets estimated
+    by sampling the Java stack of the thread executing the pipeline in the background.
+    Generates a JSON summary and a timeline in Chrome trace format (chrome://tracing,
+    https://ui.perfetto.dev).
+    """
+
+    def __init__(self, sample_interval: float = SAMPLE_INTERVAL_DEFAULT, logger: logging.Logger = None):
+        """
+        Initializes the profiler.
+
+        :param sample_interval: the interval in seconds for sampling the JVM usage
+        :type sample_interval: float
+        :param logger: the logger to use, uses the module's logger if None
+        :type logger: logging.Logger
+        """
+        if sample_interval <= 0:
+            raise Exception("Sample interval must be greater than 0, got: %f" % sample_interval)
+        self._sample_interval = sample_interval
+        self._logger = logger if (logger is not None) else logging.getLogger(__name__)
+        self._stages: List[_Stage] = []
+        self._active: Optional[_Stage] = None
+        self._events = []
+        self._heap_events = []
+        self._dropped = 0
+        self._start_ns = None
+        self._end_ns = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._java_thread = None
+
+    def instrument(self, plugin, role: str):
+        """
+        Wraps the methods of the plugin instance for recording its statistics.
+
+        :param plugin: the reader/filter/writer to instrument
+        :param role: the role of the plugin (reader/filter/writer)
+        :type role: str
+        """
+        stage = _Stage(len(self._stages), plugin, role)
+        self._stages.append(stage)
+        self._wrap(stage, "initialize")
+        self._wrap(stage, "finalize", heap_after=True)
+        if role == ROLE_READER:
+            self._wrap_read(stage)
+            self._wrap(stage, "has_finished")
+        elif role == ROLE_FILTER:
+            if isinstance(plugin, StreamFilter):
+                self._wrap(stage, "process_stream", records_in=True, heap_before=True)
+                self._wrap_output(stage)
+            else:
+                self._wrap(stage, "process", records_in=True, records_out=True, heap_before=True)
+        elif role == ROLE_WRITER:
+            for method in ["write_stream", "write_batch"]:
+                if hasattr(plugin, method):
+                    self._wrap(stage, method, records_in=True, heap_before=True)
+        else:
+            raise Exception("Unknown role: %s" % role)
+
+    def _enter(self, stage: _Stage, method: str) -> Optional[_Stage]:
+        """
+        Marks the stage as active.
+
+        :return: the previously active stage
+        :rtype: _Stage
+        """
+        previous = self._active
+        self._active = stage
+        stage.calls[method] = stage.calls.get(method, 0) + 1
+        return previous
+
+    def _exit(self, stage: _Stage, method: str, start: int, records: int, previous: Optional[_Stage]):
+        """
+        Records the call.
+        """
+        end = time.perf_counter_ns()
+        stage.wall_ns += end - start
+        if len(self._events) < TRACE_MAX_EVENTS:
+            self._events.append((stage.index, method, start, end - start, records))
+        else:
+            self._dropped += 1
+        self._active = previous
+
+    def _track_files(self, stage: _Stage):
+        """
+        Records the input file (reader) or output file (writer) whenever the current input changes.
+        """
+        current_input = getattr(stage.plugin.session, "current_input", None)
+        if current_input is stage.last_input:
+            return
+        stage.last_input = current_input
+        if stage.role == ROLE_READER:
+            if isinstance(current_input, str):
+                stage.files.add(current_input)
+        elif getattr(stage.plugin, "output_file", None) is not None:
+            stage.files.add(stage.plugin.session.expand_placeholders(stage.plugin.output_file))
+
+    def _wrap(self, stage: _Stage, method: str, records_in: bool = False, records_out: bool = False,
+              heap_before: bool = False, heap_after: bool = False):
+        """
+        Replaces the method of the plugin instance with one that records the call.
+        The used heap gets recorded before the first call (heap_before) or before
+        the call (heap_after, e.g., for finalize), i.e., not for every call.
+        """
+        func = getattr(stage.plugin, method)
+        profiler = self
+
+        def wrapper(*args, **kwargs):
+            if heap_before and (stage.heap_before is None):
+                stage.heap_before = profiler._used_heap()
+            if heap_after:
+                stage.heap_after = profiler._used_heap()
+            records = 0
+            if records_in and (len(args) > 0):
+                records = count_records(args[0])
+                stage.records_in += records
+            previous = profiler._enter(stage, method)
+            start = time.perf_counter_ns()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                profiler._exit(stage, method, start, records, previous)
+            if records_out:
+                stage.records_out += count_records(result)
+            if (stage.role == ROLE_WRITER) and records_in:
+                profiler._track_files(stage)
+            return result
+
+        setattr(stage.plugin, method, wrapper)
+
+    def _wrap_output(self, stage: _Stage):
+        """
+        Replaces the output method of the stream filter with one that counts the records.
+        """
+        func = stage.plugin.output
+
+        def wrapper():
+            result = func()
+            stage.records_out += count_records(result)
+            return result
+
+        stage.plugin.output = wrapper
+
+    def _wrap_read(self, stage: _Stage):
+        """
+        Replaces the read method of the reader with one that records the generation of each item.
+        """
+        func = stage.plugin.read
+        profiler = self
+
+        def wrapper():
+            items = func()
+            if not isinstance(items, types.GeneratorType):
+                items = iter(items)
+            if stage.heap_before is None:
+                stage.heap_before = profiler._used_heap()
+            while True:
+                previous = profiler._enter(stage, "read")
+                start = time.perf_counter_ns()
+                records = 0
+                try:
+                    item = next(items)
+                    records = count_records(item)
+                except StopIteration:
+                    return
+                finally:
+                    profiler._exit(stage, "read", start, records, previous)
+                    profiler._track_files(stage)
+                stage.records_out += records
+                yield item
+
+        stage.plugin.read = wrapper
+
+    def _used_heap(self) -> Optional[int]:
+        """
+        Returns the used heap, if the JVM is running.
+
+        :return: the used heap in bytes, None if JVM not running
+        :rtype: int
+        """
+        if not jpype.isJVMStarted():
+            return None
+        return used_heap()
+
+    def start(self):
+        """
+        Starts profiling, needs to get called from the thread that executes the pipeline.
+        """
+        if self._thread is not None:
+            raise Exception("Profiler already started!")
+        self._start_ns = time.perf_counter_ns()
+        self._end_ns = None
+        if jpype.isJVMStarted():
+            self._java_thread = JClass("java.lang.Thread").currentThread()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample, name="profiler", daemon=True)
+            self._thread.start()
+
+    def _sample(self):
+        """
+        Samples the Java stack of the pipeline thread and the heap till stopped.
+        A non-empty Java stack means that the pipeline thread executes code in the JVM.
+        """
+        try:
+            while not self._stop.wait(self._sample_interval):
+                stage = self._active
+                if stage is not None:
+                    in_jvm = len(self._java_thread.getStackTrace()) > 0
+                    stage.samples += 1
+                    if in_jvm:
+                        stage.jvm_samples += 1
+                self._heap_events.append((time.perf_counter_ns(), used_heap()))
+        except Exception:
+            self._logger.exception("Failed to sample JVM")
+        finally:
+            JClass("java.lang.Thread").detach()
+
+    def stop(self):
+        """
+        Stops profiling.
+        """
+        self._end_ns = time.perf_counter_ns()
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        self._java_thread = None
+
+    def summary(self) -> Dict:
+        """
+        Returns the summary of the pipeline execution.
+
+        :return: the summary
+        :rtype: dict
+        """
+        end = self._end_ns if (self._end_ns is not None) else time.perf_counter_ns()
+        return {
+            "wall_time": (end - self._start_ns) / 1e9 if (self._start_ns is not None) else 0.0,
+            "sample_interval": self._sample_interval,
+            "trace_events_dropped": self._dropped,
+            "stages": [x.to_dict() for x in self._stages],
+        }
+
+    def trace(self) -> Dict:
+        """
+        Returns the timeline in Chrome trace format, one track per plugin plus a heap counter.
+
+        :return: the timeline
+        :rtype: dict
+        """
+        pid = os.getpid()
+        events = []
+        for stage in self._stages:
+            events.append({"name": "thread_name", "ph": "M", "pid": pid, "tid": stage.index,
+                           "args": {"name": "%d: %s" % (stage.index, stage.name)}})
+            events.append({"name": "thread_sort_index", "ph": "M", "pid": pid, "tid": stage.index,
+                           "args": {"sort_index": stage.index}})
+        for index, method, start, duration, records in self._events:
+            events.append({"name": method, "cat": self._stages[index].role, "ph": "X", "pid": pid, "tid": index,
+                           "ts": (start - self._start_ns) / 1000, "dur": duration / 1000, "args": {"records": records}})
+        for ts, heap in self._heap_events:
+            events.append({"name": "heap", "ph": "C", "pid": pid, "ts": (ts - self._start_ns) / 1000,
+                           "args": {"used_mb": heap / 1024 / 1024}})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, path: str, trace_file: str = None):
+        """
+        Writes the summary and the timeline to disk.
+
+        :param path: the JSON file to write the summary to
+        :type path: str
+        :param trace_file: the file to write the timeline to, derived from the summary file if None (see trace_path)
+        :type trace_file: str
+        """
+        if trace_file is None:
+            trace_file = trace_path(path)
+        summary = self.summary()
+        summary["trace_file"] = trace_file
+        with open(path, "w") as fp:
+            json.dump(summary, fp, indent=2)
+        # json.dump would use the (slow) pure-Python encoder
+        with open(trace_file, "w") as fp:
+            fp.write(json.dumps(self.trace()))
+        if self._dropped > 0:
+            self._logger.warning("Timeline limited to %d calls, dropped %d" % (TRACE_MAX_EVENTS, self._dropped))
+        self._logger.info("Profile written to: %s (timeline: %s)" % (path, trace_file))
+        for stage in summary["stages"]:
+            self._logger.info("%d: %s - %.3fs (JVM %.3fs), records in/out: %d/%d"
+                              % (stage["index"], stage["name"], stage["wall_time"], stage["jvm_time"],
+                                 stage["records_in"], stage["records_out"]))
@@ -0,0 +1,89 @@
+from typing import Optional
+
+from kasperl.api import Session
+
+STORAGE_END_OF_INPUT = "wp.end_of_input"
+
+STORAGE_COMPLETION_HANDLER = "wp.completion_handler"
+
+
+def mark_end_of_input(session: Session, end: bool):
+    """
+    Records in the session whether the item that is about to be forwarded by the
+    reader is the last one of the current input. Plugins that buffer rows use this
+    to flush their buffers before the reader moves on to the next input.
+
+    :param session: the session to update
+    :type session: Session
+    :param end: whether the last item of the current input gets forwarded
+    :type end: bool
+    """
+    session.storage[STORAGE_END_OF_INPUT] = end
+
+
+def is_end_of_input(session: Session) -> Optional[bool]:
+    """
+    Returns whether the current item is the last one of the current input.
+
+    :param session: the session to check
+    :type session: Session
+    :return: whether the last item, None if the reader does not record this information
+    :rtype: bool
+    """
+    return session.storage.get(STORAGE_END_OF_INPUT, None)
+
+
+def clear_end_of_input(session: Session):
+    """
+    Removes the end of input information from the session, e.g., when the reader finishes.
+
+    :param session: the session to update
+    :type session: Session
+    """
+    session.storage.pop(STORAGE_END_OF_INPUT, None)
+
+
+def set_completion_handler(session: Session, handler):
+    """
+    Registers the handler that gets notified when the reader has finished an input.
+    Writers that complete their output with a delay (e.g., writing in the background
+    or keeping files open for writing rows) register a handler, which takes a callback
+    without parameters and calls it once all the data received so far has been written.
+
+    :param session: the session to update
+    :type session: Session
+    :param handler: the handler to register, None to remove the current one
+    """
+    if handler is None:
+        session.storage.pop(STORAGE_COMPLETION_HANDLER, None)
+    else:
+        session.storage[STORAGE_COMPLETION_HANDLER] = handler
+
+
+def get_completion_handler(session: Session):
+    """
+    Returns the handler that gets notified when the reader has finished an input.
+
+    :param session: the session to check
+    :type session: Session
+    :return: the handler, None if not registered
+    """
+    return session.storage.get(STORAGE_COMPLETION_HANDLER, None)
+
+
+def complete_input(session: Session, callback):
+    """
+    To be called by the reader when it has finished an input (i.e., the downstream
+    plugins have received all its data). The callback (without parameters) gets
+    called once the writer has written the data, immediately if the writer does not
+    complete its output with a delay.
+
+    :param session: the session to use
+    :type session: Session
+    :param callback: the callback to execute once the data has been written
+    """
+    handler = get_completion_handler(session)
+    if handler is None:
+        callback()
+    else:
+        handler(callback)
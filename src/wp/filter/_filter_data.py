@@ -1,22 +1,44 @@
 import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Optional
 
 from kasperl.api import make_list
 from seppl.io import BatchFilter
 from seppl.placeholders import placeholder_help, PlaceholderSupporter
 from wai.logging import LOGGING_WARNING
+from jpype import JClass, JArray
+from wp.api import is_end_of_input, load_header, set_class_index, read_object, FilterCache, BufferingFilter, non_numeric_attributes, transfer_values
 from weka.core.classes import from_commandline, to_commandline
 from weka.core.dataset import Instances, Instance
 from weka.filters import Filter
 
+MIN_ROWS_PER_THREAD = 1000
 
-class FilterData(BatchFilter, PlaceholderSupporter):
+SAVE_POLICY_FIRST = "first"
+SAVE_POLICY_INITIALIZATION = "initialization"
+SAVE_POLICY_INTERVAL = "interval"
+SAVE_POLICY_FINALIZE = "finalize"
+SAVE_POLICIES = [
+    SAVE_POLICY_FIRST,
+    SAVE_POLICY_INITIALIZATION,
+    SAVE_POLICY_INTERVAL,
+    SAVE_POLICY_FINALIZE,
+]
+
+
+class FilterData(BatchFilter, PlaceholderSupporter, BufferingFilter):
     """
     Filters the data coming through.
     """
 
     def __init__(self, filter_cmdln: str = None, always_initialize: bool = None,
-                 load_from: str = None, save_to: str = None,
+                 initialize_on_change: bool = None, load_from: str = None, save_to: str = None,
+                 batch_rows: int = None, max_latency_ms: int = None, threads: int = None,
+                 filter_cache: str = None, filter_cache_max_size: int = None,
+                 header_from: str = None, header_class_index: str = None,
+                 save_policy: str = None, save_every_batches: int = None, save_every_seconds: int = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the filter.
@@ -25,10 +47,32 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         :type filter_cmdln: str
         :param always_initialize: whether to initialize the filter with each data item passing through or only once
         :type always_initialize: bool
+        :param initialize_on_change: whether to (re-)initialize the filter only when the structure of the data changes
+        :type initialize_on_change: bool
         :param load_from: the (optional) file to load the serialized filter from
         :type load_from: str
         :param save_to: the (optional) file to save the initialized filter to
         :type save_to: str
+        :param batch_rows: the number of rows to buffer and filter in one go in streaming mode (<1 to filter the rows individually)
+        :type batch_rows: int
+        :param max_latency_ms: the maximum time in msec that rows can be buffered for (<1 for no limit)
+        :type max_latency_ms: int
+        :param threads: the number of threads to use for filtering with streamable filters
+        :type threads: int
+        :param filter_cache: the directory for caching filters initialized with datasets (not used if None)
+        :type filter_cache: str
+        :param filter_cache_max_size: the maximum size in MB of the filter cache, <1 for no limit
+        :type filter_cache_max_size: int
+        :param header_from: the ARFF file or serialized Instances object with the structure to initialize the filter with before any data arrives
+        :type header_from: str
+        :param header_class_index: the class index to set on the structure loaded from the header file (e.g. 1, first, 3, last), ignored if None
+        :type header_class_index: str
+        :param save_policy: when to save the filter (see SAVE_POLICIES)
+        :type save_policy: str
+        :param save_every_batches: the number of processed batches after which to save the changed filter with the interval policy (<1 to ignore)
+        :type save_every_batches: int
+        :param save_every_seconds: the number of seconds after which to save the changed filter with the interval policy (<1 to ignore)
+        :type save_every_seconds: int
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
@@ -37,10 +81,36 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         super().__init__(logger_name=logger_name, logging_level=logging_level)
         self.filter_cmdln = filter_cmdln
         self.always_initialize = always_initialize
+        self.initialize_on_change = initialize_on_change
         self.load_from = load_from
         self.save_to = save_to
+        self.batch_rows = batch_rows
+        self.max_latency_ms = max_latency_ms
+        self.threads = threads
+        self.filter_cache = filter_cache
+        self.filter_cache_max_size = filter_cache_max_size
+        self.header_from = header_from
+        self.header_class_index = header_class_index
+        self.save_policy = save_policy
+        self.save_every_batches = save_every_batches
+        self.save_every_seconds = save_every_seconds
+        self._dirty = False
+        self._saved = False
+        self._save_batches = 0
+        self._save_time = None
+        self._filter_cache: Optional[FilterCache] = None
+        self._replicas: Optional[List[Filter]] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._buffer: List[Instance] = []
+        self._buffer_start = None
+        self._buffer_header: Optional[Instances] = None
+        self._buffer_data: Optional[Instances] = None
+        self._buffer_non_numeric = []
+        self._batching = None
+        self._held = False
         self._filter: Optional[Filter] = None
         self._first = True
+        self._header: Optional[Instances] = None
 
     def name(self) -> str:
         """
@@ -88,8 +158,19 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         parser = super()._create_argparser()
         parser.add_argument("-f", "--filter", metavar="CMDLINE", type=str, help="The command-line of the filter to use (classname + options).", default=None, required=False)
         parser.add_argument("-a", "--always_initialize", action="store_true", help="Whether to initialize the filter with each data item passing through.")
+        parser.add_argument("-c", "--initialize_on_change", action="store_true", help="Whether to (re-)initialize the filter only when the structure of the data changes, compared to the data the filter was last initialized with.")
         parser.add_argument("-L", "--load_from", metavar="FILE", type=str, help="The file to load the serialized filter from. " + placeholder_help(obj=self), default=None, required=False)
-        parser.add_argument("-S", "--save_to", metavar="FILE", type=str, help="The file to save the initialized filter to. " + placeholder_help(obj=self), default=None, required=False)
+        parser.add_argument("-S", "--save_to", metavar="FILE", type=str, help="The file to save the initialized filter to, see --save_policy for when. " + placeholder_help(obj=self), default=None, required=False)
+        parser.add_argument("--save_policy", choices=SAVE_POLICIES, help="When to save the filter: %s=after processing the data of the first initialization, %s=after processing the data of every (re-)initialization, %s=every N batches and/or T seconds, %s=when finishing; except for %s, a filter that changed since it was last saved gets saved when finishing as well." % (SAVE_POLICY_FIRST, SAVE_POLICY_INITIALIZATION, SAVE_POLICY_INTERVAL, SAVE_POLICY_FINALIZE, SAVE_POLICY_FIRST), default=SAVE_POLICY_INITIALIZATION, required=False)
+        parser.add_argument("--save_every_batches", metavar="N", type=int, help="The number of processed batches after which to save the changed filter when using the %s policy; <1 to ignore." % SAVE_POLICY_INTERVAL, default=0, required=False)
+        parser.add_argument("--save_every_seconds", metavar="T", type=int, help="The number of seconds after which to save the changed filter when using the %s policy; <1 to ignore." % SAVE_POLICY_INTERVAL, default=0, required=False)
+        parser.add_argument("--batch_rows", metavar="NUM", type=int, help="The number of rows to buffer when receiving single rows and filter in one go, which requires a streamable filter and a reader that signals the end of its inputs like load-data; the buffer gets flushed at the end of each input; <1 to filter the rows individually.", default=0, required=False)
+        parser.add_argument("--max_latency_ms", metavar="MSEC", type=int, help="The maximum time in milliseconds that buffered rows can be held back before the buffer gets flushed, checked whenever a row arrives; <1 for no limit.", default=0, required=False)
+        parser.add_argument("-t", "--threads", metavar="NUM", type=int, help="The number of threads to use for filtering datasets (or buffered rows) with a streamable filter, splitting them across copies of the initialized filter; the filter must not keep any state between rows, e.g., counters.", default=1, required=False)
+        parser.add_argument("--filter_cache", metavar="DIR", type=str, help="The directory for caching filters that got initialized with a dataset, keyed by filter command-line and content of the dataset; on a hit, the cached filter gets used instead of initializing the filter with the data again; not suitable for filters that treat the first batch differently from subsequent ones, e.g., Resample; only used with --filter. " + placeholder_help(obj=self), default=None, required=False)
+        parser.add_argument("--header_from", metavar="FILE", type=str, help="The ARFF file (only the header gets read) or serialized Instances object with the structure of the data, for initializing the filter before any data arrives, e.g., when streaming rows. " + placeholder_help(obj=self), default=None, required=False)
+        parser.add_argument("--header_class_index", metavar="INDEX", type=str, help="The class index to set on the structure loaded via --header_from, e.g., 1, first, 3, last.", default=None, required=False)
+        parser.add_argument("--filter_cache_max_size", metavar="MB", type=int, help="The maximum size in MB of the filter cache, removing the least recently used filters when exceeded; <1 for no limit.", default=0, required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -102,8 +183,19 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         super()._apply_args(ns)
         self.filter_cmdln = ns.filter
         self.always_initialize = ns.always_initialize
+        self.initialize_on_change = ns.initialize_on_change
         self.load_from = ns.load_from
         self.save_to = ns.save_to
+        self.batch_rows = ns.batch_rows
+        self.max_latency_ms = ns.max_latency_ms
+        self.threads = ns.threads
+        self.filter_cache = ns.filter_cache
+        self.filter_cache_max_size = ns.filter_cache_max_size
+        self.header_from = ns.header_from
+        self.header_class_index = ns.header_class_index
+        self.save_policy = ns.save_policy
+        self.save_every_batches = ns.save_every_batches
+        self.save_every_seconds = ns.save_every_seconds
 
     def initialize(self):
         """
@@ -111,8 +203,434 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         """
         super().initialize()
         self._first = True
+        self._filter = None
         if self.always_initialize is None:
             self.always_initialize = False
+        if self.initialize_on_change is None:
+            self.initialize_on_change = False
+        if self.batch_rows is None:
+            self.batch_rows = 0
+        if self.max_latency_ms is None:
+            self.max_latency_ms = 0
+        if self.threads is None:
+            self.threads = 1
+        if self.filter_cache_max_size is None:
+            self.filter_cache_max_size = 0
+        if self.save_policy is None:
+            self.save_policy = SAVE_POLICY_INITIALIZATION
+        if self.save_policy not in SAVE_POLICIES:
+            raise Exception("Unsupported save policy: %s" % self.save_policy)
+        if self.save_every_batches is None:
+            self.save_every_batches = 0
+        if self.save_every_seconds is None:
+            self.save_every_seconds = 0
+        if (self.save_to is not None) and (self.save_policy == SAVE_POLICY_INTERVAL) \
+                and (self.save_every_batches < 1) and (self.save_every_seconds < 1):
+            raise Exception("The %s save policy requires the number of batches and/or seconds!" % SAVE_POLICY_INTERVAL)
+        self._dirty = False
+        self._saved = False
+        self._save_batches = 0
+        self._save_time = time.time()
+        self._filter_cache = None
+        if self.filter_cache is not None:
+            if self.filter_cmdln is None:
+                self.logger().warning("Filter cache is only available when using a filter command-line, ignoring!")
+            else:
+                self._filter_cache = FilterCache(self.session.expand_placeholders(self.filter_cache),
+                                                 max_size=self.filter_cache_max_size * 1024 * 1024, logger=self.logger())
+                self.logger().info("Using filter cache: %s" % self._filter_cache.cache_dir)
+        # needs resetting before initializing the filter with the header (which records the header)
+        self._replicas = None
+        self._header = None
+        if self.header_from is not None:
+            path = self.session.expand_placeholders(self.header_from)
+            self.logger().info("Loading header from: %s" % path)
+            header = load_header(path)
+            set_class_index(header, self.header_class_index)
+            self._setup_filter()
+            self._initialize_filter(header)
+            self._first = False
+        self._buffer = []
+        self._buffer_start = None
+        self._buffer_header = None
+        self._buffer_data = None
+        self._buffer_non_numeric = []
+        self._batching = None
+        self._held = False
+
+    def _header_changed(self, header: Instances) -> bool:
+        """
+        Checks whether the structure of the data differs from the one that the
+        filter was last initialized with.
+
+        :param header: the structure to check
+        :type header: Instances
+        :return: True if changed
+        :rtype: bool
+        """
+        if self._header is None:
+            return True
+        # comparison happens within the JVM and is cheap compared to re-initializing
+        return not self._header.jobject.equalHeaders(header.jobject)
+
+    def _setup_filter(self):
+        """
+        Instantiates or loads the filter.
+        """
+        if self.filter_cmdln is not None:
+            self.logger().info("Instantiating filter: %s" % self.filter_cmdln)
+            self._filter = from_commandline(self.filter_cmdln, classname="weka.filters.Filter")
+        elif self.load_from is not None:
+            path = self.session.expand_placeholders(self.load_from)
+            self.logger().info("Loading filter from: %s" % path)
+            self._filter = Filter(jobject=read_object(path, logger=self.logger()))
+            self.logger().info("Loaded filter: %s" % to_commandline(self._filter))
+        else:
+            raise Exception("Either a filter command-line or a serialized file must be specified!")
+
+    def _requires_initialization(self, header: Instances) -> bool:
+        """
+        Checks whether the filter needs to be initialized with the structure.
+
+        :param header: the structure of the data to filter
+        :type header: Instances
+        :return: True if the filter needs initializing
+        :rtype: bool
+        """
+        if self.initialize_on_change:
+            return self._first or self._header_changed(header)
+        return self._first or self.always_initialize
+
+    def _initialize_filter(self, header: Instances) -> bool:
+        """
+        Initializes the filter with the structure, if necessary.
+
+        :param header: the structure of the data to filter
+        :type header: Instances
+        :return: whether the filter got initialized
+        :rtype: bool
+        """
+        initialize = self._requires_initialization(header)
+        if not initialize and self.initialize_on_change:
+            self.logger().debug("Structure unchanged, skipping initialization: %s" % header.relationname)
+        if initialize:
+            self.logger().info("Initializing filter with data: %s" % header.relationname)
+            self._filter.inputformat(header)
+            self._replicas = None
+            self._dirty = True
+            if self.initialize_on_change:
+                self._header = Instances.template_instances(header, 0)
+        return initialize
+
+    def _save_filter(self):
+        """
+        Saves the filter. Writes to a temporary file first, which then replaces
+        the actual file, i.e., the file is never left incomplete.
+        """
+        path = self.session.expand_placeholders(self.save_to)
+        self.logger().info("Saving filter to: %s" % path)
+        tmp = path + ".tmp"
+        self._filter.serialize(tmp)
+        os.replace(tmp, path)
+        self._dirty = False
+        self._saved = True
+        self._save_batches = 0
+        self._save_time = time.time()
+
+    def _checkpoint(self):
+        """
+        Saves the filter after processing a batch, if necessary according to the save policy.
+        """
+        if self.save_to is None:
+            return
+        self._save_batches += 1
+        if not self._dirty:
+            return
+        if self.save_policy == SAVE_POLICY_FIRST:
+            save = not self._saved
+        elif self.save_policy == SAVE_POLICY_INITIALIZATION:
+            save = True
+        elif self.save_policy == SAVE_POLICY_INTERVAL:
+            save = ((self.save_every_batches > 0) and (self._save_batches >= self.save_every_batches)) \
+                or ((self.save_every_seconds > 0) and (time.time() - self._save_time >= self.save_every_seconds))
+        else:
+            save = False
+        if save:
+            self._save_filter()
+
+    def _filter_items(self, data: List) -> List:
+        """
+        Filters the items individually.
+
+        :param data: the Instances/Instance objects to filter
+        :type data: list
+        :return: the filtered items
+        :rtype: list
+        """
+        if isinstance(data[0], Instances):
+            header = data[0]
+        elif isinstance(data[0], Instance):
+            header = data[0].dataset
+        else:
+            raise Exception("Unhandled data: %s" % str(type(data)))
+        result = []
+        # initializing the filter discards any rows it still holds back
+        if self._held and self._requires_initialization(header):
+            result.extend(self._finish_batch())
+        initialized = self._initialize_filter(header)
+
+        jfilter = self._filter.jobject
+        jheader = header.jobject
+        for i, item in enumerate(data):
+            if isinstance(item, Instance):
+                # rows from different inputs can end up in the same list in batch mode
+                if self.initialize_on_change and (i > 0) and (item.jobject.dataset() != jheader):
+                    jheader = item.jobject.dataset()
+                    row_header = Instances(jheader)
+                    if self._held and self._requires_initialization(row_header):
+                        result.extend(self._finish_batch())
+                    self._initialize_filter(row_header)
+                # non-streamable filters hold back the rows of the first batch till it has finished
+                if jfilter.input(item.jobject):
+                    while jfilter.numPendingOutput() > 0:
+                        result.append(Instance(jfilter.output()))
+                elif not self._held:
+                    self.logger().debug("Filter holds back rows till the end of the input: %s" % self._filter.classname)
+                    self._held = True
+            elif initialized and (i == 0) and (self._filter_cache is not None):
+                result.append(self._filter_dataset_cached(item))
+            else:
+                result.append(self._filter_dataset(item))
+        if is_end_of_input(self.session):
+            result.extend(self._finish_batch())
+        self._checkpoint()
+        self._first = False
+        return result
+
+    def _finish_batch(self) -> List:
+        """
+        Signals the end of the batch to the filter if it held back any rows and returns them.
+
+        :return: the filtered rows
+        :rtype: list
+        """
+        result = []
+        if not self._held:
+            return result
+        self._held = False
+        jfilter = self._filter.jobject
+        jfilter.batchFinished()
+        while jfilter.numPendingOutput() > 0:
+            result.append(Instance(jfilter.output()))
+        return result
+
+    def _filter_dataset(self, data: Instances) -> Instances:
+        """
+        Filters the dataset, splitting it across copies of the filter that get
+        applied in parallel if multiple threads are to be used.
+
+        :param data: the dataset to filter
+        :type data: Instances
+        :return: the filtered dataset
+        :rtype: Instances
+        """
+        num_parts = min(self.threads, data.num_instances // MIN_ROWS_PER_THREAD)
+        if (num_parts < 2) or not isinstance(self._filter.jobject, JClass("weka.filters.StreamableFilter")):
+            return self._filter.filter(data)
+
+        # the initialized filter gets copied, as filters cannot be used concurrently
+        if (self._replicas is None) or (len(self._replicas) < num_parts - 1):
+            self.logger().info("Copying initialized filter for %d thread(s)" % (self.threads - 1))
+            self._replicas = [Filter(jobject=JClass("weka.filters.Filter").makeCopy(self._filter.jobject)) for _ in range(self.threads - 1)]
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="filter")
+
+        # split (shallow copies of the rows) and filter
+        filters = [self._filter] + self._replicas
+        parts = []
+        for i in range(num_parts):
+            start = i * data.num_instances // num_parts
+            end = (i + 1) * data.num_instances // num_parts
+            parts.append(Instances(JClass("weka.core.Instances")(data.jobject, start, end - start)))
+        self.logger().debug("Filtering %d rows using %d threads" % (data.num_instances, num_parts))
+        filtered = list(self._executor.map(lambda x: x[0].filter(x[1]), zip(filters, parts)))
+
+        # merge in the original order
+        result = Instances.template_instances(filtered[0], data.num_instances)
+        result.jobject.addAll(filtered[0].jobject)
+        # string/relational values of the other parts are stored in the structures of their replicas
+        non_numeric = non_numeric_attributes(result)
+        for part in filtered[1:]:
+            if len(non_numeric) == 0:
+                result.jobject.addAll(part.jobject)
+                continue
+            jpart = part.jobject
+            for i in range(jpart.numInstances()):
+                jinst = jpart.instance(i)
+                transfer_values(jinst, result.jobject, non_numeric)
+                result.jobject.add(jinst)
+        return result
+
+    def _filter_dataset_cached(self, data: Instances) -> Instances:
+        """
+        Filters the dataset that the filter just got initialized with. Uses the
+        filter from the cache if it was already initialized with this data before,
+        otherwise the filter gets stored in the cache after filtering the data.
+
+        :param data: the dataset to filter
+        :type data: Instances
+        :return: the filtered dataset
+        :rtype: Instances
+        """
+        key = self._filter_cache.key(self.filter_cmdln, data)
+        cached = self._filter_cache.load(key)
+        if cached is not None:
+            self.logger().info("Using cached filter: %s" % key)
+            self._filter = cached
+            self._replicas = None
+            return self._filter_dataset(data)
+        result = self._filter_dataset(data)
+        self.logger().info("Caching filter: %s" % key)
+        self._filter_cache.store(key, self._filter)
+        return result
+
+    def _can_batch(self) -> bool:
+        """
+        Checks whether single rows can be buffered and filtered in one go.
+
+        :return: True if possible
+        :rtype: bool
+        """
+        if self._batching is None:
+            self._batching = True
+            if not isinstance(self._filter.jobject, JClass("weka.filters.StreamableFilter")):
+                self.logger().warning("Filter is not streamable, filtering rows individually: %s" % self._filter.classname)
+                self._batching = False
+            elif is_end_of_input(self.session) is None:
+                self.logger().warning("Reader does not signal the end of its inputs, filtering rows individually!")
+                self._batching = False
+        return self._batching
+
+    def _flush(self) -> List:
+        """
+        Filters the buffered rows in one go.
+
+        :return: the filtered rows, in the same order
+        :rtype: list
+        """
+        if len(self._buffer) == 0:
+            return []
+        self._initialize_filter(self._buffer_header)
+        # the buffered rows store their string/relational values in the buffer's structure
+        structure = self._buffer_header if (self._buffer_data is None) else self._buffer_data
+        batch = Instances.template_instances(structure, len(self._buffer))
+        rows = JArray(JClass("weka.core.Instance"))([x.jobject for x in self._buffer])
+        batch.jobject.addAll(JClass("java.util.Arrays").asList(rows))
+        self.logger().debug("Filtering batch of %d rows" % len(self._buffer))
+        self._buffer = []
+        self._buffer_start = None
+        self._buffer_header = None
+        self._buffer_data = None
+        filtered = self._filter_dataset(batch)
+        self._checkpoint()
+        self._first = False
+        return [Instance(x) for x in filtered.jobject.toArray()]
+
+    def flush_buffer(self) -> Optional[List]:
+        """
+        Filters any buffered rows and outputs the rows held back by the filter,
+        e.g., when the reader moves on to the next input.
+
+        :return: the filtered rows, None if nothing buffered
+        :rtype: list
+        """
+        if (len(self._buffer) == 0) and not self._held:
+            return None
+        result = self._flush()
+        result.extend(self._finish_batch())
+        return result
+
+    def _add_to_buffer(self, inst: Instance) -> List:
+        """
+        Adds the row to the buffer. The buffer gets flushed first if the row has a different
+        structure than the buffered ones (e.g., rows from different files in batch mode).
+        Rows with string/relational attributes get copied, storing their values in a
+        structure owned by the buffer, as the structure they refer to may get reused
+        by the loader for the next row.
+
+        :param inst: the row to add
+        :type inst: Instance
+        :return: the filtered rows in case the buffer had to be flushed
+        :rtype: list
+        """
+        result = []
+        jheader = inst.jobject.dataset()
+        if (len(self._buffer) > 0) and not self._buffer_header.jobject.equalHeaders(jheader):
+            result = self._flush()
+        if len(self._buffer) == 0:
+            self._buffer_start = time.time()
+            self._buffer_header = Instances(jheader)
+            self._buffer_non_numeric = non_numeric_attributes(self._buffer_header)
+            self._buffer_data = None
+            if len(self._buffer_non_numeric) > 0:
+                self._buffer_data = Instances(jheader.stringFreeStructure())
+        if self._buffer_data is not None:
+            jinst = inst.jobject.copy()
+            transfer_values(jinst, self._buffer_data.jobject, self._buffer_non_numeric)
+            jinst.setDataset(self._buffer_data.jobject)
+            inst = Instance(jinst)
+        self._buffer.append(inst)
+        return result
+
+    def _buffer_rows(self, data: List) -> Optional[List]:
+        """
+        Buffers the rows and filters them in one go once the buffer is full,
+        the maximum latency has been reached or the end of the input.
+
+        :param data: the rows to buffer
+        :type data: list
+        :return: the filtered rows, None if nothing to forward yet
+        :rtype: list
+        """
+        result = []
+        for inst in data:
+            result.extend(self._add_to_buffer(inst))
+            if len(self._buffer) >= self.batch_rows:
+                result.extend(self._flush())
+            elif (self.max_latency_ms > 0) and ((time.time() - self._buffer_start) * 1000 >= self.max_latency_ms):
+                result.extend(self._flush())
+        if is_end_of_input(self.session):
+            result.extend(self._flush())
+        if len(result) == 0:
+            return None
+        return result
+
+    def _requires_list_input(self) -> bool:
+        """
+        Returns whether lists are supported as input.
+
+        :return: True if list inputs are natively handled by the filter
+        :rtype: bool
+        """
+        # lists of rows (e.g., flushed by an upstream filter) need to be filtered as a whole,
+        # as the end of the input applies to the last row only
+        return True
+
+    def _process_rows(self, rows: List) -> List:
+        """
+        Buffers or filters the rows.
+
+        :param rows: the rows to process
+        :type rows: list
+        :return: the filtered rows
+        :rtype: list
+        """
+        if (self.batch_rows > 0) and self._can_batch():
+            result = self._buffer_rows(rows)
+            return [] if (result is None) else result
+        result = self._flush()
+        result.extend(self._filter_items(rows))
+        return result
 
     def _do_process(self, data):
         """
@@ -124,40 +642,47 @@ class FilterData(BatchFilter, PlaceholderSupporter):
         data = make_list(data)
 
         # setting up filter
-        if self._first:
-            if self.filter_cmdln is not None:
-                self.logger().info("Instantiating filter: %s" % self.filter_cmdln)
-                self._filter = from_commandline(self.filter_cmdln, classname="weka.filters.Filter")
-            elif self.load_from is not None:
-                path = self.session.expand_placeholders(self.load_from)
-                self.logger().info("Loading filter from: %s" % path)
-                self._filter = Filter.deserialize(path)
-                self.logger().info("Loaded filter: %s" % to_commandline(self._filter))
-            else:
-                raise Exception("Either a filter command-line or a serialized file must be specified!")
-
-        # initialize filter
-        if self._first or self.always_initialize:
-            if isinstance(data[0], Instances):
-                self.logger().info("Initializing filter with data: %s" % data[0].relationname)
-                self._filter.inputformat(data[0])
-            elif isinstance(data[0], Instance):
-                self.logger().info("Initializing filter with data: %s" % data[0].dataset.relationname)
-                self._filter.inputformat(data[0].dataset)
-            else:
-                raise Exception("Unhandled data: %s" % str(type(data)))
+        if self._first and (self._filter is None):
+            self._setup_filter()
 
-        # filter data
+        # consecutive rows get filtered together, datasets one by one
         result = []
-        for item in data:
-            result.append(self._filter.filter(item))
-
-        # save filter?
-        if self.save_to is not None:
-            path = self.session.expand_placeholders(self.save_to)
-            self.logger().info("Saving filter to: %s" % path)
-            self._filter.serialize(path)
-
-        self._first = False
-
+        start = 0
+        for i, item in enumerate(data):
+            if isinstance(item, Instance):
+                continue
+            if i > start:
+                result.extend(self._process_rows(data[start:i]))
+            result.extend(self._flush())
+            result.extend(self._finish_batch())
+            result.extend(self._filter_items([item]))
+            start = i + 1
+        if start < len(data):
+            result.extend(self._process_rows(data[start:]))
+        if len(result) == 0:
+            return None
         return result
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        # the pipeline flushes the buffer when the reader finishes, i.e., only happens if it got stopped or failed
+        if len(self._buffer) > 0:
+            self.logger().warning("Discarding %d buffered row(s) that could not be flushed!" % len(self._buffer))
+            self._buffer = []
+            self._buffer_header = None
+            self._buffer_data = None
+        if self._held:
+            self.logger().warning("Discarding row(s) held back by the filter!")
+            self._held = False
+        if (self.save_to is not None) and self._dirty and (self.save_policy != SAVE_POLICY_FIRST):
+            self._save_filter()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self._replicas = None
+        if self._filter_cache is not None:
+            self.logger().info("Filter cache: %s" % self._filter_cache.statistics())
+            self._filter_cache = None
+        super().finalize()
@@ -1,21 +1,37 @@
 import argparse
-from typing import List, Iterable, Union, Optional
+import functools
+import os
+import threading
+from typing import List, Iterable, Union, Optional, Dict
 
 from seppl.io import locate_files
 from wai.logging import LOGGING_WARNING
 
 from seppl.placeholders import PlaceholderSupporter, placeholder_list
 from kasperl.api import Reader
+from wp.api import Prefetcher, Journal, DatasetCache, set_class_index, non_numeric_attributes, transfer_values, fast_parse, load_index, parse_row_range, chunk_rows, read_rows, detect_compression, strip_compression, DecompressingStream, close_after_error, mark_end_of_input, clear_end_of_input, complete_input, predicted_memory, free_heap, LookAheadIterator, iterate_files, shard_files, parse_shard, SHARD_MODES, SHARD_MODE_HASH
+from jpype import JClass
 from weka.core.dataset import Instances, Instance
 from weka.core.classes import from_commandline, to_commandline
 from weka.core.converters import Loader, loader_for_file
 
+HEAP_CHUNK_SIZE_DEFAULT = 10000
+
+DETACHED_ROWS_MAX = 1000
+""" the number of rows that share a structure storing their string/relational values. """
+
 
 class LoadData(Reader, PlaceholderSupporter):
 
     def __init__(self, source: Union[str, List[str]] = None, source_list: Union[str, List[str]] = None,
                  resume_from: str = None, use_custom_loader: bool = None, custom_loader: str = None,
-                 class_index: str = None, incremental: bool = None,
+                 class_index: str = None, incremental: bool = None, chunk_size: int = None,
+                 prefetch: int = None, prefetch_memory: int = None,
+                 lazy: bool = None, shard: str = None, shard_mode: str = None,
+                 journal: str = None, journal_sync: int = None,
+                 cache_dir: str = None, cache_max_size: int = None, fast_parse: bool = None,
+                 row_range: str = None, chunk: str = None, cache_headers: bool = None,
+                 decompression_threads: int = None, heap_fraction: float = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the reader.
@@ -32,6 +48,38 @@ class LoadData(Reader, PlaceholderSupporter):
         :type class_index: str
         :param incremental: whether to load the data row by row or in one goe
         :type incremental: bool
+        :param chunk_size: the number of rows to combine into a dataset in incremental mode (<1 to forward single rows)
+        :type chunk_size: int
+        :param prefetch: the number of files to load in the background (<1 to turn off), ignored in incremental mode
+        :type prefetch: int
+        :param prefetch_memory: the maximum size in MB of the prefetched files (based on their file size), <1 for no limit
+        :type prefetch_memory: int
+        :param lazy: whether to discover the files lazily rather than locating all of them up front (globs don't get sorted)
+        :type lazy: bool
+        :param shard: the shard of the files to process (K/N, 1-based K), processes all files if None
+        :type shard: str
+        :param shard_mode: how to assign the files to the shards, see SHARD_MODES
+        :type shard_mode: str
+        :param journal: the file to record the completed files in, which get skipped when re-running (not used if None)
+        :type journal: str
+        :param journal_sync: the number of completed files after which to sync the journal to disk
+        :type journal_sync: int
+        :param cache_dir: the directory for caching the parsed datasets in binary form (not used if None)
+        :type cache_dir: str
+        :param cache_max_size: the maximum size in MB of the cache, <1 for no limit
+        :type cache_max_size: int
+        :param fast_parse: whether to parse dense numeric/nominal ARFF and numeric CSV files with NumPy rather than the Weka loader
+        :type fast_parse: bool
+        :param row_range: the rows to read (FROM-TO, 1-based, inclusive), requires an index built with wp-index, reads all rows if None
+        :type row_range: str
+        :param chunk: the chunk of rows to read (K/N, 1-based K), requires an index built with wp-index, reads all rows if None
+        :type chunk: str
+        :param cache_headers: whether to reuse the headers of files with identical headers
+        :type cache_headers: bool
+        :param decompression_threads: the number of threads to use for decompressing compressed files (gz, bz2, xz, zst), if supported
+        :type decompression_threads: int
+        :param heap_fraction: the fraction of the free heap above which files get loaded in chunks rather than in one go, based on their predicted memory usage (<=0 to turn off)
+        :type heap_fraction: float
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
@@ -45,9 +93,35 @@ class LoadData(Reader, PlaceholderSupporter):
         self.custom_loader = custom_loader
         self.class_index = class_index
         self.incremental = incremental
-        self._inputs = None
+        self.chunk_size = chunk_size
+        self.prefetch = prefetch
+        self.prefetch_memory = prefetch_memory
+        self.lazy = lazy
+        self.shard = shard
+        self.shard_mode = shard_mode
+        self.journal = journal
+        self.journal_sync = journal_sync
+        self.cache_dir = cache_dir
+        self.cache_max_size = cache_max_size
+        self.fast_parse = fast_parse
+        self.row_range = row_range
+        self.chunk = chunk
+        self.cache_headers = cache_headers
+        self.decompression_threads = decompression_threads
+        self.heap_fraction = heap_fraction
+        self._decompressing: Optional[DecompressingStream] = None
+        # the loaders are per thread, as prefetching loads the files in the background
+        self._loading: Dict[int, Dict] = dict()
+        self._loaders: Dict[str, Loader] = dict()
+        self._headers: Optional[Dict] = None
+        self._loaded_headers: List[Instances] = []
+        self._journal: Optional[Journal] = None
+        self._cache: Optional[DatasetCache] = None
+        self._journal_skipped = 0
+        self._inputs: Optional[LookAheadIterator] = None
         self._current_input: Optional[Loader] = None
         self._loader = None
+        self._prefetcher: Optional[Prefetcher] = None
 
     def name(self) -> str:
         """
@@ -82,6 +156,22 @@ class LoadData(Reader, PlaceholderSupporter):
         parser.add_argument("-L", "--custom_loader", metavar="CMDLINE", type=str, default=None, help="The command-line of the custom loader to use (classname + options).", required=False)
         parser.add_argument("-c", "--class_index", type=str, default=None, help="The class index to use on the data, e.g., 1, first, 3, last.", required=False)
         parser.add_argument("--incremental", action="store_true", help="Whether to load the data row by row rather than in one go.")
+        parser.add_argument("--chunk_size", metavar="NUM", type=int, default=0, help="The number of rows to forward as a single dataset when loading the data incrementally; <1 to forward the rows individually.", required=False)
+        parser.add_argument("--prefetch", metavar="NUM", type=int, default=0, help="The number of files to load in the background while the current one gets processed; <1 to turn off; ignored in incremental mode.", required=False)
+        parser.add_argument("--prefetch_memory", metavar="MB", type=int, default=0, help="The maximum size in MB of the files (based on their size on disk) that can be prefetched; <1 for no limit.", required=False)
+        parser.add_argument("--lazy", action="store_true", help="Whether to discover the files lazily while processing them rather than locating all of them up front; globs are not sorted in that case.")
+        parser.add_argument("--shard", metavar="K/N", type=str, default=None, help="The shard of files to process, with K being the 1-based index of the shard and N the total number of shards; processes all files if not supplied.", required=False)
+        parser.add_argument("--shard_mode", choices=SHARD_MODES, default=SHARD_MODE_HASH, help="How to assign the files to the shards: '" + SHARD_MODE_HASH + "' uses the hash of the path and is independent of the order of the files, whereas the order needs to be the same for all processes with 'round-robin'.", required=False)
+        parser.add_argument("--journal", metavar="FILE", type=str, default=None, help="The file to record the completed files in; files recorded in an existing journal get skipped; " + placeholder_list(obj=self), required=False)
+        parser.add_argument("--journal_sync", metavar="NUM", type=int, default=100, help="The number of completed files after which to sync the journal to disk.", required=False)
+        parser.add_argument("--cache_dir", metavar="DIR", type=str, default=None, help="The directory for caching the parsed datasets in binary form, speeding up subsequent loads of unchanged files; datasets with string/relational attributes and incremental loading are not supported; " + placeholder_list(obj=self), required=False)
+        parser.add_argument("--cache_max_size", metavar="MB", type=int, default=0, help="The maximum size in MB of the cache, removing the least recently used datasets when exceeded; <1 for no limit.", required=False)
+        parser.add_argument("--fast_parse", action="store_true", help="Whether to parse dense ARFF files with only numeric/nominal attributes and CSV files with only numeric columns using NumPy rather than the Weka loader; falls back to the Weka loader for any other files; ignored when using a custom loader or in incremental mode.")
+        parser.add_argument("--row_range", metavar="FROM-TO", type=str, default=None, help="The rows to read from each file (1-based, inclusive; TO can be 'last'), using the row-offset index built with wp-index to seek to the rows; disables caching and fast parsing.", required=False)
+        parser.add_argument("--chunk", metavar="K/N", type=str, default=None, help="The chunk of rows to read from each file, with K being the 1-based index of the chunk and N the total number of chunks, using the row-offset index built with wp-index; chunks are aligned with the offsets in the index; since CSV files get loaded chunk by chunk, nominal labels may differ between chunks; disables caching and fast parsing.", required=False)
+        parser.add_argument("--cache_headers", action="store_true", help="Whether to reuse the header for files with an identical header: fast parsing does not parse such headers again and datasets loaded with Weka loaders get the attribute objects of the first dataset with an equal header (not for string/relational attributes); the datasets share the attribute objects, which allows downstream plugins to detect that the format has not changed cheaply.")
+        parser.add_argument("--decompression_threads", metavar="NUM", type=int, default=1, help="The number of threads to use for decompressing files, which get detected by their extension (.gz, .bz2, .xz, .zst); the decompression happens in the background and the loader only sees the plain data; multiple threads require the 'isal' library for gzip.", required=False)
+        parser.add_argument("--heap_fraction", metavar="FRACTION", type=float, default=0.0, help="The fraction of the free heap that the data of a file (predicted from the file size) may use when loading it in one go; larger files get loaded incrementally instead and forwarded in chunks (of --chunk_size rows or " + str(HEAP_CHUNK_SIZE_DEFAULT) + " if not specified); <=0 to turn off; ignored when prefetching.", required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -99,6 +189,22 @@ class LoadData(Reader, PlaceholderSupporter):
         self.custom_loader = ns.custom_loader
         self.class_index = ns.class_index
         self.incremental = ns.incremental
+        self.chunk_size = ns.chunk_size
+        self.prefetch = ns.prefetch
+        self.prefetch_memory = ns.prefetch_memory
+        self.lazy = ns.lazy
+        self.shard = ns.shard
+        self.shard_mode = ns.shard_mode
+        self.journal = ns.journal
+        self.journal_sync = ns.journal_sync
+        self.cache_dir = ns.cache_dir
+        self.cache_max_size = ns.cache_max_size
+        self.fast_parse = ns.fast_parse
+        self.row_range = ns.row_range
+        self.chunk = ns.chunk
+        self.cache_headers = ns.cache_headers
+        self.decompression_threads = ns.decompression_threads
+        self.heap_fraction = ns.heap_fraction
 
     def generates(self) -> List:
         """
@@ -107,7 +213,9 @@ class LoadData(Reader, PlaceholderSupporter):
         :return: the list of classes
         :rtype: list
         """
-        if self.incremental:
+        if self.incremental and (self.chunk_size is not None) and (self.chunk_size > 0):
+            return [Instances]
+        elif self.incremental:
             return [Instance]
         else:
             return [Instances]
@@ -126,7 +234,468 @@ class LoadData(Reader, PlaceholderSupporter):
             self._loader = from_commandline(self.custom_loader, classname="weka.core.converters.Loader")
         if self.incremental is None:
             self.incremental = False
+        if self.chunk_size is None:
+            self.chunk_size = 0
+        if self.prefetch is None:
+            self.prefetch = 0
+        if self.prefetch_memory is None:
+            self.prefetch_memory = 0
+        if self.lazy is None:
+            self.lazy = False
+        if self.shard_mode is None:
+            self.shard_mode = SHARD_MODE_HASH
+        if self.shard is not None:
+            parse_shard(self.shard)
+        if self.journal_sync is None:
+            self.journal_sync = 100
+        self._journal = None
+        self._journal_skipped = 0
+        if self.journal is not None:
+            self._journal = Journal(self.session.expand_placeholders(self.journal), sync_interval=self.journal_sync)
+            num = self._journal.open()
+            self.logger().info("Files already completed according to journal '%s': %d" % (self._journal.path, num))
+        if self.incremental and (self.prefetch > 0):
+            self.logger().warning("Prefetching is not available in incremental mode, ignoring!")
+        if self.fast_parse is None:
+            self.fast_parse = False
+        if self.cache_headers is None:
+            self.cache_headers = False
+        if self.decompression_threads is None:
+            self.decompression_threads = 1
+        if self.heap_fraction is None:
+            self.heap_fraction = 0.0
+        self._decompressing = None
+        self._headers = dict() if self.cache_headers else None
+        self._loaded_headers = []
+        self._loaders = dict()
+        if (self.row_range is not None) and (self.chunk is not None):
+            raise Exception("Either row range or chunk can be specified, not both!")
+        if self.row_range is not None:
+            parse_row_range(self.row_range)
+        if self.chunk is not None:
+            parse_shard(self.chunk)
+        if self.cache_max_size is None:
+            self.cache_max_size = 0
+        self._cache = None
+        if self.cache_dir is not None:
+            if self._rows_selected():
+                self.logger().warning("Caching is not available when reading a subset of rows, ignoring!")
+            elif self.incremental:
+                self.logger().warning("Caching is not available in incremental mode, ignoring!")
+            else:
+                self._cache = DatasetCache(self.session.expand_placeholders(self.cache_dir),
+                                           max_size=self.cache_max_size * 1024 * 1024, logger=self.logger())
+                self.logger().info("Using dataset cache: %s" % self._cache.cache_dir)
         self._inputs = None
+        self._prefetcher = None
+
+    def _loading_state(self) -> Dict:
+        """
+        Returns the loading state (loader and auto-detected loaders) of the calling thread.
+
+        :return: the state
+        :rtype: dict
+        """
+        ident = threading.get_ident()
+        if ident not in self._loading:
+            self._loading[ident] = dict()
+        return self._loading[ident]
+
+    @property
+    def _loader(self) -> Optional[Loader]:
+        """
+        Returns the current loader of the calling thread. Threads other than the
+        one that initialized the reader get their own instance of the custom loader.
+
+        :return: the loader
+        :rtype: Loader
+        """
+        state = self._loading_state()
+        if "loader" not in state:
+            state["loader"] = None
+            if self.use_custom_loader:
+                state["loader"] = from_commandline(self.custom_loader, classname="weka.core.converters.Loader")
+        return state["loader"]
+
+    @_loader.setter
+    def _loader(self, loader: Optional[Loader]):
+        """
+        Sets the current loader of the calling thread.
+
+        :param loader: the loader
+        :type loader: Loader
+        """
+        self._loading_state()["loader"] = loader
+
+    @property
+    def _loaders(self) -> Dict[str, Loader]:
+        """
+        Returns the auto-detected loaders (per file extension) of the calling thread.
+
+        :return: the loaders
+        :rtype: dict
+        """
+        state = self._loading_state()
+        if "loaders" not in state:
+            state["loaders"] = dict()
+        return state["loaders"]
+
+    @_loaders.setter
+    def _loaders(self, loaders: Dict[str, Loader]):
+        """
+        Sets the auto-detected loaders (per file extension) of the calling thread.
+
+        :param loaders: the loaders
+        :type loaders: dict
+        """
+        self._loading_state()["loaders"] = loaders
+
+    def _determine_loader(self, path: str):
+        """
+        Determines the loader to use for the specified file if not using a custom loader.
+        Loaders get reused for files with the same extension.
+
+        :param path: the file to get the loader for
+        :type path: str
+        """
+        if not self.use_custom_loader:
+            ext = os.path.splitext(strip_compression(path).lower())[1]
+            if ext not in self._loaders:
+                loader = loader_for_file(strip_compression(path))
+                if loader is None:
+                    raise Exception("Failed to determine loader for file: %s" % path)
+                self.logger().info("Auto-detected loader: %s" % to_commandline(loader))
+                self._loaders[ext] = loader
+            self._loader = self._loaders[ext]
+
+    def _rows_selected(self) -> bool:
+        """
+        Returns whether only a subset of the rows gets read.
+
+        :return: True if a row range or chunk was specified
+        :rtype: bool
+        """
+        return (self.row_range is not None) or (self.chunk is not None)
+
+    def _load_rows(self, path: str, incremental: bool) -> Instances:
+        """
+        Loads the selected rows from the specified file, using its row-offset index.
+
+        :param path: the file to load
+        :type path: str
+        :param incremental: whether to load the rows incrementally
+        :type incremental: bool
+        :return: the loaded data or the structure (if incremental)
+        :rtype: Instances
+        """
+        index = load_index(path)
+        if self.chunk is not None:
+            first, last = chunk_rows(index, *parse_shard(self.chunk))
+        else:
+            first, last = parse_row_range(self.row_range)
+        self.logger().info("Reading rows %d-%s" % (first + 1, "last" if last is None else str(last + 1)))
+        content = read_rows(path, index, first, last)
+        self._determine_loader(path)
+        self._loader.jobject.reset()
+        self._loader.jobject.setSource(JClass("java.io.ByteArrayInputStream")(content))
+        self._loader.incremental = incremental
+        if incremental:
+            self._loader.structure = Instances(self._loader.jobject.getStructure())
+            result = self._loader.structure
+        else:
+            result = Instances(self._loader.jobject.getDataSet())
+        self._fix_relation_name(result, path)
+        set_class_index(result, self.class_index)
+        return result
+
+    def _load_file(self, path: str, incremental: bool) -> Instances:
+        """
+        Loads the specified file with the current loader. Compressed files get
+        decompressed on the fly, with the loader reading the plain data from a stream.
+
+        :param path: the file to load
+        :type path: str
+        :param incremental: whether to load the file incrementally
+        :type incremental: bool
+        :return: the loaded data or the structure (if incremental)
+        :rtype: Instances
+        """
+        if detect_compression(path) is None:
+            return self._loader.load_file(path, incremental=incremental, class_index=self.class_index)
+
+        self.logger().info("Decompressing: %s" % path)
+        stream = DecompressingStream(path, threads=self.decompression_threads, logger=self.logger())
+        self._loader.jobject.reset()
+        self._loader.jobject.setSource(stream.open())
+        self._loader.incremental = incremental
+        if incremental:
+            # stream gets closed once all rows have been read
+            self._decompressing = stream
+            self._loader.structure = Instances(self._loader.jobject.getStructure())
+            result = self._loader.structure
+        else:
+            try:
+                result = Instances(self._loader.jobject.getDataSet())
+            except Exception:
+                close_after_error(stream, logger=self.logger())
+                raise
+            stream.close()
+        self._fix_relation_name(result, path)
+        set_class_index(result, self.class_index)
+        return result
+
+    def _fix_relation_name(self, data: Instances, path: str):
+        """
+        Loaders that read from a stream use 'stream' as relation name when they
+        would otherwise derive it from the file name. Uses the name of the
+        (uncompressed) file without extension in that case.
+
+        :param data: the data to update
+        :type data: Instances
+        :param path: the file the data was loaded from
+        :type path: str
+        """
+        if data.relationname == "stream":
+            data.relationname = os.path.splitext(os.path.basename(strip_compression(path)))[0]
+
+    def _close_decompressing(self):
+        """
+        Closes the stream of the compressed file that is being loaded incrementally, if any.
+        """
+        if self._decompressing is not None:
+            stream = self._decompressing
+            self._decompressing = None
+            stream.close()
+
+    def _load(self, path: str) -> Instances:
+        """
+        Loads the specified file in one go.
+
+        :param path: the file to load
+        :type path: str
+        :return: the loaded data
+        :rtype: Instances
+        """
+        if self._rows_selected():
+            return self._load_rows(path, False)
+        loader = self.custom_loader if self.use_custom_loader else None
+        if self._cache is not None:
+            result = self._cache.load(path, loader=loader)
+            if result is not None:
+                self.logger().info("Loaded from cache: %s" % path)
+                set_class_index(result, self.class_index)
+                return result
+        result = None
+        if self.fast_parse and not self.use_custom_loader:
+            result = fast_parse(path, logger=self.logger(), headers=self._headers)
+            if result is not None:
+                self.logger().info("Parsed with NumPy: %s" % path)
+                set_class_index(result, self.class_index)
+        if result is None:
+            self._determine_loader(path)
+            result = self._load_file(path, False)
+            if self._headers is not None:
+                result = self._share_header(result)
+        if self._cache is not None:
+            try:
+                self._cache.store(path, result, loader=loader)
+            except Exception as e:
+                self.logger().warning("Failed to cache dataset '%s': %s" % (path, str(e)))
+        return result
+
+    def _share_header(self, data: Instances) -> Instances:
+        """
+        Moves the rows of the dataset into a dataset that uses the attribute objects
+        of the first dataset loaded with an equal header. Datasets with string/relational
+        attributes get returned as is, as their values are stored in the attributes.
+
+        :param data: the loaded dataset
+        :type data: Instances
+        :return: the dataset sharing the header
+        :rtype: Instances
+        """
+        if len(non_numeric_attributes(data)) > 0:
+            return data
+        jdata = data.jobject
+        for header in self._loaded_headers:
+            if header.jobject.equalHeaders(jdata):
+                result = JClass("weka.core.Instances")(header.jobject, jdata.numInstances())
+                result.setRelationName(jdata.relationName())
+                result.setClassIndex(jdata.classIndex())
+                # internal values are compatible, as the nominal values are the same
+                result.addAll(jdata)
+                return Instances(result)
+        self._loaded_headers.append(Instances.template_instances(data, 0))
+        return data
+
+    def _load_chunks(self, structure: Instances, chunk_size: int) -> Iterable[Instances]:
+        """
+        Reads the rows from the incremental loader and combines them into datasets
+        with at most chunk_size rows each.
+
+        :param structure: the structure returned by the loader
+        :type structure: Instances
+        :param chunk_size: the maximum number of rows per dataset
+        :type chunk_size: int
+        :return: the datasets
+        :rtype: Iterable
+        """
+        # string/relational values only get stored in the structure, need to be transferred
+        non_numeric = non_numeric_attributes(structure)
+
+        # work with the Java objects directly to avoid the overhead of the wrappers
+        next_instance = self._loader.jobject.getNextInstance
+        jstructure = structure.jobject
+        chunk = None
+        count = 0
+        while True:
+            jinst = next_instance(jstructure)
+            if jinst is None:
+                break
+            if chunk is None:
+                if len(non_numeric) > 0:
+                    # the string/relational attributes must not be shared with the structure
+                    chunk = Instances(jstructure.stringFreeStructure())
+                else:
+                    chunk = Instances.template_instances(structure, chunk_size)
+                count = 0
+            transfer_values(jinst, chunk.jobject, non_numeric)
+            chunk.jobject.add(jinst)
+            count += 1
+            if count >= chunk_size:
+                yield chunk
+                chunk = None
+        if chunk is not None:
+            yield chunk
+
+    def _load_instances(self, structure: Instances) -> Iterable[Instance]:
+        """
+        Reads the rows from the incremental loader one by one. Since the loader only
+        stores the string/relational values of the current row in the structure, rows
+        with such attributes get their values transferred into a structure of their own,
+        as the next row is read before the current one gets forwarded. A fresh structure
+        gets used every DETACHED_ROWS_MAX rows, i.e., the values of rows that are no
+        longer referenced downstream can get garbage collected.
+
+        :param structure: the structure returned by the loader
+        :type structure: Instances
+        :return: the rows
+        :rtype: Iterable
+        """
+        non_numeric = non_numeric_attributes(structure)
+        if len(non_numeric) == 0:
+            yield from self._loader
+            return
+
+        next_instance = self._loader.jobject.getNextInstance
+        jstructure = structure.jobject
+        jdata = None
+        count = 0
+        while True:
+            jinst = next_instance(jstructure)
+            if jinst is None:
+                break
+            if count % DETACHED_ROWS_MAX == 0:
+                jdata = jstructure.stringFreeStructure()
+            count += 1
+            transfer_values(jinst, jdata, non_numeric)
+            jinst.setDataset(jdata)
+            yield Instance(jinst)
+
+    def _exceeds_heap(self, path: str) -> bool:
+        """
+        Checks whether the data of the file is predicted to use more than the
+        allowed fraction of the free heap, if it can get loaded incrementally.
+
+        :param path: the file to check
+        :type path: str
+        :return: True if the file should get loaded in chunks
+        :rtype: bool
+        """
+        if self.heap_fraction <= 0:
+            return False
+        predicted = predicted_memory(path)
+        free = free_heap()
+        if predicted <= self.heap_fraction * free:
+            return False
+        self._determine_loader(path)
+        if not isinstance(self._loader.jobject, JClass("weka.core.converters.IncrementalConverter")):
+            self.logger().warning("Loader does not support incremental loading, loading in one go: %s" % path)
+            return False
+        self.logger().warning("Predicted memory of %dMB exceeds %.0f%% of the free heap (%dMB), loading in chunks: %s"
+                              % (predicted // 1024 // 1024, self.heap_fraction * 100, free // 1024 // 1024, path))
+        return True
+
+    def _read_incremental(self, path: str, chunk_size: int) -> Iterable:
+        """
+        Loads the file incrementally and returns the rows or chunks of rows one by one.
+
+        :param path: the file to load
+        :type path: str
+        :param chunk_size: the number of rows to combine into a dataset, <1 for single rows
+        :type chunk_size: int
+        :return: the rows/datasets
+        :rtype: Iterable
+        """
+        if self._rows_selected():
+            structure = self._load_rows(path, True)
+        else:
+            self._determine_loader(path)
+            structure = self._load_file(path, True)
+        # look ahead to let downstream plugins know when the last item of the file is forwarded
+        if chunk_size > 0:
+            items = LookAheadIterator(self._load_chunks(structure, chunk_size))
+        else:
+            items = LookAheadIterator(self._load_instances(structure))
+        for item in items:
+            mark_end_of_input(self.session, not items.has_next())
+            yield item
+        self._close_decompressing()
+
+    def _locate_inputs(self) -> LookAheadIterator:
+        """
+        Determines the files to process.
+
+        :return: the files
+        :rtype: LookAheadIterator
+        """
+        if self.lazy:
+            result = iterate_files(self.source, input_lists=self.source_list, fail_if_empty=True,
+                                   resume_from=self.resume_from, logger=self.logger())
+        else:
+            result = locate_files(self.source, input_lists=self.source_list, fail_if_empty=True, resume_from=self.resume_from)
+        if self.shard is not None:
+            index, num = parse_shard(self.shard)
+            self.logger().info("Processing shard %d/%d (%s)" % (index, num, self.shard_mode))
+            result = shard_files(result, index, num, mode=self.shard_mode)
+        if self._journal is not None:
+            result = self._skip_completed(result)
+        return LookAheadIterator(result)
+
+    def _skip_completed(self, files: Iterable[str]) -> Iterable[str]:
+        """
+        Skips the files that have been recorded in the journal already.
+
+        :param files: the files to check
+        :type files: Iterable
+        :return: the files that still need processing
+        :rtype: Iterable
+        """
+        for f in files:
+            if self._journal.is_completed(f):
+                self.logger().debug("Already completed: %s" % f)
+                self._journal_skipped += 1
+                continue
+            yield f
+
+    def _completed(self):
+        """
+        Records the current input as completed in the journal (if any), once
+        the writer has written its data. Since read() only continues once the
+        downstream plugins have processed the data, they have received all of it.
+        """
+        if self._journal is not None:
+            complete_input(self.session, functools.partial(self._journal.add, self._current_input))
 
     def read(self) -> Iterable:
         """
@@ -136,22 +705,39 @@ class LoadData(Reader, PlaceholderSupporter):
         :rtype: Iterable
         """
         if self._inputs is None:
-            self._inputs = locate_files(self.source, input_lists=self.source_list, fail_if_empty=True, resume_from=self.resume_from)
-        self._current_input = self._inputs.pop(0)
+            self._inputs = self._locate_inputs()
+            if (self.prefetch > 0) and not self.incremental:
+                self.logger().info("Prefetching %d file(s) in the background" % self.prefetch)
+                self._prefetcher = Prefetcher(self._inputs, self._load, self.prefetch,
+                                              max_memory=self.prefetch_memory * 1024 * 1024, logger=self.logger())
+                self._prefetcher.start()
+
+        # (already) loaded in the background?
+        if self._prefetcher is not None:
+            item = self._prefetcher.next()
+            if item is not None:
+                self._current_input, data = item
+                self.session.current_input = self._current_input
+                self.logger().info("Reading from: " + str(self.session.current_input))
+                mark_end_of_input(self.session, True)
+                yield data
+                self._completed()
+            return
+
+        if not self._inputs.has_next():
+            return
+        self._current_input = next(self._inputs)
         self.session.current_input = self._current_input
         self.logger().info("Reading from: " + str(self.session.current_input))
-        if not self.use_custom_loader:
-            self._loader = loader_for_file(self._current_input)
-            if self._loader is None:
-                raise Exception("Failed to determine loader for file: %s" % self._current_input)
-            self.logger().info("Auto-detected loader: %s" % to_commandline(self._loader))
         if self.incremental:
-            self._loader.load_file(self._current_input, incremental=True, class_index=self.class_index)
-            for inst in self._loader:
-                yield inst
+            yield from self._read_incremental(self._current_input, self.chunk_size)
+        elif self._exceeds_heap(self._current_input):
+            yield from self._read_incremental(self._current_input, self.chunk_size if (self.chunk_size > 0) else HEAP_CHUNK_SIZE_DEFAULT)
         else:
-            data = self._loader.load_file(self._current_input, incremental=False, class_index=self.class_index)
+            data = self._load(self._current_input)
+            mark_end_of_input(self.session, True)
             yield data
+        self._completed()
 
     def has_finished(self) -> bool:
         """
@@ -160,4 +746,28 @@ class LoadData(Reader, PlaceholderSupporter):
         :return: True if finished
         :rtype: bool
         """
-        return (self._inputs is not None) and len(self._inputs) == 0
+        if self._prefetcher is not None:
+            return self._prefetcher.finished
+        return (self._inputs is not None) and not self._inputs.has_next()
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        if self._prefetcher is not None:
+            self._prefetcher.stop()
+            self._prefetcher = None
+        self._close_decompressing()
+        clear_end_of_input(self.session)
+        if self._journal is not None:
+            self.logger().info("Files skipped based on journal: %d" % self._journal_skipped)
+            self._journal.close()
+            self._journal = None
+        if self._cache is not None:
+            self.logger().info("Dataset cache: %s" % self._cache.statistics())
+            self._cache = None
+        if self._headers is not None:
+            self.logger().info("Distinct headers: %d" % (len(self._headers) + len(self._loaded_headers)))
+        self._loaded_headers = []
+        self._loading = dict()
+        super().finalize()
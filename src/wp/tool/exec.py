@@ -1,11 +1,18 @@
 import argparse
 import logging
+import multiprocessing
+import threading
 import traceback
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
 
 from wp.core import ENV_WP_LOGLEVEL
+from wp.api import clear_object_cache, object_cache_statistics, Manifest, file_stats
 from wp.registry import available_generators
-from wp.tool.run import main_no_jvm as run_main_no_jvm, RUN
+from wp.tool.run import main_no_jvm as run_main_no_jvm, pipeline_files, RUN
 from kasperl.api import perform_pipeline_execution, CommandlineParameter, perform_conversion
+from seppl.placeholders import load_user_defined_placeholders
+from wai.logging import init_logging, set_logging_level
 
 import weka.core.jvm as jvm
 
@@ -13,6 +20,13 @@ EXEC = "wp-exec"
 
 _logger = logging.getLogger(EXEC)
 
+WORKER_TYPE_PROCESS = "process"
+WORKER_TYPE_THREAD = "thread"
+WORKER_TYPES = [
+    WORKER_TYPE_PROCESS,
+    WORKER_TYPE_THREAD,
+]
+
 
 def start_jvm(parsed: argparse.Namespace):
     """
@@ -37,10 +51,219 @@ def stop_jvm(parsed: argparse.Namespace):
     :param parsed: the parsed options
     :type parsed: argparse.Namespace
     """
+    _logger.info("Deserialized objects cache: %s" % object_cache_statistics())
+    clear_object_cache()
     _logger.info("Stopping JVM")
     jvm.stop()
 
 
+def _start_worker(parsed: argparse.Namespace):
+    """
+    Initializes a worker process: logging, custom placeholders and the JVM,
+    which gets reused for all the pipelines that the worker executes.
+
+    :param parsed: the parsed options
+    :type parsed: argparse.Namespace
+    """
+    init_logging(env_var=ENV_WP_LOGLEVEL)
+    set_logging_level(_logger, parsed.logging_level)
+    if parsed.exec_placeholders is not None:
+        load_user_defined_placeholders(parsed.exec_placeholders)
+    start_jvm(parsed)
+
+
+def _execute(pipeline: List[str]) -> Optional[str]:
+    """
+    Executes the pipeline, either directly or in a worker.
+
+    :param pipeline: the pipeline arguments
+    :type pipeline: list
+    :return: None if successful, otherwise the error message
+    :rtype: str
+    """
+    try:
+        run_main_no_jvm(pipeline)
+        return None
+    except SystemExit as e:
+        # wp-run exits with a non-zero code when the pipeline cannot be parsed or fails
+        if (e.code is None) or (e.code == 0):
+            return None
+        return "Exit code: %s" % str(e.code)
+    except Exception as e:
+        traceback.print_exc()
+        return str(e)
+
+
+class _PipelineExecutor:
+    """
+    Executes the expanded pipelines either one after the other or concurrently
+    with a pool of workers. Worker processes start their own JVM once and reuse
+    it for all the pipelines they execute, worker threads share the JVM of wp-exec
+    (requires the plugins in the pipeline to be thread-safe).
+    With a manifest, pipelines that were executed successfully before, whose
+    inputs have not changed and whose outputs still exist, get skipped.
+    """
+
+    def __init__(self):
+        """
+        Initializes the executor.
+        """
+        self._parsed: Optional[argparse.Namespace] = None
+        self._pool: Optional[Executor] = None
+        self._manifest: Optional[Manifest] = None
+        self._lock = threading.Lock()
+        self._submitted = 0
+        self._completed = 0
+        self._skipped = 0
+        self._failed = []
+
+    def _uses_processes(self) -> bool:
+        """
+        Returns whether the pipelines get executed in worker processes.
+
+        :return: True if worker processes
+        :rtype: bool
+        """
+        return (self._parsed.exec_workers > 1) and (self._parsed.exec_worker_type == WORKER_TYPE_PROCESS)
+
+    def start(self, parsed: argparse.Namespace):
+        """
+        Starts the JVM and/or the workers.
+
+        :param parsed: the parsed options
+        :type parsed: argparse.Namespace
+        """
+        self._parsed = parsed
+        self._submitted = 0
+        self._completed = 0
+        self._skipped = 0
+        self._failed = []
+        if parsed.exec_manifest is not None:
+            self._manifest = Manifest(parsed.exec_manifest)
+            _logger.info("Read %d pipeline(s) from manifest: %s" % (self._manifest.open(), parsed.exec_manifest))
+        if not self._uses_processes():
+            start_jvm(parsed)
+        if parsed.exec_workers > 1:
+            _logger.info("Executing pipelines using %d worker %s(s)" % (parsed.exec_workers, parsed.exec_worker_type))
+            if self._uses_processes():
+                # a forked JVM is not usable, hence new processes
+                self._pool = ProcessPoolExecutor(max_workers=parsed.exec_workers,
+                                                 mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_start_worker, initargs=(parsed,))
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=parsed.exec_workers, thread_name_prefix="exec")
+
+    def _files(self, pipeline: List[str]) -> Tuple[Dict, List[str]]:
+        """
+        Determines the stats of the inputs and the outputs of the pipeline for the manifest.
+
+        :param pipeline: the pipeline arguments
+        :type pipeline: list
+        :return: the tuple of input stats and output files
+        :rtype: tuple
+        """
+        try:
+            inputs, outputs = pipeline_files(pipeline)
+        except (Exception, SystemExit):
+            # invalid pipeline, fails when executing it
+            inputs, outputs = [], []
+        return file_stats(inputs), outputs
+
+    def _record(self, pipeline: List[str], files: Optional[Tuple[Dict, List[str]]], success: bool):
+        """
+        Records the execution of the pipeline in the manifest, if any.
+
+        :param pipeline: the pipeline that was executed
+        :type pipeline: list
+        :param files: the input stats and output files of the pipeline
+        :type files: tuple
+        :param success: whether the execution succeeded
+        :type success: bool
+        """
+        if (self._manifest is not None) and (files is not None):
+            self._manifest.record(pipeline, files[0], files[1], success)
+
+    def _done(self, pipeline: List[str], files: Optional[Tuple[Dict, List[str]]], future: Future):
+        """
+        Records the outcome of the execution in a worker.
+
+        :param pipeline: the pipeline that was executed
+        :type pipeline: list
+        :param files: the input stats and output files of the pipeline
+        :type files: tuple
+        :param future: the finished execution
+        :type future: Future
+        """
+        try:
+            error = future.result()
+        except BaseException as e:
+            error = str(e)
+        self._finished(pipeline, files, error)
+
+    def _finished(self, pipeline: List[str], files: Optional[Tuple[Dict, List[str]]], error: Optional[str]):
+        """
+        Records the outcome of the execution and logs the progress.
+
+        :param pipeline: the pipeline that was executed
+        :type pipeline: list
+        :param files: the input stats and output files of the pipeline
+        :type files: tuple
+        :param error: the error message, None if successful
+        :type error: str
+        """
+        with self._lock:
+            self._completed += 1
+            self._record(pipeline, files, error is None)
+            if error is not None:
+                self._failed.append(pipeline)
+                _logger.error("Failed to execute pipeline %s: %s" % (str(pipeline), error))
+            _logger.info("Progress: %d/%d pipeline(s) completed, %d failed" % (self._completed, self._submitted, len(self._failed)))
+
+    def execute(self, pipeline: List[str]):
+        """
+        Executes the pipeline, either directly or by handing it to the workers.
+
+        :param pipeline: the pipeline arguments
+        :type pipeline: list
+        """
+        files = None
+        if self._manifest is not None:
+            files = self._files(pipeline)
+            if self._manifest.is_up_to_date(pipeline, files[0], files[1]):
+                _logger.info("Skipping up-to-date pipeline: %s" % str(pipeline))
+                self._skipped += 1
+                return
+        with self._lock:
+            self._submitted += 1
+        if self._pool is None:
+            self._finished(pipeline, files, _execute(pipeline))
+            return
+        future = self._pool.submit(_execute, pipeline)
+        future.add_done_callback(lambda f: self._done(pipeline, files, f))
+
+    def finish(self, parsed: argparse.Namespace):
+        """
+        Waits for the workers to finish and stops the JVM.
+
+        :param parsed: the parsed options
+        :type parsed: argparse.Namespace
+        """
+        if self._pool is not None:
+            pool = self._pool
+            self._pool = None
+            pool.shutdown(wait=True)
+        if self._manifest is not None:
+            manifest = self._manifest
+            self._manifest = None
+            manifest.close()
+            _logger.info("Skipped %d up-to-date pipeline(s)" % self._skipped)
+        if not self._uses_processes():
+            stop_jvm(parsed)
+        if len(self._failed) > 0:
+            raise Exception("Failed to execute %d of %d pipeline(s):\n%s"
+                            % (len(self._failed), self._submitted, "\n".join(str(x) for x in self._failed)))
+
+
 def main(args=None):
     """
     The main method for parsing command-line arguments.
@@ -78,11 +301,36 @@ def main(args=None):
             type=str,
             help="The maximum amount of heap space to allow, e.g., 256m or 2g.",
         ),
+        CommandlineParameter(
+            long_opt="--exec_manifest",
+            metavar="FILE",
+            required=False,
+            default=None,
+            type=str,
+            help="The manifest file for recording the executed pipelines (hash of the pipeline, size/modification time of the inputs, outputs, success); pipelines that were executed successfully before, whose inputs have not changed and whose outputs still exist, get skipped; failed pipelines (initialization, processing or finalization errors) get recorded as failed and executed again. Inputs and outputs are determined from the options of the plugins (e.g., input files of load-data, output file of save-data).",
+        ),
+        CommandlineParameter(
+            long_opt="--exec_workers",
+            metavar="NUM",
+            required=False,
+            default=1,
+            type=int,
+            help="The number of pipelines to execute concurrently; failures get reported per pipeline.",
+        ),
+        CommandlineParameter(
+            long_opt="--exec_worker_type",
+            required=False,
+            default=WORKER_TYPE_PROCESS,
+            type=str,
+            choices=WORKER_TYPES,
+            help="The type of worker to use when executing pipelines concurrently; each worker process starts its own JVM once and reuses it, worker threads share a single JVM and require thread-safe plugins.",
+        ),
     ]
 
+    executor = _PipelineExecutor()
     perform_pipeline_execution(ENV_WP_LOGLEVEL, args, EXEC, None,
-                               RUN, run_main_no_jvm, available_generators(), _logger,
-                               additional_params=params, pre_exec=start_jvm, post_exec=stop_jvm)
+                               RUN, executor.execute, available_generators(), _logger,
+                               additional_params=params, pre_exec=executor.start, post_exec=executor.finish)
 
 
 def sys_main() -> int:
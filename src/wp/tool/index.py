@@ -0,0 +1,73 @@
+import argparse
+import logging
+import sys
+import traceback
+from typing import List
+
+from seppl.io import locate_files
+from wai.logging import init_logging, set_logging_level, add_logging_level
+from wp.core import ENV_WP_LOGLEVEL
+from wp.api import build_index, save_index, index_path, INDEX_EVERY_DEFAULT, INDEX_FORMATS
+
+INDEX = "wp-index"
+
+_logger = logging.getLogger(INDEX)
+
+
+def create_index(inputs: List[str], every: int = INDEX_EVERY_DEFAULT, fmt: str = None):
+    """
+    Builds the row-offset index for the files and stores them next to them.
+
+    :param inputs: the ARFF/CSV files to index (glob syntax supported)
+    :type inputs: list
+    :param every: the number of rows between offsets
+    :type every: int
+    :param fmt: the format of the files (see INDEX_FORMATS), determined from the extension if None
+    :type fmt: str
+    """
+    for path in locate_files(inputs, fail_if_empty=True):
+        _logger.info("Indexing: %s" % path)
+        index = build_index(path, every=every, fmt=fmt)
+        save_index(index, path)
+        _logger.info("Rows: %d, offsets: %d -> %s" % (index["num_rows"], len(index["offsets"]), index_path(path)))
+
+
+def main(args=None):
+    """
+    The main method for parsing command-line arguments.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    """
+    init_logging(env_var=ENV_WP_LOGLEVEL)
+    parser = argparse.ArgumentParser(
+        description="Tool for building row-offset indices for ARFF/CSV files, which allow load-data to read specific rows or chunks of the files. The index gets stored next to the data file with extension .idx.",
+        prog=INDEX,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-i", "--input", metavar="FILE", help="The ARFF/CSV file(s) to index; glob syntax is supported", type=str, required=True, nargs="+")
+    parser.add_argument("-e", "--every", metavar="NUM", help="The number of rows between the recorded offsets", type=int, default=INDEX_EVERY_DEFAULT, required=False)
+    parser.add_argument("-f", "--format", choices=INDEX_FORMATS, help="The format of the files, determined from the extension if not supplied", default=None, required=False)
+    add_logging_level(parser)
+    parsed = parser.parse_args(args=args)
+    set_logging_level(_logger, parsed.logging_level)
+    create_index(parsed.input, every=parsed.every, fmt=parsed.format)
+
+
+def sys_main() -> int:
+    """
+    Runs the main function using the system cli arguments, and
+    returns a system error code.
+
+    :return: 0 for success, 1 for failure.
+    """
+    try:
+        main()
+        return 0
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(sys.argv[1:]), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    main()
@@ -1,33 +1,66 @@
+import logging
+import sys
 import traceback
-from typing import List
+from typing import List, Optional, Tuple
 
+from wai.logging import init_logging
 from wp.core import ENV_WP_LOGLEVEL
+from wp.api import auto_heap_size, add_jvm_options, iterate_files, HeapMonitor, Profiler, execute_pipeline, ROLE_READER, ROLE_FILTER, ROLE_WRITER
+from wp.filter import FilterData
 from wp.help import generate_plugin_usage
 from wp.registry import available_readers, available_filters, available_writers, REGISTRY
 from seppl import Session
-from kasperl.api import perform_conversion, CommandlineParameter
+from seppl.io import MultiFilter
+from seppl.placeholders import expand_placeholders
+from kasperl.api import parse_conversion_args, print_conversion_usage, CommandlineParameter
 
 import weka.core.jvm as jvm
+from weka.core.classes import join_options
+from weka.core.dataset import Instances
 
 
 RUN = "wp-run"
 DESCRIPTION = "Tool for running Weka pipelines."
 
+STORAGE_HEAP_MONITOR = "wp.heap_monitor"
 
-def start_jvm(session: Session):
+STORAGE_PROFILER = "wp.profiler"
+
+
+def start_jvm(session: Session, inputs: List[str] = None, input_lists: List[str] = None):
     """
     Starts the jvm.
 
     :param session: the current session object
     :type session: Session
+    :param inputs: the input files/glob patterns of the pipeline, used for sizing the heap automatically
+    :type inputs: list
+    :param input_lists: the text files listing input files, used for sizing the heap automatically
+    :type input_lists: list
     """
+    max_heap = session.options.max_heap
+    if (max_heap is None) and session.options.auto_heap:
+        # same file resolution as the reader
+        files = []
+        if (inputs is not None) or (input_lists is not None):
+            files = list(iterate_files(inputs, input_lists=input_lists, logger=session.logger))
+        if len(files) == 0:
+            session.logger.warning("No input files found for determining the heap size automatically!")
+        max_heap = auto_heap_size(files, logger=session.logger)
+    if session.options.jvm_options is not None:
+        session.logger.info("JVM options: %s" % session.options.jvm_options)
+        add_jvm_options(session.options.jvm_options)
     session.logger.info("Starting JVM")
     jvm.start(
         class_path=session.options.classpath,
         system_cp=session.options.system_classpath,
-        max_heap_size=session.options.max_heap,
+        max_heap_size=max_heap,
         packages=session.options.packages,
     )
+    if (session.options.heap_monitor is not None) and (session.options.heap_monitor > 0):
+        monitor = HeapMonitor(session.options.heap_monitor, logger=session.logger)
+        monitor.start()
+        session.storage[STORAGE_HEAP_MONITOR] = monitor
 
 
 def stop_jvm(session: Session):
@@ -37,6 +70,9 @@ def stop_jvm(session: Session):
     :param session: the current session object
     :type session: Session
     """
+    monitor = session.storage.pop(STORAGE_HEAP_MONITOR, None)
+    if monitor is not None:
+        monitor.stop()
     session.logger.info("Stopping JVM")
     jvm.stop()
 
@@ -82,25 +118,351 @@ def additional_params() -> List[CommandlineParameter]:
             type=str,
             help="The maximum amount of heap space to allow, e.g., 256m or 2g.",
         ),
+        CommandlineParameter(
+            long_opt="--auto_heap",
+            required=False,
+            action="store_true",
+            help="Whether to determine the maximum heap size from the size of the largest input file and the available RAM; ignored if a maximum heap size is specified.",
+        ),
+        CommandlineParameter(
+            long_opt="--jvm_options",
+            metavar="OPTIONS",
+            required=False,
+            default=None,
+            type=str,
+            help="Additional options for the JVM, e.g., for the garbage collector or -XX flags (e.g., \"-XX:+UseG1GC -Xss4m\"; use --jvm_options=OPTION for a single option); passed on via the JAVA_TOOL_OPTIONS environment variable.",
+        ),
+        CommandlineParameter(
+            long_opt="--heap_monitor",
+            metavar="SEC",
+            required=False,
+            default=None,
+            type=float,
+            help="The interval in seconds for logging the heap usage, warning when the usage exceeds 90 percent of the maximum heap; turned off if not supplied.",
+        ),
+        CommandlineParameter(
+            long_opt="--profile",
+            metavar="FILE",
+            required=False,
+            default=None,
+            type=str,
+            help="The JSON file to write the profile of the pipeline to (wall time, calls, records in/out, bytes read/written, JVM vs Python time and heap per plugin); the timeline in Chrome trace format gets written alongside, using the extension .trace.json (view with https://ui.perfetto.dev); turned off if not supplied.",
+        ),
+        CommandlineParameter(
+            long_opt="--no_filter_fusion",
+            required=False,
+            action="store_true",
+            help="Whether to turn off fusing adjacent filter-data stages into a single stage using weka.filters.MultiFilter.",
+        ),
+        CommandlineParameter(
+            long_opt="--server",
+            metavar="SOCKET",
+            required=False,
+            default=None,
+            type=str,
+            help="The Unix socket of the wp-serve server to execute the pipeline with (avoids starting the JVM); executes the pipeline locally if no server is running.",
+        ),
     ]
 
 
-def main(args=None):
-    perform_conversion(
-        ENV_WP_LOGLEVEL, args, RUN, DESCRIPTION,
+class _FusedFilterData(FilterData):
+    """
+    The filter-data stage that replaces several fused ones. Removes the suffix that
+    the MultiFilter adds to the relation name, i.e., the output is identical to
+    the one of the individual stages.
+    """
+
+    def _fix_relation_names(self, items: List) -> List:
+        """
+        Removes the MultiFilter suffix from the relation names.
+
+        :param items: the filtered Instances/Instance objects
+        :type items: list
+        :return: the updated items
+        :rtype: list
+        """
+        suffix = "-" + self._filter.classname + "".join([x.strip() for x in self._filter.options])
+        for item in items:
+            data = item if isinstance(item, Instances) else item.dataset
+            if data.relationname.endswith(suffix):
+                data.relationname = data.relationname[:-len(suffix)]
+        return items
+
+    def _filter_items(self, data: List) -> List:
+        """
+        Filters the items individually.
+
+        :param data: the Instances/Instance objects to filter
+        :type data: list
+        :return: the filtered items
+        :rtype: list
+        """
+        return self._fix_relation_names(super()._filter_items(data))
+
+    def _flush(self) -> List:
+        """
+        Filters the buffered rows in one go.
+
+        :return: the filtered rows, in the same order
+        :rtype: list
+        """
+        return self._fix_relation_names(super()._flush())
+
+
+# the filter-data settings that fused stages must share (and the fused stage inherits)
+FUSION_SETTINGS = [
+    "always_initialize",
+    "initialize_on_change",
+    "batch_rows",
+    "max_latency_ms",
+    "threads",
+    "filter_cache",
+    "filter_cache_max_size",
+    "header_from",
+    "header_class_index",
+]
+
+
+def _fusion_key(filter_):
+    """
+    Returns the key for grouping the filter with adjacent ones, i.e., only filter-data
+    stages that use a plain filter command-line and the same settings can be fused.
+
+    :param filter_: the filter to check
+    :return: the key, None if the filter cannot be fused
+    :rtype: tuple
+    """
+    if not isinstance(filter_, FilterData) or filter_.skip:
+        return None
+    if (filter_.filter_cmdln is None) or (filter_.load_from is not None) or (filter_.save_to is not None):
+        return None
+    return tuple(getattr(filter_, x) for x in FUSION_SETTINGS)
+
+
+def fuse_filters(filters: List, session: Session) -> List:
+    """
+    Fuses adjacent filter-data stages into a single one that uses weka.filters.MultiFilter,
+    which avoids transferring the data between the JVM and Python for each stage.
+    Requires the JVM to be running.
+
+    :param filters: the filters of the pipeline
+    :type filters: list
+    :param session: the current session object
+    :type session: Session
+    :return: the updated list of filters
+    :rtype: list
+    """
+    groups = []
+    last_key = None
+    for filter_ in filters:
+        key = _fusion_key(filter_)
+        if (key is not None) and (key == last_key):
+            groups[-1].append(filter_)
+        else:
+            groups.append([filter_])
+        last_key = key
+
+    result = []
+    for group in groups:
+        if len(group) == 1:
+            result.append(group[0])
+            continue
+        options = []
+        for filter_ in group:
+            options.extend(["-F", filter_.filter_cmdln])
+        settings = dict((x, getattr(group[0], x)) for x in FUSION_SETTINGS)
+        fused = _FusedFilterData(filter_cmdln="weka.filters.MultiFilter " + join_options(options),
+                                 logger_name=group[0].logger_name, logging_level=group[0].logging_level, **settings)
+        fused.session = session
+        session.logger.info("Fused %d filter-data stages: %s" % (len(group), " | ".join([x.filter_cmdln for x in group])))
+        result.append(fused)
+    return result
+
+
+INPUT_OPTIONS = ["source", "source_list", "load_from", "header_from"]
+""" the attributes of plugins that contain input files. """
+
+OUTPUT_OPTIONS = ["output_file", "save_to"]
+""" the attributes of plugins that contain output files. """
+
+
+def pipeline_files(args: List[str]) -> Tuple[List[str], List[str]]:
+    """
+    Determines the input and output files declared in the options of the pipeline's
+    plugins (e.g., the input of load-data or the output file of save-data), without
+    executing it. Files that still contain placeholders that can only get expanded
+    during the execution (e.g., input-based ones) get skipped.
+
+    :param args: the pipeline arguments
+    :type args: list
+    :return: the tuple of input files/glob patterns and output files
+    :rtype: tuple
+    """
+    reader, filter_, writer, session = parse_conversion_args(
+        args, RUN, DESCRIPTION,
         available_readers(), available_filters(), available_writers(),
         aliases=REGISTRY.all_aliases, require_reader=True, require_writer=False,
-        generate_plugin_usage=generate_plugin_usage, additional_params=additional_params(),
-        pre_initialize=start_jvm, post_finalize=stop_jvm)
+        generate_plugin_usage=generate_plugin_usage, additional_params=additional_params())
+    plugins = [reader]
+    if isinstance(filter_, MultiFilter):
+        plugins.extend(filter_.filters)
+    elif filter_ is not None:
+        plugins.append(filter_)
+    if writer is not None:
+        plugins.append(writer)
+    return _plugin_files(plugins, INPUT_OPTIONS), _plugin_files(plugins, OUTPUT_OPTIONS)
+
+
+def _plugin_files(plugins: List, names: List[str]) -> List[str]:
+    """
+    Collects the files from the specified attributes of the plugins, skipping
+    the ones with placeholders that can only get expanded during execution.
+
+    :param plugins: the plugins to collect the files from
+    :type plugins: list
+    :param names: the names of the attributes
+    :type names: list
+    :return: the files/glob patterns
+    :rtype: list
+    """
+    result = []
+    for plugin in plugins:
+        for name in names:
+            value = getattr(plugin, name, None)
+            if value is None:
+                continue
+            for path in (value if isinstance(value, list) else [value]):
+                path = expand_placeholders(path)
+                if "{" not in path:
+                    result.append(path)
+    return result
+
+
+def start_profiler(reader, filter_, writer, session: Session):
+    """
+    Instruments the plugins of the pipeline and starts the profiler.
+    Needs to get called after the filters have been fused.
+
+    :param reader: the reader of the pipeline
+    :param filter_: the filter(s) of the pipeline, can be None
+    :param writer: the writer of the pipeline, can be None
+    :param session: the current session object
+    :type session: Session
+    """
+    profiler = Profiler(logger=session.logger)
+    profiler.instrument(reader, ROLE_READER)
+    if isinstance(filter_, MultiFilter):
+        for f in filter_.filters:
+            profiler.instrument(f, ROLE_FILTER)
+    elif filter_ is not None:
+        profiler.instrument(filter_, ROLE_FILTER)
+    if writer is not None:
+        profiler.instrument(writer, ROLE_WRITER)
+    profiler.start()
+    session.storage[STORAGE_PROFILER] = profiler
+
+
+def stop_profiler(session: Session):
+    """
+    Stops the profiler (if any) and writes the profile to disk.
+
+    :param session: the current session object
+    :type session: Session
+    """
+    profiler = session.storage.pop(STORAGE_PROFILER, None)
+    if profiler is None:
+        return
+    profiler.stop()
+    profiler.write(session.options.profile)
+
+
+def _perform_conversion(args: List[str], start_stop_jvm: bool):
+    """
+    Parses the command-line arguments and executes the pipeline.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    :param start_stop_jvm: whether to start/stop the JVM
+    :type start_stop_jvm: bool
+    """
+    init_logging(env_var=ENV_WP_LOGLEVEL)
+    _args = sys.argv[1:] if (args is None) else args
+    try:
+        reader, filter_, writer, session = parse_conversion_args(
+            _args, RUN, DESCRIPTION,
+            available_readers(), available_filters(), available_writers(),
+            aliases=REGISTRY.all_aliases, require_reader=True, require_writer=False,
+            generate_plugin_usage=generate_plugin_usage, additional_params=additional_params())
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(_args), file=sys.stderr)
+        print_conversion_usage(
+            RUN, DESCRIPTION,
+            available_readers(), available_filters(), available_writers(),
+            generate_plugin_usage=generate_plugin_usage)
+        sys.exit(1)
+    session.logger.info("options: %s" % str(_args))
+
+    def pre_initialize(s: Session):
+        if start_stop_jvm:
+            start_jvm(s, inputs=_plugin_files([reader], ["source"]), input_lists=_plugin_files([reader], ["source_list"]))
+        # the filters get initialized after this method, i.e., they can still be swapped
+        if isinstance(filter_, MultiFilter) and not s.options.no_filter_fusion:
+            filter_.filters = fuse_filters(filter_.filters, s)
+        if s.options.profile is not None:
+            start_profiler(reader, filter_, writer, s)
+
+    def post_finalize(s: Session):
+        stop_profiler(s)
+        if start_stop_jvm:
+            stop_jvm(s)
+
+    # unlike parsing errors, failures of the pipeline itself don't warrant the help screen
+    try:
+        execute_pipeline(reader, filter_, writer, session,
+                         pre_initialize=pre_initialize, post_finalize=post_finalize)
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(_args), file=sys.stderr)
+        sys.exit(1)
+
+
+def _server_socket(args: List[str]) -> Optional[str]:
+    """
+    Returns the socket of the server to execute the pipeline with.
+
+    :param args: the commandline arguments
+    :type args: list
+    :return: the socket, None if not specified
+    :rtype: str
+    """
+    for i, arg in enumerate(args):
+        if arg == "--":
+            break
+        if (arg == "--server") and (i < len(args) - 1):
+            return args[i + 1]
+        if arg.startswith("--server="):
+            return arg[len("--server="):]
+    return None
+
+
+def main(args=None):
+    _args = sys.argv[1:] if (args is None) else args
+    server = _server_socket(_args)
+    if server is not None:
+        from wp.tool.serve import run_on_server
+        exit_code = run_on_server(server, _args)
+        if exit_code is not None:
+            if exit_code != 0:
+                sys.exit(exit_code)
+            return
+        init_logging(env_var=ENV_WP_LOGLEVEL)
+        logging.getLogger(RUN).info("No server running at '%s', executing pipeline locally" % server)
+    _perform_conversion(args, True)
 
 
 def main_no_jvm(args=None):
-    perform_conversion(
-        ENV_WP_LOGLEVEL, args, RUN, DESCRIPTION,
-        available_readers(), available_filters(), available_writers(),
-        aliases=REGISTRY.all_aliases, require_reader=True, require_writer=False,
-        generate_plugin_usage=generate_plugin_usage, additional_params=additional_params(),
-        pre_initialize=None, post_finalize=None)
+    _perform_conversion(args, False)
 
 
 def sys_main() -> int:
@@ -0,0 +1,376 @@
+import argparse
+import json
+import logging
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from typing import List, Optional
+
+from wai.logging import init_logging, set_logging_level, add_logging_level
+from wp.core import ENV_WP_LOGLEVEL
+from wp.registry import available_readers, available_filters, available_writers
+from wp.tool.run import main_no_jvm as run_main_no_jvm
+
+import weka.core.jvm as jvm
+
+SERVE = "wp-serve"
+
+_logger = logging.getLogger(SERVE)
+
+KEY_ARGS = "args"
+KEY_CWD = "cwd"
+KEY_STREAM = "stream"
+KEY_TEXT = "text"
+KEY_EXIT_CODE = "exit_code"
+
+STREAM_STDOUT = "stdout"
+STREAM_STDERR = "stderr"
+
+# the client of the job that the current thread executes
+_local = threading.local()
+
+# the attribute of threads started by jobs that stores the client of the job
+ATTR_CLIENT = "_wp_serve_client"
+
+
+def _current_client():
+    """
+    Returns the client of the job that the current thread belongs to, i.e.,
+    either the thread executing the job or a thread started by the job.
+
+    :return: the client, None if not part of a job
+    :rtype: _Client
+    """
+    client = getattr(_local, "client", None)
+    if client is None:
+        client = getattr(threading.current_thread(), ATTR_CLIENT, None)
+    return client
+
+
+class _ThreadStream:
+    """
+    Replacement for sys.stdout/sys.stderr that forwards the output of threads
+    executing a job to the client of that job, all other output goes to the
+    original stream.
+    """
+
+    def __init__(self, original, name: str):
+        """
+        Initializes the stream.
+
+        :param original: the original stream
+        :param name: the name of the stream to report to the client
+        :type name: str
+        """
+        self._original = original
+        self._name = name
+
+    def write(self, s: str) -> int:
+        client = _current_client()
+        if client is None:
+            return self._original.write(s)
+        client.send({KEY_STREAM: self._name, KEY_TEXT: s})
+        return len(s)
+
+    def flush(self):
+        if _current_client() is None:
+            self._original.flush()
+
+    def __getattr__(self, item):
+        return getattr(self._original, item)
+
+
+class _Client:
+    """
+    Sends messages (JSON lines) to a connected client.
+    """
+
+    def __init__(self, wfile):
+        """
+        Initializes the client.
+
+        :param wfile: the file object to write to
+        """
+        self._wfile = wfile
+        self._lock = threading.Lock()
+        self.connected = True
+
+    def send(self, msg: dict):
+        """
+        Sends the message, ignores errors due to the client disconnecting.
+
+        :param msg: the message to send
+        :type msg: dict
+        """
+        if not self.connected:
+            return
+        with self._lock:
+            try:
+                self._wfile.write((json.dumps(msg) + "\n").encode("utf-8"))
+                self._wfile.flush()
+            except (OSError, ValueError):
+                # ValueError: threads of the job still writing after the connection got closed
+                self.connected = False
+
+
+class _JobHandler(socketserver.StreamRequestHandler):
+    """
+    Executes the pipeline sent by the client, streaming the output back
+    and finishing with the exit code.
+    """
+
+    def handle(self):
+        line = self.rfile.readline()
+        if len(line) == 0:
+            return
+        client = _Client(self.wfile)
+        try:
+            request = json.loads(line.decode("utf-8"))
+            args = request[KEY_ARGS]
+        except Exception as e:
+            client.send({KEY_STREAM: STREAM_STDERR, KEY_TEXT: "Invalid request: %s\n" % str(e)})
+            client.send({KEY_EXIT_CODE: 1})
+            return
+        server: PipelineServer = self.server
+        with server.slots:
+            client.send({KEY_EXIT_CODE: server.run_job(args, request.get(KEY_CWD, None), client)})
+
+
+class PipelineServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Executes pipelines sent over a Unix socket in the JVM of the server,
+    with at most the specified number of pipelines executing at the same time.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, workers: int = 1):
+        """
+        Initializes the server.
+
+        :param socket_path: the Unix socket to listen on
+        :type socket_path: str
+        :param workers: the number of pipelines to execute at the same time
+        :type workers: int
+        """
+        if workers < 1:
+            raise Exception("At least one worker is required, got: %d" % workers)
+        self.socket_path = socket_path
+        self.workers = workers
+        self.slots = threading.BoundedSemaphore(workers)
+        super().__init__(socket_path, _JobHandler)
+
+    def run_job(self, args: List[str], cwd: Optional[str], client: _Client) -> int:
+        """
+        Executes the pipeline.
+
+        :param args: the pipeline arguments
+        :type args: list
+        :param cwd: the working directory of the client, ignored if None
+        :type cwd: str
+        :param client: the client to send the output to
+        :type client: _Client
+        :return: the exit code
+        :rtype: int
+        """
+        _logger.info("Executing: %s" % str(args))
+        _local.client = client
+        try:
+            # the working directory is process-wide, i.e., can only be changed when executing one job at a time
+            if (cwd is not None) and (cwd != os.getcwd()):
+                if self.workers == 1:
+                    os.chdir(cwd)
+                else:
+                    print("Server executes pipelines in its own working directory (%s), relative paths are not supported with multiple workers." % os.getcwd(), file=sys.stderr)
+            run_main_no_jvm(args)
+            result = 0
+        except SystemExit as e:
+            result = 0 if e.code is None else (e.code if isinstance(e.code, int) else 1)
+        except Exception:
+            traceback.print_exc()
+            result = 1
+        finally:
+            _local.client = None
+        _logger.info("Exit code %d: %s" % (result, str(args)))
+        return result
+
+
+def install_streams():
+    """
+    Replaces sys.stdout/sys.stderr to forward the output of jobs to their clients.
+    Log handlers that already write to these streams get updated as well.
+    Threads started by a job (e.g., for prefetching, background writing or
+    decompression) inherit the client of the job, so their output gets forwarded
+    as well. Output that the JVM writes directly to the console (e.g., via
+    System.out) does not go through Python and stays on the server's console.
+    """
+    if isinstance(sys.stderr, _ThreadStream):
+        return
+    start = threading.Thread.start
+
+    def start_with_client(thread: threading.Thread):
+        setattr(thread, ATTR_CLIENT, _current_client())
+        start(thread)
+
+    threading.Thread.start = start_with_client
+    stdout = sys.stdout
+    stderr = sys.stderr
+    sys.stdout = _ThreadStream(stdout, STREAM_STDOUT)
+    sys.stderr = _ThreadStream(stderr, STREAM_STDERR)
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, logging.StreamHandler):
+            if handler.stream is stdout:
+                handler.setStream(sys.stdout)
+            elif handler.stream is stderr:
+                handler.setStream(sys.stderr)
+
+
+def run_on_server(socket_path: str, args: List[str]) -> Optional[int]:
+    """
+    Sends the pipeline to the server and outputs the output it streams back.
+
+    :param socket_path: the Unix socket of the server
+    :type socket_path: str
+    :param args: the pipeline arguments
+    :type args: list
+    :return: the exit code, None if no server running
+    :rtype: int
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    result = 1
+    with sock:
+        sock.sendall((json.dumps({KEY_ARGS: args, KEY_CWD: os.getcwd()}) + "\n").encode("utf-8"))
+        with sock.makefile("rb") as fp:
+            for line in fp:
+                msg = json.loads(line.decode("utf-8"))
+                if KEY_EXIT_CODE in msg:
+                    result = msg[KEY_EXIT_CODE]
+                    break
+                stream = sys.stdout if (msg[KEY_STREAM] == STREAM_STDOUT) else sys.stderr
+                stream.write(msg[KEY_TEXT])
+                stream.flush()
+    return result
+
+
+def _interrupt(signum, frame):
+    """
+    Signal handler that stops the server via a KeyboardInterrupt.
+    """
+    raise KeyboardInterrupt()
+
+
+def _remove_stale_socket(socket_path: str):
+    """
+    Removes the socket file if no server is listening on it anymore.
+
+    :param socket_path: the Unix socket
+    :type socket_path: str
+    """
+    if not os.path.exists(socket_path):
+        return
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        raise Exception("Server already running on socket: %s" % socket_path)
+    except (ConnectionRefusedError, FileNotFoundError):
+        _logger.info("Removing stale socket: %s" % socket_path)
+        os.remove(socket_path)
+    finally:
+        sock.close()
+
+
+def serve(socket_path: str, workers: int = 1, class_path: List[str] = None, system_cp: bool = False,
+          packages: bool = False, max_heap_size: str = None):
+    """
+    Starts the JVM and executes the pipelines sent to the socket till interrupted.
+
+    :param socket_path: the Unix socket to listen on
+    :type socket_path: str
+    :param workers: the number of pipelines to execute at the same time
+    :type workers: int
+    :param class_path: the additional classpath elements
+    :type class_path: list
+    :param system_cp: whether to use the system CLASSPATH as well
+    :type system_cp: bool
+    :param packages: whether to load the installed Weka packages
+    :type packages: bool
+    :param max_heap_size: the maximum amount of heap space to allow, e.g., 256m or 2g
+    :type max_heap_size: str
+    """
+    _remove_stale_socket(socket_path)
+    _logger.info("Starting JVM")
+    jvm.start(class_path=class_path, system_cp=system_cp, max_heap_size=max_heap_size, packages=packages)
+    try:
+        # load the plugins once
+        _logger.info("Plugins: readers=%d, filters=%d, writers=%d"
+                     % (len(available_readers()), len(available_filters()), len(available_writers())))
+        # the JVM would otherwise terminate the process without removing the socket
+        signal.signal(signal.SIGINT, _interrupt)
+        signal.signal(signal.SIGTERM, _interrupt)
+        with PipelineServer(socket_path, workers=workers) as server:
+            _logger.info("Listening on: %s" % socket_path)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                _logger.info("Interrupted")
+            finally:
+                if os.path.exists(socket_path):
+                    os.remove(socket_path)
+    finally:
+        _logger.info("Stopping JVM")
+        jvm.stop()
+
+
+def main(args=None):
+    """
+    The main method for parsing command-line arguments.
+
+    :param args: the commandline arguments, uses sys.argv if not supplied
+    :type args: list
+    """
+    parser = argparse.ArgumentParser(
+        description="Server that starts the JVM once and executes the pipelines that clients send to its Unix socket, avoiding the JVM startup for each pipeline. Use 'wp-run --server SOCKET ...' for sending pipelines, which get executed locally if the server is not running. Output and exit code get sent back to the client.",
+        prog=SERVE,
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-S", "--socket", metavar="FILE", help="The Unix socket to listen on.", type=str, required=True)
+    parser.add_argument("-w", "--workers", metavar="NUM", help="The number of pipelines to execute at the same time, further pipelines wait; the pipelines share the JVM, i.e., the plugins must be thread-safe when using more than one; with a single worker, pipelines get executed in the working directory of the client.", type=int, default=1, required=False)
+    parser.add_argument("-c", "--classpath", metavar="PATH", help="The additional classpath elements to use for the JVM.", type=str, default=None, required=False, nargs="*")
+    parser.add_argument("-s", "--system_classpath", action="store_true", help="Whether to use the system CLASSPATH as well.")
+    parser.add_argument("-p", "--packages", action="store_true", help="Whether to load the installed Weka packages.")
+    parser.add_argument("-M", "--max_heap", metavar="SIZE", help="The maximum amount of heap space to allow, e.g., 256m or 2g.", type=str, default=None, required=False)
+    add_logging_level(parser)
+    parsed = parser.parse_args(args=args)
+    install_streams()
+    init_logging(env_var=ENV_WP_LOGLEVEL)
+    set_logging_level(_logger, parsed.logging_level)
+    serve(parsed.socket, workers=parsed.workers, class_path=parsed.classpath, system_cp=parsed.system_classpath,
+          packages=parsed.packages, max_heap_size=parsed.max_heap)
+
+
+def sys_main() -> int:
+    """
+    Runs the main function using the system cli arguments, and
+    returns a system error code.
+
+    :return: 0 for success, 1 for failure.
+    """
+    try:
+        main()
+        return 0
+    except Exception:
+        traceback.print_exc()
+        print("options: %s" % str(sys.argv[1:]), file=sys.stderr)
+        return 1
+
+
+if __name__ == '__main__':
+    main()
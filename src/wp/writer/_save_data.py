@@ -1,17 +1,30 @@
 import argparse
+import math
+import re
+import threading
+from collections import OrderedDict
 from typing import List, Optional
 
 from kasperl.api import make_list, StreamWriter
+from wp.api import detect_compression, strip_compression, CompressingStream, close_after_error, AsyncWriter, IncrementalWriter, IncrementalWriterPool, RotatingWriter, supports_incremental, is_end_of_input, set_completion_handler, PLACEHOLDER_SEQUENCE
 from seppl.placeholders import InputBasedPlaceholderSupporter, placeholder_list
 from wai.logging import LOGGING_WARNING
 from weka.core.classes import from_commandline, to_commandline
 from weka.core.converters import saver_for_file, Saver
-from weka.core.dataset import Instances
+from weka.core.dataset import Instances, Instance
+
+PLACEHOLDER_PARTITION = "{PARTITION}"
+
+PARTITION_MISSING = "missing"
 
 
 class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
 
     def __init__(self, output_file: str = None, use_custom_saver: bool = None, custom_saver: str = None,
+                 compression_level: int = None, compression_threads: int = None,
+                 async_writers: int = None, async_queue: int = None, async_unordered: bool = None,
+                 write_buffer: int = None, partition_attribute: str = None, max_open_files: int = None,
+                 rotate_rows: int = None, rotate_size: int = None, rotate_seconds: float = None,
                  logger_name: str = None, logging_level: str = LOGGING_WARNING):
         """
         Initializes the writer.
@@ -22,6 +35,28 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         :type use_custom_saver: bool
         :param custom_saver: the custom saver to use (classname + options)
         :type custom_saver: str
+        :param compression_level: the compression level to use for compressed files, uses the default of the compression if None
+        :type compression_level: int
+        :param compression_threads: the number of threads to use for compressing files, if supported
+        :type compression_threads: int
+        :param async_writers: the number of background threads for writing the data, <1 for writing synchronously
+        :type async_writers: int
+        :param async_queue: the maximum number of datasets to queue up for the background threads
+        :type async_queue: int
+        :param async_unordered: whether the files can be completed in any order when writing in the background
+        :type async_unordered: bool
+        :param write_buffer: the size in KB of the buffer for writing rows
+        :type write_buffer: int
+        :param partition_attribute: the attribute (name or 1-based index) whose value determines the file to write a row to
+        :type partition_attribute: str
+        :param max_open_files: the maximum number of files to keep open when partitioning the data
+        :type max_open_files: int
+        :param rotate_rows: the number of rows after which to start a new file, ignored if None or <=0
+        :type rotate_rows: int
+        :param rotate_size: the size in MB after which to start a new file, ignored if None or <=0
+        :type rotate_size: int
+        :param rotate_seconds: the number of seconds after which to start a new file, ignored if None or <=0
+        :type rotate_seconds: float
         :param logger_name: the name to use for the logger
         :type logger_name: str
         :param logging_level: the logging level to use
@@ -31,7 +66,25 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         self.output_file = output_file
         self.use_custom_saver = use_custom_saver
         self.custom_saver = custom_saver
+        self.compression_level = compression_level
+        self.compression_threads = compression_threads
+        self.async_writers = async_writers
+        self.async_queue = async_queue
+        self.async_unordered = async_unordered
+        self.write_buffer = write_buffer
+        self.partition_attribute = partition_attribute
+        self.max_open_files = max_open_files
+        self.rotate_rows = rotate_rows
+        self.rotate_size = rotate_size
+        self.rotate_seconds = rotate_seconds
+        self._rotating: Optional[RotatingWriter] = None
+        self._partitions: Optional[IncrementalWriterPool] = None
+        self._rows: Optional[IncrementalWriter] = None
+        self._in_chunks = False
         self._saver: Optional[Saver] = None
+        self._writer: Optional[AsyncWriter] = None
+        self._local = None
+        self._pending_completions = []
 
     def name(self) -> str:
         """
@@ -62,6 +115,17 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         parser.add_argument("-o", "--output_file", metavar="FILE", type=str, help="The file to write the data to; " + placeholder_list(obj=self), required=False)
         parser.add_argument("-u", "--use_custom_saver", action="store_true", help="Whether to use a custom saver instead of using auto-detect based on the file name.")
         parser.add_argument("-c", "--custom_saver", metavar="CMDLINE", type=str, help="The command-line of the saver to use (classname + options).", required=False)
+        parser.add_argument("--compression_level", metavar="LEVEL", type=int, default=None, help="The compression level to use when writing compressed files, which get detected by their extension (.gz, .bz2, .xz, .zst); uses the default of the compression if not supplied.", required=False)
+        parser.add_argument("--compression_threads", metavar="NUM", type=int, default=1, help="The number of threads to use for compressing the data in the background; multiple threads are supported by zstd and, with the 'isal' library, by gzip (levels 0-3).", required=False)
+        parser.add_argument("--async_writers", metavar="NUM", type=int, default=0, help="The number of background threads for writing the data, allowing the pipeline to continue while writing; files get written under a temporary name first and renamed once complete; <1 for writing synchronously.", required=False)
+        parser.add_argument("--async_queue", metavar="NUM", type=int, default=2, help="The maximum number of datasets to queue up for the background threads before the pipeline has to wait.", required=False)
+        parser.add_argument("--async_unordered", action="store_true", help="Whether the files can be completed in any order when writing with multiple background threads, rather than in the order the data arrived in.")
+        parser.add_argument("--write_buffer", metavar="KB", type=int, default=1024, help="The size in KB of the buffer for writing rows (single Instance objects) with the incremental mode of the saver; rows get always written synchronously.", required=False)
+        parser.add_argument("--partition_attribute", metavar="ATTR", type=str, default=None, help="The attribute (name or 1-based index) whose value determines the file that a row gets written to, replacing the " + PLACEHOLDER_PARTITION + " placeholder in the output file; rows get always written synchronously, appending to files that were closed already.", required=False)
+        parser.add_argument("--max_open_files", metavar="NUM", type=int, default=64, help="The maximum number of files to keep open when partitioning the data; the least recently used file gets closed when exceeded.", required=False)
+        parser.add_argument("--rotate_rows", metavar="NUM", type=int, default=None, help="The number of rows after which to start a new file; the output file must contain the " + PLACEHOLDER_SEQUENCE + " placeholder for the sequence number; files get written under a temporary name and renamed once complete.", required=False)
+        parser.add_argument("--rotate_size", metavar="MB", type=int, default=None, help="The size in MB after which to start a new file (checked every 1000 rows and after each dataset), see --rotate_rows.", required=False)
+        parser.add_argument("--rotate_seconds", metavar="SEC", type=float, default=None, help="The number of seconds after which to start a new file (checked in the background, i.e., also when no data arrives), see --rotate_rows.", required=False)
         return parser
 
     def _apply_args(self, ns: argparse.Namespace):
@@ -75,6 +139,17 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         self.output_file = ns.output_file
         self.use_custom_saver = ns.use_custom_saver
         self.custom_saver = ns.custom_saver
+        self.compression_level = ns.compression_level
+        self.compression_threads = ns.compression_threads
+        self.async_writers = ns.async_writers
+        self.async_queue = ns.async_queue
+        self.async_unordered = ns.async_unordered
+        self.write_buffer = ns.write_buffer
+        self.partition_attribute = ns.partition_attribute
+        self.max_open_files = ns.max_open_files
+        self.rotate_rows = ns.rotate_rows
+        self.rotate_size = ns.rotate_size
+        self.rotate_seconds = ns.rotate_seconds
 
     def initialize(self):
         """
@@ -83,16 +158,81 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         super().initialize()
         if self.use_custom_saver is None:
             self.use_custom_saver = False
+        if self.compression_threads is None:
+            self.compression_threads = 1
+        if self.async_writers is None:
+            self.async_writers = 0
+        if self.async_queue is None:
+            self.async_queue = 2
+        if self.async_unordered is None:
+            self.async_unordered = False
+        if self.write_buffer is None:
+            self.write_buffer = 1024
+        if self.max_open_files is None:
+            self.max_open_files = 64
+        self._rows = None
+        self._in_chunks = False
+        self._rotating = None
+        self._partitions = None
         if self.use_custom_saver:
             if self.custom_saver is None:
                 raise Exception("No custom saver specified!")
             self.logger().info("Instantiating custom saver: %s" % self.custom_saver)
-            self._saver = from_commandline(self.custom_saver)
-        else:
-            self._saver = saver_for_file(self.output_file)
-            if self._saver is None:
-                raise Exception("Failed to determine saver for file: %s" % self.output_file)
+        self._saver = self._create_saver()
+        if not self.use_custom_saver:
             self.logger().info("Auto-detected saver: %s" % to_commandline(self._saver))
+        self._writer = None
+        self._local = None
+        # the reader only gets to record inputs as completed once their data has been written
+        self._pending_completions = []
+        set_completion_handler(self.session, self._when_written)
+        if self._rotates():
+            if self.partition_attribute is not None:
+                raise Exception("Rotating and partitioning the output cannot be combined!")
+            if PLACEHOLDER_SEQUENCE not in self.output_file:
+                raise Exception("Output file must contain the %s placeholder when rotating: %s" % (PLACEHOLDER_SEQUENCE, self.output_file))
+            if not supports_incremental(self._saver):
+                raise Exception("Saver does not support writing rows, required for rotating: %s" % self._saver.classname)
+            self.logger().info("Rotating output (rows=%s, size=%s MB, seconds=%s)" % (self.rotate_rows, self.rotate_size, self.rotate_seconds))
+        elif self.partition_attribute is not None:
+            if PLACEHOLDER_PARTITION not in self.output_file:
+                raise Exception("Output file must contain the %s placeholder when partitioning: %s" % (PLACEHOLDER_PARTITION, self.output_file))
+            if not supports_incremental(self._saver):
+                raise Exception("Saver does not support writing rows, required for partitioning: %s" % self._saver.classname)
+            self.logger().info("Partitioning data using attribute '%s', with at most %d open file(s)" % (self.partition_attribute, self.max_open_files))
+            self._partitions = IncrementalWriterPool(self._create_partition_writer, self.max_open_files, logger=self.logger())
+        elif self.async_writers > 0:
+            self.logger().info("Writing in the background using %d thread(s)" % self.async_writers)
+            self._local = threading.local()
+            self._writer = AsyncWriter(self._save_async, num_writers=self.async_writers, max_queued=self.async_queue,
+                                       ordered=not self.async_unordered, logger=self.logger())
+            self._writer.start()
+
+    def _rotates(self) -> bool:
+        """
+        Returns whether the output gets rotated.
+
+        :return: True if rotating
+        :rtype: bool
+        """
+        for limit in [self.rotate_rows, self.rotate_size, self.rotate_seconds]:
+            if (limit is not None) and (limit > 0):
+                return True
+        return False
+
+    def _create_saver(self) -> Saver:
+        """
+        Creates a new saver instance.
+
+        :return: the saver
+        :rtype: Saver
+        """
+        if self.use_custom_saver:
+            return from_commandline(self.custom_saver)
+        result = saver_for_file(strip_compression(self.output_file))
+        if result is None:
+            raise Exception("Failed to determine saver for file: %s" % self.output_file)
+        return result
 
     def accepts(self) -> List:
         """
@@ -101,7 +241,288 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         :return: the list of classes
         :rtype: list
         """
-        return [Instances]
+        return [Instances, Instance]
+
+    def _save_compressed(self, saver: Saver, data: Instances, output_file: str):
+        """
+        Saves the data compressed, with the saver writing the plain data to a stream
+        that gets compressed in the background.
+
+        :param saver: the saver to use
+        :type saver: Saver
+        :param data: the data to save
+        :type data: Instances
+        :param output_file: the file to write to
+        :type output_file: str
+        """
+        stream = CompressingStream(output_file, level=self.compression_level, threads=self.compression_threads)
+        try:
+            saver.jobject.setInstances(data.jobject)
+            saver.jobject.setDestination(stream.open())
+            saver.jobject.writeBatch()
+        except Exception:
+            close_after_error(stream, logger=self.logger())
+            raise
+        stream.close()
+
+    def _save(self, saver: Saver, data: Instances, output_file: str):
+        """
+        Saves the data with the specified saver.
+
+        :param saver: the saver to use
+        :type saver: Saver
+        :param data: the data to save
+        :type data: Instances
+        :param output_file: the file to write to
+        :type output_file: str
+        """
+        if detect_compression(output_file) is None:
+            saver.save_file(data, output_file)
+        else:
+            self._save_compressed(saver, data, output_file)
+
+    def _save_async(self, data: Instances, output_file: str):
+        """
+        Saves the data on a background thread, using a separate saver per thread.
+
+        :param data: the data to save
+        :type data: Instances
+        :param output_file: the file to write to
+        :type output_file: str
+        """
+        if not hasattr(self._local, "saver"):
+            self._local.saver = self._create_saver()
+        self._save(self._local.saver, data, output_file)
+
+    def _when_written(self, callback):
+        """
+        Executes the callback once all the data received so far has been written,
+        i.e., once the files that rows are being written to have been completed
+        and the background threads have written their data.
+
+        :param callback: the callback to execute
+        """
+        self._pending_completions.append(callback)
+        if (self._rows is None) and (self._rotating is None) and (self._partitions is None):
+            self._confirm_written()
+
+    def _confirm_written(self, num: int = None):
+        """
+        Passes on the callbacks of the data that has been written to files that were
+        completed, which still have to wait for the background threads (if any).
+
+        :param num: the number of callbacks to pass on, all if None
+        :type num: int
+        """
+        if num is None:
+            num = len(self._pending_completions)
+        callbacks = self._pending_completions[:num]
+        self._pending_completions = self._pending_completions[num:]
+        for callback in callbacks:
+            if self._writer is not None:
+                self._writer.notify(callback)
+            else:
+                callback()
+
+    def _close_rows(self):
+        """
+        Finishes the file that rows are being written to, if any.
+        """
+        if self._rows is not None:
+            rows = self._rows
+            self._rows = None
+            rows.close()
+        self._confirm_written()
+
+    def _write_row(self, inst: Instance, output_file: str):
+        """
+        Writes the row, starting a new file if the output file or the structure changes.
+
+        :param inst: the row to write
+        :type inst: Instance
+        :param output_file: the file to write to
+        :type output_file: str
+        """
+        if (self._rows is None) or (self._rows.path != output_file) or not self._rows.accepts_row(inst):
+            self._open_rows(output_file, Instances.template_instances(inst.dataset, 0))
+        self._rows.write(inst)
+
+    def _open_rows(self, output_file: str, header: Instances):
+        """
+        Starts a new file for writing rows to, finishing the current one.
+
+        :param output_file: the file to write to
+        :type output_file: str
+        :param header: the structure of the rows
+        :type header: Instances
+        """
+        self._close_rows()
+        saver = self._create_saver()
+        if not supports_incremental(saver):
+            raise Exception("Saver does not support writing rows: %s" % saver.classname)
+        self.logger().info("Saving rows to: %s" % output_file)
+        self._rows = IncrementalWriter(saver, output_file, header, buffer_size=self.write_buffer * 1024,
+                                       compression_level=self.compression_level,
+                                       compression_threads=self.compression_threads, logger=self.logger())
+
+    def _write_chunk(self, data: Instances, output_file: str) -> bool:
+        """
+        Writes datasets that are chunks of the same input (i.e., the reader has not
+        reached the end of the input yet) to the same file, if the saver supports it.
+
+        :param data: the dataset to write
+        :type data: Instances
+        :param output_file: the file to write to
+        :type output_file: str
+        :return: whether the data was written as chunk
+        :rtype: bool
+        """
+        end = is_end_of_input(self.session)
+        chunk = (end is False) or ((self._rows is not None) and self._in_chunks and (self._rows.path == output_file))
+        if not chunk or not supports_incremental(self._saver):
+            return False
+        if (self._rows is None) or (self._rows.path != output_file) or not bool(self._rows.header.jobject.equalHeaders(data.jobject)):
+            self._open_rows(output_file, Instances.template_instances(data, 0))
+        self._rows.write_rows(data, range(data.num_instances))
+        self._in_chunks = end is False
+        if not self._in_chunks:
+            self._close_rows()
+        return True
+
+    def _create_partition_writer(self, output_file: str, header: Instances, append: bool) -> IncrementalWriter:
+        """
+        Creates a writer for a partition of the data.
+
+        :param output_file: the file to write to
+        :type output_file: str
+        :param header: the structure of the rows
+        :type header: Instances
+        :param append: whether to append to the file
+        :type append: bool
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        self.logger().info("%s rows to: %s" % ("Appending" if append else "Saving", output_file))
+        return IncrementalWriter(self._create_saver(), output_file, header, buffer_size=self.write_buffer * 1024,
+                                 compression_level=self.compression_level,
+                                 compression_threads=self.compression_threads, append=append, logger=self.logger())
+
+    def _create_segment_writer(self, output_file: str, header: Instances) -> IncrementalWriter:
+        """
+        Creates a writer for a segment of the rotated output.
+
+        :param output_file: the (temporary) file to write to
+        :type output_file: str
+        :param header: the structure of the rows
+        :type header: Instances
+        :return: the writer
+        :rtype: IncrementalWriter
+        """
+        return IncrementalWriter(self._create_saver(), output_file, header, buffer_size=self.write_buffer * 1024,
+                                 compression_level=self.compression_level,
+                                 compression_threads=self.compression_threads)
+
+    def _write_rotated(self, item, output_file: str):
+        """
+        Writes the row or the rows of the dataset to the current segment,
+        starting a new series of segments if the output file changes.
+
+        :param item: the row or dataset to write
+        :param output_file: the output file with the sequence placeholder
+        :type output_file: str
+        """
+        if (self._rotating is not None) and (self._rotating.template != output_file):
+            self._close_rotating()
+        if self._rotating is None:
+            self._rotating = RotatingWriter(self._create_segment_writer, output_file, max_rows=self.rotate_rows,
+                                            max_bytes=None if self.rotate_size is None else self.rotate_size * 1024 * 1024,
+                                            max_seconds=self.rotate_seconds, logger=self.logger())
+        # completing a segment completes all the data received before
+        pending = len(self._pending_completions)
+        segments = self._rotating.num_segments
+        if isinstance(item, Instance):
+            self._rotating.write(item)
+        else:
+            self._rotating.write_rows(item, range(item.num_instances))
+        if self._rotating.num_segments > segments:
+            self._confirm_written(pending)
+
+    def _close_rotating(self):
+        """
+        Completes the current segment, if any.
+        """
+        if self._rotating is not None:
+            rotating = self._rotating
+            self._rotating = None
+            rotating.close()
+            self._confirm_written()
+
+    def _partition_attribute(self, header) -> int:
+        """
+        Determines the 0-based index of the partition attribute.
+
+        :param header: the Java dataset to look up the attribute in
+        :return: the index
+        :rtype: int
+        """
+        att = header.attribute(self.partition_attribute)
+        if att is not None:
+            return att.index()
+        if self.partition_attribute.isdigit():
+            index = int(self.partition_attribute) - 1
+            if 0 <= index < header.numAttributes():
+                return index
+        raise Exception("Partition attribute not found: %s" % self.partition_attribute)
+
+    def _partition_file(self, output_file: str, att, value: float) -> str:
+        """
+        Generates the file for the value of the partition attribute.
+
+        :param output_file: the output file with the placeholder
+        :type output_file: str
+        :param att: the Java attribute
+        :param value: the internal value of the attribute
+        :type value: float
+        :return: the file
+        :rtype: str
+        """
+        if math.isnan(value):
+            partition = PARTITION_MISSING
+        elif att.isNominal() or att.isString():
+            partition = str(att.value(int(value)))
+        elif value.is_integer():
+            partition = str(int(value))
+        else:
+            partition = str(value)
+        # only characters that are safe to use in file names
+        partition = re.sub("[^A-Za-z0-9._-]", "_", partition)
+        if partition in ("", ".", ".."):
+            partition = "_" + partition
+        return output_file.replace(PLACEHOLDER_PARTITION, partition)
+
+    def _write_partitioned(self, item, output_file: str):
+        """
+        Writes the row or the rows of the dataset to the files of their partitions.
+
+        :param item: the row or dataset to write
+        :param output_file: the output file with the placeholder
+        :type output_file: str
+        """
+        if isinstance(item, Instance):
+            header = item.jobject.dataset()
+            att = header.attribute(self._partition_attribute(header))
+            path = self._partition_file(output_file, att, float(item.jobject.value(att)))
+            self._partitions.get_for_row(path, item).write(item)
+            return
+        att = item.jobject.attribute(self._partition_attribute(item.jobject))
+        groups = OrderedDict()
+        for i, value in enumerate(item.jobject.attributeToDoubleArray(att.index())):
+            path = self._partition_file(output_file, att, float(value))
+            if path not in groups:
+                groups[path] = []
+            groups[path].append(i)
+        for path in groups:
+            self._partitions.get(path, item).write_rows(item, groups[path])
 
     def write_stream(self, data):
         """
@@ -111,5 +532,40 @@ class SaveData(StreamWriter, InputBasedPlaceholderSupporter):
         """
         for item in make_list(data):
             output_file = self.session.expand_placeholders(self.output_file)
+            if self._rotates():
+                self._write_rotated(item, output_file)
+                continue
+            if self._partitions is not None:
+                self._write_partitioned(item, output_file)
+                continue
+            if isinstance(item, Instance):
+                self._write_row(item, output_file)
+                continue
+            if self._write_chunk(item, output_file):
+                continue
+            self._close_rows()
             self.logger().info("Saving data to: %s" % output_file)
-            self._saver.save_file(item, output_file)
+            if self._writer is not None:
+                self._writer.submit(item, output_file)
+            else:
+                self._save(self._saver, item, output_file)
+
+    def finalize(self):
+        """
+        Finishes the processing, e.g., for closing files or databases.
+        """
+        super().finalize()
+        self._close_rows()
+        self._close_rotating()
+        if self._partitions is not None:
+            partitions = self._partitions
+            self._partitions = None
+            partitions.close()
+            self.logger().info("Wrote %d partition file(s), closed %d file(s) early" % (partitions.num_files, partitions.evictions))
+            self._confirm_written()
+        if self._writer is not None:
+            writer = self._writer
+            self._writer = None
+            self.logger().info("Waiting for background writing to finish")
+            writer.close()
+        set_completion_handler(self.session, None)
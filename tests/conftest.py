@@ -0,0 +1,83 @@
+import os
+import subprocess
+import sys
+from typing import List
+
+import pytest
+
+
+def write_arff(path: str, relation: str, attributes: List[str], rows: List[str]) -> str:
+    """
+    Writes a simple ARFF file.
+
+    :param path: the file to write to
+    :type path: str
+    :param relation: the relation name
+    :type relation: str
+    :param attributes: the attribute definitions, e.g., 'a numeric'
+    :type attributes: list
+    :param rows: the data rows
+    :type rows: list
+    :return: the path
+    :rtype: str
+    """
+    with open(path, "w") as fp:
+        fp.write("@relation %s\n\n" % relation)
+        for att in attributes:
+            fp.write("@attribute %s\n" % att)
+        fp.write("\n@data\n")
+        for row in rows:
+            fp.write(row + "\n")
+    return path
+
+
+def run_pipeline(*args: str, tool: str = "run", cwd: str = None) -> subprocess.CompletedProcess:
+    """
+    Executes the tool in a separate process, as the JVM can only be started once per process.
+
+    :param args: the arguments for the tool
+    :param tool: the tool module to execute (run, exec)
+    :type tool: str
+    :param cwd: the working directory to use
+    :type cwd: str
+    :return: the completed process (output in stdout/stderr)
+    :rtype: subprocess.CompletedProcess
+    """
+    return subprocess.run([sys.executable, "-m", "wp.tool." + tool] + list(args),
+                          stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, cwd=cwd)
+
+
+def read_rows(path: str) -> List[str]:
+    """
+    Reads the data rows from an ARFF or CSV file, i.e., skipping the header.
+
+    :param path: the file to read
+    :type path: str
+    :return: the rows
+    :rtype: list
+    """
+    with open(path, "r") as fp:
+        lines = [x.strip() for x in fp.readlines()]
+    if path.endswith(".csv"):
+        return [x for x in lines[1:] if len(x) > 0]
+    return [x for x in lines[lines.index("@data") + 1:] if (len(x) > 0) and not x.startswith("%")]
+
+
+@pytest.fixture(scope="session")
+def data_dir(tmp_path_factory) -> str:
+    """
+    Generates the test datasets.
+
+    :return: the directory with the datasets
+    :rtype: str
+    """
+    result = str(tmp_path_factory.mktemp("data"))
+    write_arff(os.path.join(result, "num.arff"), "num", ["a numeric", "b numeric", "class {x,y}"],
+               ["%d,%.2f,%s" % (i, i / 3, "xy"[i % 2]) for i in range(30)])
+    write_arff(os.path.join(result, "num2.arff"), "num2", ["a numeric", "b numeric", "class {x,y}"],
+               ["%d,%.2f,%s" % (i * 2, i / 7, "xy"[i % 3 % 2]) for i in range(12)])
+    write_arff(os.path.join(result, "str.arff"), "str", ["n numeric", "s string", "c {x,y}"],
+               ["%d,'txt %d',%s" % (i, i, "xy"[i % 2]) for i in range(25)])
+    write_arff(os.path.join(result, "miss.arff"), "miss", ["a numeric", "b numeric"],
+               ["%s,%.2f" % ("?" if i % 4 == 0 else "%.2f" % ((i * 37 % 11) / 2), (i * 13 % 7) / 3) for i in range(40)])
+    return result
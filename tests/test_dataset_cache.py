@@ -0,0 +1,47 @@
+import os
+import shutil
+
+from conftest import run_pipeline, read_rows
+
+
+def _run(path, cache_dir, output):
+    result = run_pipeline("load-data", "-i", path, "--cache_dir", cache_dir, "-l", "INFO",
+                          "save-data", "-o", output)
+    assert result.returncode == 0, result.stderr
+    return result.stderr
+
+
+def test_hit_and_invalidation(data_dir, tmp_path):
+    path = os.path.join(str(tmp_path), "num.arff")
+    shutil.copy(os.path.join(data_dir, "num.arff"), path)
+    cache_dir = os.path.join(str(tmp_path), "cache")
+    output = os.path.join(str(tmp_path), "out.csv")
+
+    log = _run(path, cache_dir, output)
+    assert "Loaded from cache" not in log
+    assert "hits=0, misses=1" in log
+    expected = read_rows(output)
+    assert len(expected) == 30
+
+    log = _run(path, cache_dir, output)
+    assert "Loaded from cache: %s" % path in log
+    assert "hits=1, misses=0" in log
+    assert read_rows(output) == expected
+
+    # same size, different modification time
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 5 * 10**9))
+    log = _run(path, cache_dir, output)
+    assert "Loaded from cache" not in log
+    assert read_rows(output) == expected
+
+    # different content
+    with open(path, "a") as fp:
+        fp.write("100,1.5,y\n")
+    log = _run(path, cache_dir, output)
+    assert "Loaded from cache" not in log
+    assert read_rows(output) == expected + ["100,1.5,y"]
+
+    log = _run(path, cache_dir, output)
+    assert "Loaded from cache: %s" % path in log
+    assert read_rows(output) == expected + ["100,1.5,y"]
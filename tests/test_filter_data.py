@@ -0,0 +1,62 @@
+import os
+
+from conftest import run_pipeline, read_rows
+
+ADD_ID = "weka.filters.unsupervised.attribute.AddID"
+REMOVE = "weka.filters.unsupervised.attribute.Remove -R 1"
+REPLACE_MISSING = "weka.filters.unsupervised.attribute.ReplaceMissingValues"
+NORMALIZE = "weka.filters.unsupervised.attribute.Normalize"
+
+
+def _inputs(data_dir, *names):
+    return [os.path.join(data_dir, x) for x in names]
+
+
+def test_held_rows_across_inputs(data_dir, tmp_path):
+    # AddID is not streamable, i.e., it holds back the rows till the end of the batch
+    for option, sequential in [("-a", False), ("-c", True)]:
+        output = os.path.join(str(tmp_path), option, "{INPUT_NAMENOEXT}.arff")
+        result = run_pipeline("load-data", "-i", *_inputs(data_dir, "str.arff", "num.arff"), "--incremental",
+                              "filter-data", "-f", ADD_ID, option,
+                              "save-data", "-o", output)
+        assert result.returncode == 0, result.stderr
+        for name, num in [("str", 25), ("num", 30)]:
+            rows = read_rows(os.path.join(str(tmp_path), option, name + ".arff"))
+            ids = [int(x.split(",")[0]) for x in rows]
+            # each row is a separate initialization when always initializing
+            assert ids == (list(range(1, num + 1)) if sequential else [1] * num)
+
+
+def test_buffered_rows_across_inputs(data_dir, tmp_path):
+    output = os.path.join(str(tmp_path), "{INPUT_NAMENOEXT}.csv")
+    for batch_rows in ["0", "4"]:
+        result = run_pipeline("load-data", "-i", *_inputs(data_dir, "str.arff", "num.arff"), "--incremental",
+                              "filter-data", "-f", REMOVE, "-c", "--batch_rows", batch_rows,
+                              "save-data", "-o", output.replace("{INPUT", batch_rows + "-{INPUT"))
+        assert result.returncode == 0, result.stderr
+    for batch_rows in ["0", "4"]:
+        rows = read_rows(os.path.join(str(tmp_path), batch_rows + "-str.csv"))
+        assert [x.split(",")[0] for x in rows] == ["'txt %d'" % i for i in range(25)]
+        rows = read_rows(os.path.join(str(tmp_path), batch_rows + "-num.csv"))
+        assert len(rows) == 30
+    for name in ["str.csv", "num.csv"]:
+        assert read_rows(os.path.join(str(tmp_path), "0-" + name)) == read_rows(os.path.join(str(tmp_path), "4-" + name))
+
+
+def test_fused_and_unfused_output_equal(data_dir, tmp_path):
+    outputs = dict()
+    for name, options, incremental in [("fused", [], ["--incremental"]),
+                                       ("unfused", ["--no_filter_fusion"], ["--incremental"]),
+                                       ("batch", [], [])]:
+        outputs[name] = os.path.join(str(tmp_path), name + ".arff")
+        result = run_pipeline(*options,
+                              "load-data", "-i", *_inputs(data_dir, "miss.arff"), *incremental,
+                              "filter-data", "-f", REPLACE_MISSING,
+                              "filter-data", "-f", NORMALIZE,
+                              "save-data", "-o", outputs[name])
+        assert result.returncode == 0, result.stderr
+    expected = read_rows(outputs["batch"])
+    assert len(expected) == 40
+    assert "?" not in ",".join(expected)
+    assert read_rows(outputs["fused"]) == expected
+    assert read_rows(outputs["unfused"]) == expected
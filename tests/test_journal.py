@@ -0,0 +1,55 @@
+import os
+
+from conftest import run_pipeline, read_rows
+from wp.api import Journal
+
+
+def test_resume(tmp_path):
+    path = os.path.join(str(tmp_path), "sub", "journal.txt")
+    journal = Journal(path, sync_interval=2)
+    assert journal.open() == 0
+    journal.add("a.arff")
+    journal.add("b.arff")
+    journal.add("a.arff")
+    journal.close()
+
+    journal = Journal(path)
+    assert journal.open() == 2
+    assert journal.is_completed("a.arff")
+    assert journal.is_completed(os.path.abspath("b.arff"))
+    assert not journal.is_completed("c.arff")
+    journal.close()
+
+
+def test_ignores_incomplete_line(tmp_path):
+    path = os.path.join(str(tmp_path), "journal.txt")
+    with open(path, "w") as fp:
+        fp.write(os.path.abspath("a.arff") + "\n" + os.path.abspath("b.ar"))
+    journal = Journal(path)
+    assert journal.open() == 1
+    assert not journal.is_completed("b.arff")
+    journal.add("c.arff")
+    journal.close()
+    with open(path, "r") as fp:
+        assert fp.read().split("\n") == [os.path.abspath("a.arff"), os.path.abspath("c.arff"), ""]
+
+
+def test_pipeline_skips_completed(data_dir, tmp_path):
+    journal = os.path.join(str(tmp_path), "journal.txt")
+    output = os.path.join(str(tmp_path), "out")
+    inputs = [os.path.join(data_dir, x) for x in ["num.arff", "num2.arff"]]
+
+    result = run_pipeline("load-data", "-i", inputs[0], "--journal", journal,
+                          "save-data", "-o", os.path.join(output, "{INPUT_NAMENOEXT}.csv"))
+    assert result.returncode == 0, result.stderr
+    assert os.path.exists(os.path.join(output, "num.csv"))
+    os.remove(os.path.join(output, "num.csv"))
+
+    result = run_pipeline("load-data", "-i", *inputs, "--journal", journal, "-l", "INFO",
+                          "save-data", "-o", os.path.join(output, "{INPUT_NAMENOEXT}.csv"))
+    assert result.returncode == 0, result.stderr
+    assert "Files skipped based on journal: 1" in result.stderr
+    assert not os.path.exists(os.path.join(output, "num.csv"))
+    assert len(read_rows(os.path.join(output, "num2.csv"))) == 12
+    with open(journal, "r") as fp:
+        assert fp.read().split("\n") == [os.path.abspath(x) for x in inputs] + [""]
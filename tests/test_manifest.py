@@ -0,0 +1,85 @@
+import os
+import shutil
+
+from conftest import run_pipeline
+from wp.api import Manifest, file_stats
+
+
+def test_up_to_date(tmp_path):
+    inp = os.path.join(str(tmp_path), "in.txt")
+    out = os.path.join(str(tmp_path), "out.txt")
+    for path in [inp, out]:
+        with open(path, "w") as fp:
+            fp.write("1")
+    pipeline = ["load-data", "-i", inp, "save-data", "-o", out]
+    path = os.path.join(str(tmp_path), "sub", "manifest.jsonl")
+
+    manifest = Manifest(path)
+    assert manifest.open() == 0
+    assert not manifest.is_up_to_date(pipeline, file_stats([inp]), [out])
+    manifest.record(pipeline, file_stats([inp]), [out], False)
+    assert not manifest.is_up_to_date(pipeline, file_stats([inp]), [out])
+    manifest.record(pipeline, file_stats([inp]), [out], True)
+    manifest.close()
+
+    manifest = Manifest(path)
+    assert manifest.open() == 1
+    assert manifest.is_up_to_date(pipeline, file_stats([inp]), [out])
+    assert not manifest.is_up_to_date(pipeline + ["-l", "INFO"], file_stats([inp]), [out])
+    # changed input
+    with open(inp, "a") as fp:
+        fp.write("2")
+    assert not manifest.is_up_to_date(pipeline, file_stats([inp]), [out])
+    manifest.close()
+
+
+def test_ignores_incomplete_line(tmp_path):
+    path = os.path.join(str(tmp_path), "manifest.jsonl")
+    manifest = Manifest(path)
+    manifest.open()
+    manifest.record(["a"], dict(), [], True)
+    manifest.close()
+    with open(path, "a") as fp:
+        fp.write('{"key": "')
+    manifest = Manifest(path)
+    assert manifest.open() == 1
+    manifest.record(["b"], dict(), [], True)
+    manifest.close()
+    manifest = Manifest(path)
+    assert manifest.open() == 2
+    manifest.close()
+
+
+def _exec(manifest, data_dir, output_dir):
+    result = run_pipeline("--exec_manifest", manifest, "--exec_logging_level", "INFO",
+                          "--exec_generator", "list -n f -v num num2",
+                          "load-data", "-i", os.path.join(data_dir, "{f}.arff"),
+                          "save-data", "-o", os.path.join(output_dir, "{f}.csv"),
+                          tool="exec")
+    assert result.returncode == 0, result.stderr
+    return result.stderr
+
+
+def test_exec_skips_up_to_date(data_dir, tmp_path):
+    inputs = os.path.join(str(tmp_path), "in")
+    shutil.copytree(data_dir, inputs)
+    output_dir = os.path.join(str(tmp_path), "out")
+    manifest = os.path.join(str(tmp_path), "manifest.jsonl")
+
+    log = _exec(manifest, inputs, output_dir)
+    assert "Skipped 0 up-to-date pipeline(s)" in log
+    assert sorted(os.listdir(output_dir)) == ["num.csv", "num2.csv"]
+
+    log = _exec(manifest, inputs, output_dir)
+    assert "Skipped 2 up-to-date pipeline(s)" in log
+
+    # missing output and modified input
+    os.remove(os.path.join(output_dir, "num.csv"))
+    with open(os.path.join(inputs, "num2.arff"), "a") as fp:
+        fp.write("100,1.5,y\n")
+    log = _exec(manifest, inputs, output_dir)
+    assert "Skipped 0 up-to-date pipeline(s)" in log
+    assert sorted(os.listdir(output_dir)) == ["num.csv", "num2.csv"]
+
+    log = _exec(manifest, inputs, output_dir)
+    assert "Skipped 2 up-to-date pipeline(s)" in log
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from conftest import run_pipeline
+from wp.api import Prefetcher
+
+
+def _files(tmp_path, num):
+    result = []
+    for i in range(num):
+        path = os.path.join(str(tmp_path), "%d.txt" % i)
+        with open(path, "w") as fp:
+            fp.write(str(i))
+        result.append(path)
+    return result
+
+
+def _load(path):
+    with open(path, "r") as fp:
+        return fp.read()
+
+
+def test_loads_files_in_order(tmp_path):
+    files = _files(tmp_path, 5)
+    prefetcher = Prefetcher(iter(files), _load, 2)
+    prefetcher.start()
+    loaded = []
+    while True:
+        item = prefetcher.next()
+        if item is None:
+            break
+        loaded.append(item)
+    prefetcher.stop()
+    assert loaded == [(f, str(i)) for i, f in enumerate(files)]
+    assert prefetcher.finished
+
+
+def test_propagates_load_error(tmp_path):
+    files = _files(tmp_path, 3)
+
+    def load(path):
+        if path == files[1]:
+            raise ValueError("broken: %s" % path)
+        return _load(path)
+
+    prefetcher = Prefetcher(iter(files), load, 2)
+    prefetcher.start()
+    assert prefetcher.next() == (files[0], "0")
+    with pytest.raises(ValueError):
+        prefetcher.next()
+    prefetcher.stop()
+
+
+def test_propagates_iterator_error(tmp_path):
+    files = _files(tmp_path, 1)
+
+    def inputs():
+        yield files[0]
+        raise IOError("listing failed")
+
+    prefetcher = Prefetcher(inputs(), _load, 2)
+    prefetcher.start()
+    assert prefetcher.next() == (files[0], "0")
+    # must not block forever
+    with pytest.raises(IOError):
+        prefetcher.next()
+    prefetcher.stop()
+
+
+def test_pipeline_fails_without_inputs(tmp_path):
+    result = run_pipeline("load-data", "-i", os.path.join(str(tmp_path), "*.arff"), "--prefetch", "2")
+    assert result.returncode != 0
+
+
+def test_pipeline_output_identical(data_dir, tmp_path):
+    inputs = [os.path.join(data_dir, x) for x in ["num.arff", "str.arff", "num2.arff"]]
+    for prefetch in ["0", "2"]:
+        result = run_pipeline("load-data", "-i", *inputs, "--prefetch", prefetch,
+                              "save-data", "-o", os.path.join(str(tmp_path), prefetch, "{INPUT_NAMENOEXT}.csv"))
+        assert result.returncode == 0, result.stderr
+    for name in ["num.csv", "str.csv", "num2.csv"]:
+        with open(os.path.join(str(tmp_path), "0", name)) as fp0, open(os.path.join(str(tmp_path), "2", name)) as fp2:
+            assert fp0.read() == fp2.read()
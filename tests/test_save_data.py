@@ -0,0 +1,58 @@
+import os
+
+from conftest import run_pipeline, read_rows
+
+
+def _inputs(data_dir, *names):
+    return [os.path.join(data_dir, x) for x in names]
+
+
+def test_incremental_output(data_dir, tmp_path):
+    inputs = _inputs(data_dir, "str.arff", "num.arff")
+    for name, incremental in [("batch", []), ("incremental", ["--incremental"])]:
+        # output directory does not exist yet
+        output = os.path.join(str(tmp_path), name, "sub", "{INPUT_NAMENOEXT}.arff")
+        result = run_pipeline("load-data", "-i", *inputs, *incremental,
+                              "save-data", "-o", output, "--write_buffer", "1")
+        assert result.returncode == 0, result.stderr
+    for name, num in [("str.arff", 25), ("num.arff", 30)]:
+        expected = read_rows(os.path.join(str(tmp_path), "batch", "sub", name))
+        assert len(expected) == num
+        assert read_rows(os.path.join(str(tmp_path), "incremental", "sub", name)) == expected
+
+
+def test_partitioned_output(data_dir, tmp_path):
+    output = os.path.join(str(tmp_path), "out", "{INPUT_NAMENOEXT}-{PARTITION}.csv")
+    # fewer open files than partitions, i.e., closed files get appended to
+    result = run_pipeline("load-data", "-i", *_inputs(data_dir, "num.arff", "num2.arff"), "--incremental",
+                          "save-data", "-o", output, "--partition_attribute", "class", "--max_open_files", "1")
+    assert result.returncode == 0, result.stderr
+    assert sorted(os.listdir(os.path.join(str(tmp_path), "out"))) == ["num-x.csv", "num-y.csv", "num2-x.csv", "num2-y.csv"]
+    for cls, start in [("x", 0), ("y", 1)]:
+        rows = read_rows(os.path.join(str(tmp_path), "out", "num-%s.csv" % cls))
+        assert [int(x.split(",")[0]) for x in rows] == list(range(start, 30, 2))
+        assert all(x.endswith("," + cls) for x in rows)
+    rows = read_rows(os.path.join(str(tmp_path), "out", "num2-x.csv")) \
+        + read_rows(os.path.join(str(tmp_path), "out", "num2-y.csv"))
+    assert len(rows) == 12
+
+
+def test_rotated_output(data_dir, tmp_path):
+    inputs = _inputs(data_dir, "num.arff", "num2.arff")
+    output = os.path.join(str(tmp_path), "out", "part-{SEQ}.csv")
+    result = run_pipeline("load-data", "-i", *inputs, "--incremental",
+                          "save-data", "-o", os.path.join(str(tmp_path), "{INPUT_NAMENOEXT}.csv"))
+    assert result.returncode == 0, result.stderr
+    expected = read_rows(os.path.join(str(tmp_path), "num.csv")) + read_rows(os.path.join(str(tmp_path), "num2.csv"))
+    for run in range(2):
+        result = run_pipeline("load-data", "-i", *inputs, "--incremental",
+                              "save-data", "-o", output, "--rotate_rows", "10")
+        assert result.returncode == 0, result.stderr
+        # existing segments get skipped
+        files = sorted(os.listdir(os.path.join(str(tmp_path), "out")))
+        assert files == ["part-%05d.csv" % i for i in range(5 * (run + 1))]
+        rows = []
+        for f in files[5 * run:]:
+            rows.append(read_rows(os.path.join(str(tmp_path), "out", f)))
+        assert [len(x) for x in rows] == [10, 10, 10, 10, 2]
+        assert sum(rows, []) == expected